@@ -0,0 +1,233 @@
+"""
+Vues asynchrones des recherches cadastre et géocodage, et flux SSE des
+jobs IA (déploiement ASGI).
+
+Django 3.2 ne gère l'asynchrone que pour les vues fonctions (pas pour les
+APIView DRF) : ces vues reprennent les réponses de leurs équivalents de
+views.py, servies sous /api/async/. Sous ASGI (uvicorn), une attente amont
+n'occupe pas de thread.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from core.models import AIJob
+from .services.ai_jobs import ai_job_queue, last_event_offset, stream_token, token_user_id
+from .services.async_cadastre import async_cadastre_client
+from .services.cadastre_service import parse_coordinates
+from .services.cadastre_cache import is_valid_code_insee
+from .services.circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def method_not_allowed(request):
+    response = json_response({"detail": f'Méthode "{request.method}" non autorisée.'}, status=405)
+    response['Allow'] = 'GET'
+    return response
+
+
+def upstream_error_response(error, message):
+    """Voir views.upstream_error_response (503 si le circuit est ouvert, sinon 502)."""
+    if isinstance(error, CircuitOpenError):
+        response = json_response(
+            {"error": f"{message} : service {error.upstream} temporairement indisponible"}, status=503
+        )
+        response['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+        return response
+    return json_response({"error": message}, status=502)
+
+
+async def geocode(request):
+    """
+    Géocode une adresse.
+    GET /api/async/cadastre/geocode/?q={address}
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    address = request.GET.get('q', '')
+    if not address:
+        return json_response({"error": "Paramètre 'q' requis"}, status=400)
+
+    try:
+        results = await async_cadastre_client.geocode_address(address)
+        return json_response({"results": results})
+    except Exception as e:
+        logger.error(f"Error geocoding: {e}")
+        return upstream_error_response(e, "Erreur lors du géocodage")
+
+
+async def reverse_geocode(request):
+    """
+    Géocodage inverse.
+    GET /api/async/cadastre/reverse/?lat={lat}&lon={lon}
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    try:
+        lat, lon = parse_coordinates(request.GET)
+    except ValueError:
+        return json_response({"error": "Paramètres 'lat' (-90 à 90) et 'lon' (-180 à 180) requis"}, status=400)
+
+    try:
+        result = await async_cadastre_client.reverse_geocode(lon, lat)
+        if result:
+            return json_response(result)
+        return json_response({"error": "Aucune adresse trouvée à ces coordonnées"}, status=404)
+    except Exception as e:
+        logger.error(f"Error reverse geocoding: {e}")
+        return upstream_error_response(e, "Erreur lors du géocodage inverse")
+
+
+async def parcelle_detail(request, code_insee, section, numero):
+    """
+    Récupère une parcelle spécifique.
+    GET /api/async/cadastre/parcelle/{code_insee}/{section}/{numero}/
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    if not is_valid_code_insee(code_insee.zfill(5)):
+        return json_response({"error": "Code INSEE invalide"}, status=400)
+    try:
+        parcelle = await async_cadastre_client.get_parcelle_by_id(code_insee, section, numero)
+        if parcelle:
+            return json_response(parcelle)
+        return json_response({"error": "Parcelle non trouvée"}, status=404)
+    except Exception as e:
+        logger.error(f"Error fetching parcelle: {e}")
+        return upstream_error_response(e, "Erreur lors de la recherche de parcelle")
+
+
+async def search(request):
+    """
+    Recherche des parcelles par commune et section optionnelle.
+    GET /api/async/cadastre/search/?code_insee={code}&section={section}
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    code_insee = request.GET.get('code_insee', '')
+    if not code_insee:
+        return json_response({"error": "Paramètre 'code_insee' requis"}, status=400)
+    if not is_valid_code_insee(code_insee.zfill(5)):
+        return json_response({"error": "Code INSEE invalide"}, status=400)
+
+    try:
+        data = await async_cadastre_client.search_parcelles(code_insee, request.GET.get('section'))
+        return json_response(data)
+    except Exception as e:
+        logger.error(f"Error searching parcelles: {e}")
+        return upstream_error_response(e, "Erreur lors de la recherche")
+
+
+async def parcelle_by_coordinates(request):
+    """
+    Trouve une parcelle par coordonnées GPS.
+    GET /api/async/cadastre/parcelle/coords/?lat={lat}&lon={lon}
+    """
+    if request.method != 'GET':
+        return method_not_allowed(request)
+    try:
+        lat, lon = parse_coordinates(request.GET)
+    except ValueError:
+        return json_response({"error": "Paramètres 'lat' (-90 à 90) et 'lon' (-180 à 180) requis"}, status=400)
+
+    try:
+        parcelle = await async_cadastre_client.get_parcelle_by_coordinates(lat, lon)
+        if parcelle:
+            return json_response(parcelle)
+        return json_response({"error": "Aucune parcelle trouvée à ces coordonnées"}, status=404)
+    except Exception as e:
+        logger.error(f"Error fetching parcelle by coordinates: {e}")
+        return upstream_error_response(e, "Erreur lors de la recherche de parcelle")
+
+
+class AIJobStreamRouter:
+    """
+    Application ASGI servant le flux SSE des jobs IA
+    (GET /api/ai/jobs/{id}/stream/) sans passer par Django, les autres
+    requêtes étant transmises à l'application Django.
+
+    Django 3.2 parcourt les réponses en flux de façon synchrone, y compris
+    sous ASGI : le flux bloquerait la boucle d'événements. Ici, l'attente
+    entre deux fragments n'occupe ni thread ni worker. Réponses identiques
+    à views.ai_job_stream.
+    """
+
+    PATH = re.compile(r"^/api/ai/jobs/(?P<job_id>[0-9a-fA-F-]{36})/stream/$")
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = self.PATH.match(scope.get('path', '')) if scope['type'] == 'http' else None
+        if match is None:
+            return await self.application(scope, receive, send)
+        await self.stream(scope, receive, send, match.group('job_id'))
+
+    @staticmethod
+    def _headers(scope):
+        return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+    async def _respond(self, send, status, headers, body=b''):
+        # CORS_ALLOW_ALL_ORIGINS : même en-tête que corsheaders, qui ne voit pas ces requêtes
+        headers = [(b'access-control-allow-origin', b'*')] + headers
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _json(self, send, status, data, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await self._respond(send, status, [(b'content-type', b'application/json')] + list(headers), body)
+
+    async def stream(self, scope, receive, send, job_id):
+        if scope['method'] == 'OPTIONS':
+            return await self._respond(send, 204, [
+                (b'access-control-allow-methods', b'GET, OPTIONS'),
+                (b'access-control-allow-headers', b'authorization, last-event-id'),
+            ])
+        if scope['method'] != 'GET':
+            return await self._json(send, 405, {"detail": f'Méthode "{scope["method"]}" non autorisée.'},
+                                    [(b'allow', b'GET')])
+
+        headers = self._headers(scope)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        user_id = token_user_id(stream_token(headers.get('authorization', ''), query.get('token', [''])[0]))
+        if user_id is None:
+            return await self._json(send, 401, {"error": "Authentification requise"})
+        owned = await sync_to_async(AIJob.objects.filter(pk=job_id, user_id=user_id).exists)()
+        if not owned:
+            return await self._json(send, 404, {"error": "Job non trouvé"})
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'access-control-allow-origin', b'*'),
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            async for chunk in ai_job_queue.astream(job_id, last_event_offset(headers.get('last-event-id'))):
+                if disconnected.is_set():
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
@@ -0,0 +1,169 @@
+"""
+Test de charge : vues cadastre synchrones (WSGI) vs asynchrones (ASGI).
+
+Un faux api-adresse local (latence réglable) remplace le service amont.
+Le déploiement WSGI actuel (gunicorn, vues DRF) et le déploiement ASGI
+(uvicorn, vues /api/async/) sont lancés tour à tour en sous-processus,
+puis soumis au même nombre de requêtes concurrentes de géocodage
+(adresses toutes distinctes : aucune réponse servie par le cache).
+
+Exemples :
+    python manage.py bench_cadastre_async
+    python manage.py bench_cadastre_async --requests 1000 --concurrency 300 --latency 0.5
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import aiohttp
+import uvicorn
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _standin_app(latency: float):
+    """Application ASGI imitant /search/ et /reverse/ d'api-adresse."""
+    body = json.dumps({"features": [{
+        "geometry": {"coordinates": [4.8357, 45.764]},
+        "properties": {"label": "1 Place Bellecour 69002 Lyon", "city": "Lyon",
+                       "citycode": "69382", "postcode": "69002", "score": 0.9},
+    }]}).encode()
+
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        await asyncio.sleep(latency)
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    return app
+
+
+def _start_standin(port: int, latency: float) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(
+        _standin_app(latency), host='127.0.0.1', port=port, log_level='warning', backlog=4096
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _wait_ready(port: int, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Le serveur s'est arrêté (code {process.returncode})")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError("Le serveur n'a pas démarré à temps")
+
+
+async def _load(url: str, total: int, concurrency: int, label: str):
+    """Envoie `total` requêtes (au plus `concurrency` en vol) ; retourne durées et erreurs."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with session.get(url, params={'q': f"{i} rue {label} Lyon"}) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), errors
+
+
+class Command(BaseCommand):
+    help = "Compare le débit concurrent des vues de géocodage WSGI (sync) et ASGI (async)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Requêtes par déploiement (défaut : 400)")
+        parser.add_argument('--concurrency', type=int, default=200, help="Requêtes simultanées (défaut : 200)")
+        parser.add_argument('--latency', type=float, default=0.25,
+                            help="Latence simulée du service amont, en secondes (défaut : 0.25)")
+        parser.add_argument('--wsgi-workers', type=int, default=1,
+                            help="Workers gunicorn WSGI (défaut : 1, comme la commande de démarrage actuelle)")
+        parser.add_argument('--wsgi-threads', type=int, default=1, help="Threads par worker gunicorn (défaut : 1)")
+
+    def handle(self, *args, **options):
+        standin_port = _free_port()
+        standin = _start_standin(standin_port, options['latency'])
+        tmp = tempfile.mkdtemp(prefix='bench-async-')
+        env = dict(
+            os.environ,
+            API_ADRESSE_BASE=f"http://127.0.0.1:{standin_port}",
+            # Le limiteur de débit amont et le disjoncteur fausseraient la mesure
+            GEOCODE_RATE_LIMIT='0',
+            UPSTREAM_BREAKER_SLOW_CALL='60',
+            CADASTRE_CACHE_DIR=os.path.join(tmp, 'cadastre'),
+            CADASTRE_STORE_PATH=os.path.join(tmp, 'store.sqlite3'),
+        )
+
+        deployments = [
+            ('WSGI gunicorn (sync)', '/api/cadastre/geocode/', lambda port: [
+                sys.executable, '-m', 'gunicorn', 'urbania_backend.wsgi:application',
+                '--bind', f"127.0.0.1:{port}", '--workers', str(options['wsgi_workers']),
+                '--threads', str(options['wsgi_threads']), '--timeout', '300', '--log-level', 'warning',
+            ]),
+            ('ASGI uvicorn (async)', '/api/async/cadastre/geocode/', lambda port: [
+                sys.executable, '-m', 'uvicorn', 'urbania_backend.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--backlog', '4096',
+            ]),
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requêtes, {options['concurrency']} simultanées, "
+            f"latence amont {options['latency'] * 1000:.0f} ms"
+        )
+        self.stdout.write(f"{'déploiement':<24}{'req/s':>8}{'p50':>9}{'p95':>9}{'max':>9}{'erreurs':>9}")
+        try:
+            for label, path, command in deployments:
+                port = _free_port()
+                process = subprocess.Popen(command(port), cwd=settings.BASE_DIR, env=env)
+                try:
+                    _wait_ready(port, process)
+                    elapsed, latencies, errors = asyncio.run(_load(
+                        f"http://127.0.0.1:{port}{path}", options['requests'],
+                        options['concurrency'], label.split()[0],
+                    ))
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+                p50 = latencies[len(latencies) // 2]
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                self.stdout.write(
+                    f"{label:<24}{options['requests'] / elapsed:>8.1f}{p50 * 1000:>7.0f}ms"
+                    f"{p95 * 1000:>7.0f}ms{latencies[-1] * 1000:>7.0f}ms{errors:>9}"
+                )
+        finally:
+            standin.should_exit = True
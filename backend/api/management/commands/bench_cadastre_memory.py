@@ -0,0 +1,115 @@
+"""
+Benchmark mémoire : FeatureCollection décodée vs index communal compact.
+
+Exemples :
+    python manage.py bench_cadastre_memory --code-insee 69123
+    python manage.py bench_cadastre_memory --file cadastre-69123-parcelles.json.gz
+    python manage.py bench_cadastre_memory --synthetic 300
+"""
+
+import gc
+import gzip
+import json
+import math
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.cadastre_service import cadastre_service
+from api.services.compact_features import CompactFeatures
+from api.services.spatial_index import CommuneIndex
+
+
+def _synthetic_commune(n, vertices=12):
+    """Grille n x n de parcelles polygonales (~`vertices` sommets chacune)."""
+    size = 0.0005
+    features = []
+    for i in range(n):
+        for j in range(n):
+            x, y = 4.8 + i * size, 45.7 + j * size
+            ring = [
+                [x + size / 2 * (1 + math.cos(2 * math.pi * k / vertices)),
+                 y + size / 2 * (1 + math.sin(2 * math.pi * k / vertices))]
+                for k in range(vertices)
+            ]
+            ring.append(ring[0])
+            numero = str(i * n + j + 1).zfill(4)
+            features.append({
+                "type": "Feature",
+                "id": f"69123000AB{numero}",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {
+                    "id": f"69123000AB{numero}", "commune": "69123", "prefixe": "000",
+                    "section": "AB", "numero": numero, "contenance": 1000,
+                    "arpente": False, "created": "2005-06-30", "updated": "2023-01-12",
+                },
+            })
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+
+def _measure(fn):
+    """Exécute fn et retourne (résultat, octets alloués conservés, durée)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:8.1f} Mo"
+
+
+class Command(BaseCommand):
+    help = "Compare l'empreinte mémoire d'une commune en dictionnaires GeoJSON et en index compact."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--code-insee', help="Commune à charger via CadastreService")
+        parser.add_argument('--file', help="Fichier GeoJSON local (.json ou .json.gz)")
+        parser.add_argument('--layer', default='parcelles', choices=['parcelles', 'batiments'])
+        parser.add_argument('--synthetic', type=int,
+                            help="Commune synthétique de N x N parcelles (défaut si aucune source)")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            opener = gzip.open if options['file'].endswith('.gz') else open
+            with opener(options['file'], 'rb') as f:
+                raw = f.read()
+        elif options['code_insee']:
+            entry = cadastre_service.fetch_commune_layer(options['layer'], options['code_insee'])
+            if entry is None:
+                raise CommandError(f"Commune {options['code_insee']} introuvable")
+            raw = b''.join(cadastre_service.cache.iter_bytes(entry))
+        else:
+            raw = _synthetic_commune(options['synthetic'] or 300)
+
+        collection, dict_bytes, parse_time = _measure(lambda: json.loads(raw))
+        features = collection.get('features', [])
+        compact, compact_bytes, compact_time = _measure(lambda: CompactFeatures.from_features(features))
+        index, index_bytes, index_time = _measure(lambda: CommuneIndex(compact))
+        _, _, materialize_time = _measure(lambda: json.dumps(list(compact)))
+
+        vertices = len(compact.coords)
+        self.stdout.write(f"Entités : {len(features)}  sommets : {vertices}  JSON : {_mb(len(raw))}")
+        self.stdout.write(f"{'représentation':<32}{'mémoire':>12}{'ratio':>10}{'durée':>10}")
+        rows = [
+            ("coordonnées brutes (16 o/sommet)", vertices * 16, None),
+            ("GeoJSON décodé (dict/list)", dict_bytes, parse_time),
+            ("CompactFeatures", compact_bytes, compact_time),
+            ("CompactFeatures + grille", compact_bytes + index_bytes, compact_time + index_time),
+        ]
+        for label, size, elapsed in rows:
+            ratio = f"{size / (vertices * 16):.1f}x" if vertices else "-"
+            duration = f"{elapsed * 1000:.0f} ms" if elapsed is not None else ""
+            self.stdout.write(f"{label:<32}{_mb(size):>12}{ratio:>10}{duration:>10}")
+        self.stdout.write(f"Estimation CommuneIndex.nbytes() : {_mb(index.nbytes())}")
+        self.stdout.write(f"Sérialisation GeoJSON complète depuis le compact : {materialize_time * 1000:.0f} ms")
+        if compact_bytes:
+            self.stdout.write(self.style.SUCCESS(
+                f"Gain mémoire : {dict_bytes / (compact_bytes + index_bytes):.1f}x"
+            ))
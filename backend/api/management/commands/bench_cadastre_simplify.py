@@ -0,0 +1,83 @@
+"""
+Benchmark de la simplification / quantification des couches cadastrales.
+
+Exemples :
+    python manage.py bench_cadastre_simplify --code-insee 75056
+    python manage.py bench_cadastre_simplify --file cadastre-69123-parcelles.json \
+        --tolerance 0.00001 --tolerance 0.00005 --precision 6
+"""
+
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.cadastre_service import cadastre_service
+from api.services.geometry import simplify_collection
+
+
+def _count_vertices(collection):
+    total = 0
+    for feature in collection.get('features', []):
+        geometry = feature.get('geometry') or {}
+        polygons = geometry.get('coordinates') or []
+        if geometry.get('type') == 'Polygon':
+            polygons = [polygons]
+        for polygon in polygons:
+            for ring in polygon:
+                total += len(ring)
+    return total
+
+
+class Command(BaseCommand):
+    help = "Mesure la taille des réponses et le temps d'encodage avant/après simplification."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--code-insee', help="Commune à charger via CadastreService")
+        parser.add_argument('--file', help="Fichier GeoJSON local (alternative à --code-insee)")
+        parser.add_argument('--layer', default='parcelles', choices=['parcelles', 'batiments'])
+        parser.add_argument('--tolerance', type=float, action='append',
+                            help="Tolérance(s) Douglas-Peucker en degrés (défaut : 1e-5 et 5e-5)")
+        parser.add_argument('--precision', type=int, default=6,
+                            help="Décimales conservées pour les variantes (défaut : 6)")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            opener = gzip.open if options['file'].endswith('.gz') else open
+            with opener(options['file'], 'rb') as f:
+                collection = json.load(f)
+        elif options['code_insee']:
+            if options['layer'] == 'parcelles':
+                collection = cadastre_service.get_parcelles_commune(options['code_insee'])
+            else:
+                collection = cadastre_service.get_batiments_commune(options['code_insee'])
+        else:
+            raise CommandError("Préciser --code-insee ou --file")
+
+        variants = [(0.0, None)]
+        variants += [(0.0, options['precision'])]
+        variants += [(t, options['precision']) for t in (options['tolerance'] or [1e-5, 5e-5])]
+
+        self.stdout.write(f"{len(collection.get('features', []))} entités")
+        self.stdout.write(
+            f"{'tolérance':>10} {'précision':>9} {'sommets':>10} {'JSON (Ko)':>10} "
+            f"{'gzip (Ko)':>10} {'simplif. (ms)':>14} {'encodage (ms)':>14}"
+        )
+        for tolerance, precision in variants:
+            start = time.perf_counter()
+            result = collection
+            if tolerance > 0 or precision is not None:
+                result = simplify_collection(collection, tolerance, precision)
+            simplify_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            payload = json.dumps(result, separators=(',', ':')).encode()
+            encode_ms = (time.perf_counter() - start) * 1000
+            compressed = gzip.compress(payload, compresslevel=6)
+
+            self.stdout.write(
+                f"{tolerance:>10g} {str(precision):>9} {_count_vertices(result):>10} "
+                f"{len(payload) / 1024:>10.0f} {len(compressed) / 1024:>10.0f} "
+                f"{simplify_ms:>14.0f} {encode_ms:>14.0f}"
+            )
@@ -0,0 +1,133 @@
+"""
+Évaluation hors ligne de la réutilisation des réponses de l'IA par similarité.
+
+- Corpus étiqueté (par défaut api/evaluation/similarity_pairs.json) : paires
+  de descriptions marquées `same` si la réponse de l'une vaut pour l'autre.
+  Précision, rappel et F1 sont calculés pour une série de seuils, et les
+  erreurs au seuil configuré (AI_SIMILARITY_THRESHOLD) sont listées.
+- --from-db : rejeu « leave-one-out » des réponses en cache (AIResponse).
+  Chaque description est cherchée dans l'index des autres ; on mesure, par
+  seuil, la part de réponses qui auraient été réutilisées et la part de
+  réutilisations identiques à la réponse réellement obtenue de Mistral.
+- --index-size : temps d'ajout et de recherche sur un index synthétique.
+
+Exemples :
+    python manage.py eval_ai_similarity
+    python manage.py eval_ai_similarity --from-db
+    python manage.py eval_ai_similarity --index-size 20000
+"""
+
+import json
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.similarity_index import SimilarityIndex, similarity
+from core.models import AIResponse
+
+DEFAULT_CORPUS = os.path.join(settings.BASE_DIR, 'api', 'evaluation', 'similarity_pairs.json')
+THRESHOLDS = [round(0.5 + 0.05 * i, 2) for i in range(10)]
+
+
+def _ratio(numerator: int, denominator: int) -> str:
+    return f"{numerator / denominator:.3f}" if denominator else '-'
+
+
+class Command(BaseCommand):
+    help = "Évalue le seuil de similarité de réutilisation des réponses de l'IA."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Paires étiquetées (JSON)")
+        parser.add_argument('--from-db', action='store_true', help="Rejouer les réponses en cache (AIResponse)")
+        parser.add_argument('--index-size', type=int, default=0,
+                            help="Mesurer ajout et recherche sur un index synthétique de N descriptions")
+
+    def handle(self, *args, **options):
+        self.threshold = settings.AI_SIMILARITY_THRESHOLD
+        self.evaluate_corpus(options['corpus'])
+        if options['from_db']:
+            self.evaluate_db()
+        if options['index_size']:
+            self.benchmark(options['corpus'], options['index_size'])
+
+    def _table_header(self, columns):
+        self.stdout.write(f"{'seuil':>7}" + ''.join(f"{c:>12}" for c in columns))
+
+    def _table_row(self, threshold, values):
+        mark = ' *' if threshold == self.threshold else '  '
+        self.stdout.write(f"{threshold:>5.2f}{mark}" + ''.join(f"{v:>12}" for v in values))
+
+    def evaluate_corpus(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                pairs = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Corpus illisible ({path}) : {e}")
+
+        scored = [(similarity(p['a'], p['b']), bool(p['same']), p) for p in pairs]
+        positives = sum(1 for _, same, _ in scored if same)
+        self.stdout.write(f"Corpus : {len(pairs)} paires ({positives} réutilisables, {len(pairs) - positives} non)")
+        self._table_header(['VP', 'FP', 'FN', 'précision', 'rappel', 'F1'])
+        for threshold in THRESHOLDS:
+            tp = sum(1 for s, same, _ in scored if s >= threshold and same)
+            fp = sum(1 for s, same, _ in scored if s >= threshold and not same)
+            fn = positives - tp
+            f1 = _ratio(2 * tp, 2 * tp + fp + fn)
+            self._table_row(threshold, [tp, fp, fn, _ratio(tp, tp + fp), _ratio(tp, positives), f1])
+
+        errors = [(s, same, p) for s, same, p in scored if (s >= self.threshold) != same]
+        self.stdout.write(f"\nErreurs au seuil configuré ({self.threshold}) : {len(errors)}")
+        for s, same, p in sorted(errors, key=lambda e: e[0]):
+            kind = 'FN' if same else 'FP'
+            self.stdout.write(f"  {kind} {s:.2f}  {p['a']!r} / {p['b']!r}")
+
+    def evaluate_db(self):
+        entries = list(AIResponse.objects.values_list('pk', 'method', 'prompt_version', 'model',
+                                                      'description', 'response'))
+        self.stdout.write(f"\nRejeu de {len(entries)} réponse(s) en cache")
+        if not entries:
+            return
+        index = SimilarityIndex()
+        responses = {}
+        for pk, method, version, model, description, response in entries:
+            index.add(pk, (method, version, model), description)
+            responses[pk] = response
+
+        best = []
+        for pk, method, version, model, description, response in entries:
+            matches = index.query((method, version, model), description, min(THRESHOLDS), exclude=pk)
+            if matches:
+                match_pk, score = matches[0]
+                best.append((score, responses[match_pk] == response))
+
+        self._table_header(['réutilisées', 'taux', 'identiques', 'accord'])
+        for threshold in THRESHOLDS:
+            reused = [same for score, same in best if score >= threshold]
+            agreeing = sum(reused)
+            self._table_row(threshold, [len(reused), _ratio(len(reused), len(entries)),
+                                        agreeing, _ratio(agreeing, len(reused))])
+
+    def benchmark(self, path, size):
+        with open(path, encoding='utf-8') as f:
+            texts = [t for p in json.load(f) for t in (p['a'], p['b'])]
+        rng = random.Random(0)
+        descriptions = [f"{rng.choice(texts)} {rng.randint(1, 200)} m2" for _ in range(size)]
+
+        index = SimilarityIndex()
+        start = time.perf_counter()
+        for i, description in enumerate(descriptions):
+            index.add(i, 'analyze_project', description)
+        added = time.perf_counter() - start
+
+        queries = [rng.choice(descriptions) for _ in range(1000)]
+        start = time.perf_counter()
+        for description in queries:
+            index.query('analyze_project', description, self.threshold)
+        queried = time.perf_counter() - start
+        self.stdout.write(
+            f"\nIndex de {size} descriptions : ajout {added / size * 1e6:.0f} µs, "
+            f"recherche {queried / len(queries) * 1e6:.0f} µs ({index.stats()['buckets']} seaux)"
+        )
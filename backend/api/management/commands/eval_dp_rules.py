@@ -0,0 +1,161 @@
+"""
+Évaluation hors ligne du moteur de règles des pièces DP (dp_rules).
+
+- Corpus étiqueté (par défaut api/evaluation/dp_pieces_corpus.json) :
+  descriptions, éventuellement avec `natureTravaux`, et pièces requises.
+  Pour une série de seuils de confiance, on mesure la part de projets
+  décidés par les règles (les autres sont confiés à l'IA), la part de
+  décisions identiques à l'étiquette et l'accord pièce par pièce. Les
+  désaccords au seuil configuré (AI_RULES_MIN_CONFIDENCE) sont listés.
+- --llm : pose aussi chaque question du corpus à Mistral (ou la lit en
+  cache) et mesure l'accord des règles et de l'IA, entre elles et avec les
+  étiquettes.
+- --from-db : compare les règles aux réponses de suggest_documents en cache
+  (AIResponse).
+- --bench N : temps moyen d'une décision des règles.
+
+Exemples :
+    python manage.py eval_dp_rules
+    python manage.py eval_dp_rules --llm
+    python manage.py eval_dp_rules --from-db --bench 10000
+"""
+
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.ai_service import AIService
+from api.services.dp_rules import DOCUMENT_KEYS, DPRulesEngine
+from core.models import AIResponse
+
+DEFAULT_CORPUS = os.path.join(settings.BASE_DIR, 'api', 'evaluation', 'dp_pieces_corpus.json')
+THRESHOLDS = [0.25, 0.5, 0.75, 0.9, 1.0]
+
+
+def _ratio(numerator: int, denominator: int) -> str:
+    return f"{numerator / denominator:.3f}" if denominator else '-'
+
+
+def _pieces(documents) -> frozenset:
+    """Pièces requises, qu'elles soient données en liste ou en {dp1: bool, ...}."""
+    if isinstance(documents, dict):
+        return frozenset(doc for doc in DOCUMENT_KEYS if documents.get(doc))
+    return frozenset(documents or [])
+
+
+def _agreement(pairs):
+    """(identiques, pièces en accord, pièces comparées) sur des paires d'ensembles de pièces."""
+    exact = sum(1 for a, b in pairs if a == b)
+    pieces = sum(sum(1 for doc in DOCUMENT_KEYS if (doc in a) == (doc in b)) for a, b in pairs)
+    return exact, pieces, len(pairs) * len(DOCUMENT_KEYS)
+
+
+class Command(BaseCommand):
+    help = "Évalue les décisions du moteur de règles des pièces DP."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Projets étiquetés (JSON)")
+        parser.add_argument('--llm', action='store_true', help="Comparer aux réponses de Mistral sur le corpus")
+        parser.add_argument('--from-db', action='store_true', help="Comparer aux réponses en cache (AIResponse)")
+        parser.add_argument('--bench', type=int, default=0, help="Mesurer le temps de N décisions")
+
+    def handle(self, *args, **options):
+        self.threshold = settings.AI_RULES_MIN_CONFIDENCE
+        self.engine = DPRulesEngine(self.threshold)
+        try:
+            with open(options['corpus'], encoding='utf-8') as f:
+                corpus = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Corpus illisible ({options['corpus']}) : {e}")
+
+        self.evaluate_corpus(corpus)
+        if options['llm']:
+            self.evaluate_llm(corpus)
+        if options['from_db']:
+            self.evaluate_db()
+        if options['bench']:
+            self.benchmark(corpus, options['bench'])
+
+    def _table_header(self, columns):
+        self.stdout.write(f"{'seuil':>7}" + ''.join(f"{c:>12}" for c in columns))
+
+    def _table_row(self, threshold, values):
+        mark = ' *' if threshold == self.threshold else '  '
+        self.stdout.write(f"{threshold:>5.2f}{mark}" + ''.join(f"{v:>12}" for v in values))
+
+    def _decision(self, entry):
+        return self.engine.classify(entry['description'], entry.get('natureTravaux'))
+
+    def evaluate_corpus(self, corpus):
+        scored = [(self._decision(e), _pieces(e['documents']), e) for e in corpus]
+        self.stdout.write(f"Corpus : {len(corpus)} projets")
+        self._table_header(['décidés', 'couverture', 'identiques', 'exactitude', 'par pièce'])
+        for threshold in THRESHOLDS:
+            decided = [(_pieces(d.required_documents()), label)
+                       for d, label, _ in scored if d.types and d.confidence >= threshold]
+            exact, pieces, compared = _agreement(decided)
+            self._table_row(threshold, [len(decided), _ratio(len(decided), len(corpus)),
+                                        exact, _ratio(exact, len(decided)), _ratio(pieces, compared)])
+
+        errors = [(d, label, e) for d, label, e in scored
+                  if d.types and d.confidence >= self.threshold and _pieces(d.required_documents()) != label]
+        self.stdout.write(f"\nDésaccords au seuil configuré ({self.threshold}) : {len(errors)}")
+        for d, label, e in errors:
+            decided = _pieces(d.required_documents())
+            self.stdout.write(f"  {e['description']!r} {d.types} : en trop {sorted(decided - label)}, "
+                              f"manquantes {sorted(label - decided)}")
+        deferred = [(d, e) for d, _, e in scored if not (d.types and d.confidence >= self.threshold)]
+        self.stdout.write(f"\nConfiés à l'IA : {len(deferred)}")
+        for d, e in deferred:
+            self.stdout.write(f"  {d.confidence:.2f} {e['description']!r} ({d.reason})")
+
+    def evaluate_llm(self, corpus):
+        self.stdout.write("\nComparaison avec Mistral")
+        if AIService.API_KEY in ("", "VOTRE_CLE_API_ICI"):
+            self.stdout.write("  Clé API MISTRAL_API_KEY non configurée")
+            return
+        rows = []
+        for entry in corpus:
+            answer = AIService.suggest_documents_llm(entry['description'])
+            if answer is None:
+                self.stdout.write(f"  sans réponse : {entry['description']!r}")
+                continue
+            rows.append((self._decision(entry), _pieces(answer), _pieces(entry['documents'])))
+        if not rows:
+            return
+
+        exact, pieces, compared = _agreement([(llm, label) for _, llm, label in rows])
+        self.stdout.write(f"IA / étiquettes : {exact}/{len(rows)} identiques, "
+                          f"accord par pièce {_ratio(pieces, compared)}")
+        self._table_header(['décidés', 'identiques', 'accord', 'par pièce'])
+        for threshold in THRESHOLDS:
+            decided = [(_pieces(d.required_documents()), llm)
+                       for d, llm, _ in rows if d.types and d.confidence >= threshold]
+            exact, pieces, compared = _agreement(decided)
+            self._table_row(threshold, [len(decided), exact, _ratio(exact, len(decided)),
+                                        _ratio(pieces, compared)])
+
+    def evaluate_db(self):
+        entries = list(AIResponse.objects.filter(method='suggest_documents').values_list('description', 'response'))
+        self.stdout.write(f"\nRéponses suggest_documents en cache : {len(entries)}")
+        if not entries:
+            return
+        rows = [(self.engine.classify(description), _pieces(response)) for description, response in entries]
+        self._table_header(['décidés', 'couverture', 'identiques', 'accord', 'par pièce'])
+        for threshold in THRESHOLDS:
+            decided = [(_pieces(d.required_documents()), llm)
+                       for d, llm in rows if d.types and d.confidence >= threshold]
+            exact, pieces, compared = _agreement(decided)
+            self._table_row(threshold, [len(decided), _ratio(len(decided), len(rows)), exact,
+                                        _ratio(exact, len(decided)), _ratio(pieces, compared)])
+
+    def benchmark(self, corpus, count):
+        entries = [corpus[i % len(corpus)] for i in range(count)]
+        start = time.perf_counter()
+        for entry in entries:
+            self.engine.decide('bench', entry['description'], entry.get('natureTravaux'))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"\n{count} décisions : {elapsed / count * 1e6:.1f} µs par décision")
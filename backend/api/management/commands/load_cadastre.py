@@ -0,0 +1,142 @@
+"""
+Précharge le cadastre Etalab d'un département dans le stockage local indexé.
+
+Les fichiers communaux (cadastre-<insee>-<couche>.json[.gz]) ou
+départementaux (cadastre-<dep>-<couche>.json[.gz]) sont lus depuis un
+répertoire local ou téléchargés depuis le site Etalab.
+
+Exemples :
+    python manage.py load_cadastre --departement 69 --source /data/etalab-cadastre/geojson
+    python manage.py load_cadastre --departement 69 \
+        --source https://cadastre.data.gouv.fr/data/etalab-cadastre/latest/geojson
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.cadastre_store import CadastreStore
+
+LAYERS = ['parcelles', 'batiments']
+
+
+def _read_collection(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return json.load(f)
+
+
+def _file_code(path, layer):
+    """Code (INSEE ou département) d'un fichier cadastre-<code>-<couche>.json[.gz], sinon None."""
+    name = os.path.basename(path)
+    for suffix in ('.json.gz', '.json'):
+        if name.startswith('cadastre-') and name.endswith(f"-{layer}{suffix}"):
+            return name[len('cadastre-'):-len(f"-{layer}{suffix}")]
+    return None
+
+
+class Command(BaseCommand):
+    help = "Charge les parcelles et bâtiments d'un département dans le stockage local (SQLite R*Tree)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departement', required=True, help="Code département (ex: 69, 2A, 971)")
+        parser.add_argument('--source', required=True,
+                            help="Répertoire de fichiers Etalab ou URL de base geojson Etalab")
+        parser.add_argument('--layers', default=','.join(LAYERS),
+                            help="Couches à charger, séparées par des virgules (défaut : parcelles,batiments)")
+
+    def handle(self, *args, **options):
+        departement = options['departement'].upper()
+        layers = [l.strip() for l in options['layers'].split(',') if l.strip()]
+        unknown = set(layers) - set(LAYERS)
+        if unknown:
+            raise CommandError(f"Couche(s) inconnue(s) : {', '.join(sorted(unknown))}")
+
+        store = CadastreStore.from_settings()
+        source = options['source']
+        remote = source.startswith(('http://', 'https://'))
+        if not remote and not os.path.isdir(source):
+            raise CommandError(f"Répertoire introuvable : {source}")
+
+        for layer in layers:
+            start = time.perf_counter()
+            if remote:
+                communes = self._load_remote(store, source, departement, layer)
+            else:
+                communes = self._load_directory(store, source, departement, layer)
+            if not communes:
+                self.stderr.write(f"Aucune donnée {layer} trouvée pour le département {departement}")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{layer}: {len(communes)} communes, {sum(communes.values())} entités "
+                f"en {time.perf_counter() - start:.1f} s"
+            ))
+
+        stats = store.stats()
+        self.stdout.write(f"Stockage {store.path} : {stats['communes']} couches communales, "
+                          f"{stats['features']} entités")
+
+    def _load_directory(self, store, directory, departement, layer):
+        """Parcourt le répertoire : fichiers communaux du département, sinon fichier départemental."""
+        commune_files, departement_files = {}, []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                code = _file_code(path, layer)
+                if code is None:
+                    continue
+                if code.upper() == departement:
+                    departement_files.append(path)
+                elif len(code) == 5 and code.upper().startswith(departement):
+                    # Préférer le fichier compressé en cas de doublon
+                    if code not in commune_files or path.endswith('.gz'):
+                        commune_files[code] = path
+
+        if commune_files:
+            counts = {}
+            for code, path in sorted(commune_files.items()):
+                counts[code] = store.load_features(
+                    layer, code, departement, _read_collection(path).get('features', [])
+                )
+            return counts
+        counts = {}
+        for path in departement_files:
+            counts.update(self._load_departement_file(store, path, departement, layer))
+        return counts
+
+    def _load_remote(self, store, base_url, departement, layer):
+        """Télécharge le fichier départemental Etalab puis le charge."""
+        url = f"{base_url.rstrip('/')}/departements/{departement}/cadastre-{departement}-{layer}.json.gz"
+        self.stdout.write(f"Téléchargement {url}")
+        fd, tmp_path = tempfile.mkstemp(suffix='.json.gz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with requests.get(url, stream=True, timeout=60) as response:
+                    if response.status_code == 404:
+                        return {}
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            return self._load_departement_file(store, tmp_path, departement, layer)
+        except requests.exceptions.RequestException as e:
+            raise CommandError(f"Échec du téléchargement {url} : {e}")
+        finally:
+            os.remove(tmp_path)
+
+    def _load_departement_file(self, store, path, departement, layer):
+        """Répartit les entités d'un fichier départemental par commune (propriété 'commune')."""
+        by_commune = defaultdict(list)
+        for feature in _read_collection(path).get('features', []):
+            code = (feature.get('properties') or {}).get('commune')
+            if code:
+                by_commune[str(code).zfill(5)].append(feature)
+        return {
+            code: store.load_features(layer, code, departement, features)
+            for code, features in sorted(by_commune.items())
+        }
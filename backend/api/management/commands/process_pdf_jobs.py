@@ -0,0 +1,57 @@
+"""
+Exécute les jobs de génération des PDF de dossiers en attente.
+
+Sans option, vide la file puis s'arrête (rattrapage, tâche planifiée).
+Avec --watch, démarre le pool de workers et tourne en continu : à utiliser
+comme processus dédié lorsque PDF_JOB_WORKERS vaut 0 dans les processus web.
+
+Exemples :
+    python manage.py process_pdf_jobs
+    python manage.py process_pdf_jobs --watch --workers 4
+    python manage.py process_pdf_jobs --requeue-failed
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.services.pdf_jobs import PdfJobQueue
+from core.models import PdfJob
+
+
+class Command(BaseCommand):
+    help = "Génère les PDF de dossiers en attente (file PdfJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help="Tourner en continu avec un pool de workers")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Workers du pool en mode --watch (défaut : PDF_JOB_WORKERS, au moins 1)")
+        parser.add_argument('--requeue-failed', action='store_true',
+                            help="Remettre en attente les jobs en échec avant de commencer")
+
+    def handle(self, *args, **options):
+        queue = PdfJobQueue.from_settings()
+
+        if options['requeue_failed']:
+            count = PdfJob.objects.filter(status='failed').update(
+                status='pending', attempts=0, run_after=timezone.now()
+            )
+            self.stdout.write(f"{count} job(s) en échec remis en attente")
+
+        if not options['watch']:
+            start = time.monotonic()
+            count = queue.drain()
+            self.stdout.write(self.style.SUCCESS(
+                f"{count} job(s) traité(s) en {time.monotonic() - start:.1f} s : {queue.stats()['jobs']}"
+            ))
+            return
+
+        queue.workers = max(1, options['workers'] or queue.workers)
+        queue.wake()
+        self.stdout.write(f"{queue.workers} worker(s) démarré(s), Ctrl+C pour arrêter")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
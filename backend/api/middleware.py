@@ -0,0 +1,41 @@
+"""
+Middlewares du projet.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware utilisable dans une chaîne asynchrone (ASGI).
+
+    WhiteNoise n'est que synchrone : sous ASGI, Django exécute alors toute la
+    suite de la chaîne (vues async comprises) dans un unique thread, ce qui
+    sérialise les requêtes. Seuls les fichiers statiques sont servis ici dans
+    un thread ; les autres requêtes restent sur la boucle d'événements.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Signale à Django que l'instance est une coroutine (cf. MiddlewareMixin)
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
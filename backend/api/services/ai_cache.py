@@ -0,0 +1,206 @@
+"""
+Cache persistant (en base) des réponses d'AIService.
+
+Une réponse est indexée par (méthode, version du prompt, modèle, empreinte
+de la description normalisée) : une description ressaisie à l'identique,
+aux accents, à la casse ou à la ponctuation près, est servie sans nouvel
+appel à Mistral, quel que soit le processus qui l'a analysée. Changer un
+prompt (incrémenter sa version) invalide ses réponses en cache.
+
+Les entrées expirent après AI_CACHE_TTL secondes ; au-delà de
+AI_CACHE_MAX_ENTRIES, les moins récemment utilisées sont supprimées.
+
+À défaut de réponse exacte, une réponse obtenue pour une description quasi
+identique (« Pose véranda 15 m² » / « pose d'une véranda de 15m2 ») est
+réutilisée si leur similarité atteint AI_SIMILARITY_THRESHOLD (voir
+similarity_index). L'index de similarité de chaque processus est complété
+au fil des réponses enregistrées, par lui-même ou par les autres processus.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Optional, Dict, Any
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from core.models import AIResponse
+from .geocode_cache import normalize_query
+from .similarity_index import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+# Fraction de AI_CACHE_MAX_ENTRIES conservée lors d'une éviction (évite d'évincer à chaque ajout)
+EVICTION_TARGET = 0.9
+
+
+def normalize_description(description: str) -> str:
+    """Description normalisée (casse, accents, ponctuation et espaces) servant de clé."""
+    return normalize_query(description)
+
+
+class AIResponseCache:
+    """Cache des réponses d'AIService en base, à durée de vie et taille bornées."""
+
+    def __init__(self, ttl: int, max_entries: int, similarity_threshold: float = 0,
+                 similarity_sync_interval: float = 30):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.similarity_sync_interval = similarity_sync_interval
+        self.index = SimilarityIndex()
+        # Plus grand identifiant d'AIResponse déjà indexé, et date de la dernière synchronisation
+        self._indexed_pk = 0
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0})
+
+    @classmethod
+    def from_settings(cls) -> "AIResponseCache":
+        return cls(
+            ttl=settings.AI_CACHE_TTL,
+            max_entries=settings.AI_CACHE_MAX_ENTRIES,
+            similarity_threshold=settings.AI_SIMILARITY_THRESHOLD,
+            similarity_sync_interval=settings.AI_SIMILARITY_SYNC_INTERVAL,
+        )
+
+    @staticmethod
+    def key(method: str, prompt_version: int, model: str, description: str) -> str:
+        normalized = normalize_description(description)
+        return hashlib.sha256(f"{method}\x00{prompt_version}\x00{model}\x00{normalized}".encode()).hexdigest()
+
+    def _record(self, method: str, counter: str) -> None:
+        with self._lock:
+            self._stats[method][counter] += 1
+
+    def _expiry(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    def get(self, method: str, prompt_version: int, model: str, description: str) -> Optional[Any]:
+        """
+        Réponse en cache pour cette description ou, à défaut, pour une
+        description similaire ; None si aucune (ou base indisponible).
+        """
+        key = self.key(method, prompt_version, model, description)
+        counter = 'hits'
+        try:
+            entry = AIResponse.objects.filter(key=key).only('pk', 'response', 'created_at').first()
+            if entry is not None and entry.created_at < self._expiry():
+                AIResponse.objects.filter(pk=entry.pk).delete()
+                entry = None
+            if entry is None and self.similarity_threshold > 0:
+                entry = self._get_similar((method, prompt_version, model), description)
+                counter = 'similar_hits'
+            if entry is not None:
+                AIResponse.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        except DatabaseError as e:
+            logger.warning(f"AI response cache unavailable: {e}")
+            entry = None
+        self._record(method, 'misses' if entry is None else counter)
+        return None if entry is None else entry.response
+
+    def _get_similar(self, namespace, description: str) -> Optional[AIResponse]:
+        """Entrée valide la plus similaire à la description, ou None."""
+        self.sync_index()
+        for pk, score in self.index.query(namespace, description, self.similarity_threshold):
+            entry = AIResponse.objects.filter(pk=pk, created_at__gte=self._expiry()).only(
+                'pk', 'response', 'description'
+            ).first()
+            if entry is None:
+                # Entrée expirée ou évincée depuis son indexation
+                self.index.remove(pk)
+                continue
+            logger.info(f"Reusing {namespace[0]} response for similar description ({score:.2f}): "
+                        f"{description[:60]!r} ~ {entry.description[:60]!r}")
+            return entry
+        return None
+
+    def sync_index(self, force: bool = False) -> None:
+        """Indexe les réponses enregistrées depuis la dernière synchronisation (tous processus)."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._synced_at is not None and now - self._synced_at < self.similarity_sync_interval:
+                return
+            self._synced_at = now
+            since = self._indexed_pk
+        rows = AIResponse.objects.filter(pk__gt=since, created_at__gte=self._expiry()).order_by('pk').values_list(
+            'pk', 'method', 'prompt_version', 'model', 'description'
+        )
+        for pk, method, prompt_version, model, description in rows.iterator():
+            self.index.add(pk, (method, prompt_version, model), description)
+            since = pk
+        with self._lock:
+            self._indexed_pk = max(self._indexed_pk, since)
+
+    def set(self, method: str, prompt_version: int, model: str, description: str, response: Any) -> None:
+        """Enregistre une réponse valide de Mistral (jamais une valeur de repli)."""
+        key = self.key(method, prompt_version, model, description)
+        try:
+            entry, _ = AIResponse.objects.update_or_create(key=key, defaults={
+                'method': method,
+                'prompt_version': prompt_version,
+                'model': model,
+                'description': description,
+                'response': response,
+                'created_at': timezone.now(),
+                'last_used_at': timezone.now(),
+            })
+            self._evict()
+        except IntegrityError:
+            # Même réponse enregistrée au même instant par un autre processus
+            return
+        except DatabaseError as e:
+            logger.warning(f"AI response cache unavailable: {e}")
+            return
+        if self.similarity_threshold > 0:
+            self.index.add(entry.pk, (method, prompt_version, model), description)
+        self._record(method, 'stores')
+
+    def _evict(self) -> None:
+        """Supprime les entrées expirées puis, au-delà de la taille maximale, les moins récemment utilisées."""
+        AIResponse.objects.filter(created_at__lt=self._expiry()).delete()
+        excess = AIResponse.objects.count() - self.max_entries
+        if excess > 0:
+            excess += int(self.max_entries * (1 - EVICTION_TARGET))
+            oldest = AIResponse.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess]
+            AIResponse.objects.filter(pk__in=list(oldest)).delete()
+
+    def clear(self) -> int:
+        """Vide le cache ; retourne le nombre d'entrées supprimées."""
+        return AIResponse.objects.all().delete()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Taux de succès par méthode (processus courant) et contenu du cache
+        (entrées et succès cumulés, tous processus confondus).
+        """
+        with self._lock:
+            process = {method: dict(counters) for method, counters in self._stats.items()}
+        for counters in process.values():
+            lookups = counters['hits'] + counters['similar_hits'] + counters['misses']
+            counters['hit_ratio'] = (
+                round((counters['hits'] + counters['similar_hits']) / lookups, 3) if lookups else None
+            )
+
+        stored = {
+            row['method']: {'entries': row['entries'], 'hits': row['hits'] or 0}
+            for row in AIResponse.objects.values('method').annotate(entries=Count('pk'), hits=Sum('hits'))
+        }
+        return {
+            'ttl': self.ttl,
+            'max_entries': self.max_entries,
+            'entries': sum(s['entries'] for s in stored.values()),
+            'methods': process,
+            'stored': stored,
+            'similarity': dict(self.index.stats(), threshold=self.similarity_threshold),
+        }
+
+
+# Instance singleton pour réutilisation
+ai_response_cache = AIResponseCache.from_settings()
@@ -0,0 +1,409 @@
+"""
+Appels à l'IA en tâche de fond, suivis par interrogation ou flux SSE.
+
+La création d'un job n'ajoute qu'une ligne `AIJob` et rend la main : le
+processus web n'attend plus Mistral (jusqu'à 20 s, 40 s pour analyze_all).
+Un pool borné de threads par processus (AI_JOB_WORKERS) réclame les jobs en
+attente et exécute la méthode d'AIService demandée, réponse de Mistral en
+flux. Au-delà de AI_JOB_MAX_PENDING jobs en attente, les nouveaux sont
+refusés (AIJobQueueFull).
+
+Le texte reçu de Mistral est tenu en mémoire pour les flux SSE du même
+processus, et enregistré en base (AIJob.partial) toutes les
+AI_JOB_PROGRESS_INTERVAL secondes pour l'interrogation et les flux servis
+par les autres processus.
+
+Un job est réclamé par une mise à jour conditionnelle de son statut : un
+seul worker, tous processus confondus, l'obtient. Tant qu'il s'exécute, un
+thread du processus rafraîchit son signe de vie (AIJob.heartbeat_at) : la
+durée d'un appel n'est pas bornée (le délai de Mistral s'applique entre deux
+fragments de la réponse). Un job « en cours » sans signe de vie depuis
+AI_JOB_STALE_AFTER secondes (processus arrêté) passe en échec
+(l'utilisateur, qui attend la réponse, relance sa demande) ; les jobs
+terminés sont supprimés après AI_JOB_TTL secondes. Ce nettoyage a lieu au
+plus une fois par AI_JOB_HOUSEKEEPING_INTERVAL secondes et par processus.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Optional, Dict, Any, Tuple, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import AIJob
+from .ai_service import AIService
+
+logger = logging.getLogger(__name__)
+
+# Intervalle maximal sans événement sur un flux SSE (commentaire de maintien de la connexion)
+STREAM_KEEPALIVE = 15
+
+
+class AIJobQueueFull(Exception):
+    """Trop de jobs en attente : la demande est à renouveler plus tard."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("File des jobs IA pleine")
+        self.retry_after = retry_after
+
+
+def _run_analyze_project(job, on_token):
+    result = AIService.analyze_project(job.description, on_token=on_token)
+    return result, None if result else "L'IA n'a pas pu analyser le projet"
+
+
+def _run_suggest_documents(job, on_token):
+    result = AIService.suggest_documents(job.description, job.nature_travaux, on_token=on_token)
+    return result, None if result else "L'IA n'a pas pu suggérer de documents"
+
+
+def _run_configure_custom_project(job, on_token):
+    return AIService.configure_custom_project(job.description, job.nature_travaux, on_token=on_token), None
+
+
+def _run_analyze_all(job, on_token):
+    result = AIService.analyze_all(job.description, job.nature_travaux, on_token=on_token)
+    return result, None if result["documents"] is not None else "L'IA n'a pas pu analyser le projet"
+
+
+# Exécution de chaque méthode : (résultat, message d'erreur ou None), comme les vues synchrones
+METHODS = {
+    'analyze_project': _run_analyze_project,
+    'suggest_documents': _run_suggest_documents,
+    'configure_custom_project': _run_configure_custom_project,
+    'analyze_all': _run_analyze_all,
+}
+
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    """Événement server-sent events encodé."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines += [f"event: {event}", f"data: {json.dumps(data, ensure_ascii=False)}", "", ""]
+    return "\n".join(lines).encode()
+
+
+def token_user_id(raw_token: str) -> Optional[int]:
+    """
+    Utilisateur d'un jeton d'accès JWT, ou None s'il est invalide ou expiré.
+
+    EventSource ne permet pas d'en-tête Authorization : les flux SSE
+    acceptent aussi le jeton en paramètre `token`.
+    """
+    if not raw_token:
+        return None
+    try:
+        return AccessToken(raw_token)[settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id')]
+    except (TokenError, KeyError):
+        return None
+
+
+def stream_token(authorization: str, query_token: str) -> str:
+    """Jeton d'accès d'un flux : en-tête « Authorization: Bearer ... », sinon paramètre `token`."""
+    scheme, _, value = (authorization or '').partition(' ')
+    if scheme.lower() == 'bearer' and value.strip():
+        return value.strip()
+    return query_token or ''
+
+
+def last_event_offset(value) -> int:
+    """Reprise d'un flux SSE : longueur du texte déjà reçu (en-tête Last-Event-ID)."""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class LiveJob:
+    """Texte reçu de Mistral pour un job en cours dans ce processus."""
+
+    __slots__ = ('chunks', 'length', 'flushed_at')
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.length = 0
+        self.flushed_at = time.monotonic()
+
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+class AIJobQueue:
+    """File d'attente des appels à l'IA et pool de workers du processus."""
+
+    def __init__(self, workers: int, poll_interval: float, max_pending: int, progress_interval: float,
+                 stream_interval: float, stream_timeout: float, stale_after: float, ttl: float,
+                 housekeeping_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.progress_interval = progress_interval
+        self.stream_interval = stream_interval
+        self.stream_timeout = stream_timeout
+        self.stale_after = stale_after
+        self.ttl = ttl
+        self.housekeeping_interval = housekeeping_interval
+        # Signe de vie des jobs en cours, bien avant qu'ils soient considérés abandonnés
+        self.heartbeat_interval = stale_after / 4
+        # Dernier nettoyage (horloge monotone), None avant le premier
+        self._housekept_at: Optional[float] = None
+        # Réveil des workers à chaque job ajouté (sinon, interrogation périodique)
+        self._wakeup = threading.Semaphore(0)
+        self._threads = []
+        # Jobs en cours dans ce processus, par identifiant (chaîne)
+        self._live: Dict[str, LiveJob] = {}
+        self._lock = threading.Lock()
+        self._stats = {'done': 0, 'failed': 0, 'rejected': 0, 'run_seconds': 0.0}
+
+    @classmethod
+    def from_settings(cls) -> "AIJobQueue":
+        return cls(
+            workers=settings.AI_JOB_WORKERS,
+            poll_interval=settings.AI_JOB_POLL_INTERVAL,
+            max_pending=settings.AI_JOB_MAX_PENDING,
+            progress_interval=settings.AI_JOB_PROGRESS_INTERVAL,
+            stream_interval=settings.AI_JOB_STREAM_INTERVAL,
+            stream_timeout=settings.AI_JOB_STREAM_TIMEOUT,
+            stale_after=settings.AI_JOB_STALE_AFTER,
+            ttl=settings.AI_JOB_TTL,
+            housekeeping_interval=settings.AI_JOB_HOUSEKEEPING_INTERVAL,
+        )
+
+    def _record(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def enqueue(self, user, method: str, description: str, nature_travaux=None) -> AIJob:
+        """
+        Ajoute un appel à l'IA à la file.
+
+        Raises:
+            AIJobQueueFull: si AI_JOB_MAX_PENDING jobs sont déjà en attente
+        """
+        if AIJob.objects.filter(status='pending').count() >= self.max_pending:
+            self._record('rejected')
+            raise AIJobQueueFull(retry_after=self.poll_interval)
+        job = AIJob.objects.create(user=user, method=method, description=description,
+                                   nature_travaux=nature_travaux)
+        transaction.on_commit(self.wake)
+        return job
+
+    def wake(self) -> None:
+        """Démarre le pool si besoin et réveille un worker."""
+        self.start()
+        self._wakeup.release()
+
+    def start(self) -> None:
+        """Démarre les workers du processus (sans effet si AI_JOB_WORKERS vaut 0)."""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"ai-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            threading.Thread(target=self._heartbeat_loop, name="ai-job-heartbeat", daemon=True).start()
+        logger.info(f"Started {self.workers} AI job workers")
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                close_old_connections()
+                if self.run_next():
+                    continue
+            except Exception as e:
+                logger.error(f"AI job worker error: {e}")
+            finally:
+                close_old_connections()
+            self._wakeup.acquire(timeout=self.poll_interval)
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"AI job heartbeat error: {e}")
+            finally:
+                close_old_connections()
+
+    def heartbeat(self) -> None:
+        """Rafraîchit le signe de vie des jobs en cours dans ce processus."""
+        with self._lock:
+            job_ids = list(self._live)
+        if job_ids:
+            AIJob.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+    def _expire(self) -> None:
+        """
+        Passe en échec les jobs d'un processus arrêté et supprime les jobs
+        terminés anciens (au plus une fois par intervalle de nettoyage).
+        """
+        with self._lock:
+            if self._housekept_at is not None and time.monotonic() - self._housekept_at < self.housekeeping_interval:
+                return
+            self._housekept_at = time.monotonic()
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=self.stale_after)
+        AIJob.objects.filter(status='running').filter(
+            Q(heartbeat_at__lt=stale_before) | Q(heartbeat_at__isnull=True, started_at__lt=stale_before)
+        ).update(status='failed', finished_at=now, error="Traitement interrompu")
+        AIJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=now - timedelta(seconds=self.ttl)).delete()
+
+    def claim(self) -> Optional[AIJob]:
+        """Réclame le plus ancien job en attente, ou None si la file est vide."""
+        self._expire()
+        candidates = AIJob.objects.filter(status='pending').values_list('pk', flat=True)
+        for pk in candidates[:10]:
+            now = timezone.now()
+            claimed = AIJob.objects.filter(pk=pk, status='pending').update(
+                status='running', started_at=now, heartbeat_at=now
+            )
+            if claimed:
+                return AIJob.objects.get(pk=pk)
+        return None
+
+    def run_next(self) -> bool:
+        """Exécute un job en attente ; False si la file est vide."""
+        job = self.claim()
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def process(self, job: AIJob) -> None:
+        """Exécute un job réclamé, en publiant le texte reçu de Mistral au fil de l'eau."""
+        live = LiveJob()
+        with self._lock:
+            self._live[str(job.pk)] = live
+
+        def on_token(text):
+            with self._lock:
+                live.chunks.append(text)
+                live.length += len(text)
+                flush = time.monotonic() - live.flushed_at >= self.progress_interval
+                if flush:
+                    live.flushed_at = time.monotonic()
+            if flush:
+                AIJob.objects.filter(pk=job.pk).update(partial=live.text())
+
+        start = time.monotonic()
+        try:
+            result, error = METHODS[job.method](job, on_token)
+        except Exception as e:
+            logger.error(f"AI job {job.pk} ({job.method}) failed: {e}")
+            result, error = None, "Erreur lors de l'appel à l'IA"
+        elapsed = time.monotonic() - start
+
+        self._record('failed' if error else 'done')
+        self._record('run_seconds', elapsed)
+        try:
+            AIJob.objects.filter(pk=job.pk).update(
+                status='failed' if error else 'done', result=result, error=error or '',
+                partial=live.text(), finished_at=timezone.now()
+            )
+        finally:
+            with self._lock:
+                self._live.pop(str(job.pk), None)
+        logger.info(f"AI job {job.pk} ({job.method}) {'failed' if error else 'done'} in {elapsed * 1000:.0f} ms")
+
+    def _live_snapshot(self, job_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            live = self._live.get(str(job_id))
+            if live is None:
+                return None
+            return {'status': 'running', 'partial': live.text(), 'result': None, 'error': ''}
+
+    def _db_snapshot(self, job_id) -> Optional[Dict[str, Any]]:
+        return AIJob.objects.filter(pk=job_id).values('status', 'partial', 'result', 'error').first()
+
+    def snapshot(self, job_id) -> Optional[Dict[str, Any]]:
+        """État d'un job : statut, texte reçu, résultat et erreur (None si inconnu)."""
+        return self._live_snapshot(job_id) or self._db_snapshot(job_id)
+
+    def _events(self, state: Optional[Dict[str, Any]], cursor: Tuple[Optional[str], int]):
+        """
+        Événements SSE depuis le curseur (statut envoyé, longueur de texte
+        envoyée) : changement de statut, texte reçu, puis résultat ou erreur.
+
+        Returns:
+            (événements, nouveau curseur, flux terminé)
+        """
+        sent_status, offset = cursor
+        if state is None:
+            return [sse_event('error', {'error': "Job non trouvé"})], cursor, True
+        events = []
+        if state['status'] != sent_status:
+            events.append(sse_event('status', {'status': state['status']}))
+        partial = state['partial'] or ''
+        if len(partial) > offset:
+            events.append(sse_event('token', {'text': partial[offset:]}, event_id=len(partial)))
+            offset = len(partial)
+        finished = state['status'] in ('done', 'failed')
+        if state['status'] == 'done':
+            events.append(sse_event('result', state['result']))
+        elif state['status'] == 'failed':
+            events.append(sse_event('error', {'error': state['error']}))
+        return events, (state['status'], offset), finished
+
+    def stream(self, job_id, offset: int = 0):
+        """Flux SSE d'un job (générateur synchrone, occupe un worker WSGI pendant le flux)."""
+        cursor, deadline, last_sent = (None, offset), time.monotonic() + self.stream_timeout, time.monotonic()
+        while True:
+            events, cursor, finished = self._events(self.snapshot(job_id), cursor)
+            if events:
+                last_sent = time.monotonic()
+                yield b"".join(events)
+            elif time.monotonic() - last_sent >= STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield b": keepalive\n\n"
+            if finished:
+                return
+            if time.monotonic() >= deadline:
+                yield sse_event('timeout', {'status': cursor[0]})
+                return
+            time.sleep(self.stream_interval)
+
+    async def astream(self, job_id, offset: int = 0):
+        """Flux SSE d'un job (générateur asynchrone, sans thread occupé pendant l'attente)."""
+        db_snapshot = sync_to_async(self._db_snapshot)
+        cursor, deadline, last_sent = (None, offset), time.monotonic() + self.stream_timeout, time.monotonic()
+        while True:
+            state = self._live_snapshot(job_id) or await db_snapshot(job_id)
+            events, cursor, finished = self._events(state, cursor)
+            if events:
+                last_sent = time.monotonic()
+                yield b"".join(events)
+            elif time.monotonic() - last_sent >= STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield b": keepalive\n\n"
+            if finished:
+                return
+            if time.monotonic() >= deadline:
+                yield sse_event('timeout', {'status': cursor[0]})
+                return
+            await asyncio.sleep(self.stream_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jobs par statut (toutes instances) et compteurs du processus courant."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['live'] = len(self._live)
+        stats['run_seconds'] = round(stats['run_seconds'], 3)
+        stats['workers'] = len(self._threads)
+        counts = dict(AIJob.objects.values_list('status').annotate(n=Count('pk')).values_list('status', 'n'))
+        stats['jobs'] = {status: counts.get(status, 0) for status, _ in AIJob.STATUS_CHOICES}
+        return stats
+
+
+# Instance singleton pour réutilisation
+ai_job_queue = AIJobQueue.from_settings()
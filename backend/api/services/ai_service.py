@@ -4,6 +4,9 @@ import logging
 import os
 from dotenv import load_dotenv
 
+from .ai_cache import ai_response_cache
+from .dp_rules import dp_rules
+
 # Charger les variables d'environnement depuis le fichier .env
 load_dotenv()
 
@@ -19,9 +22,96 @@ class AIService:
     # NOTE : L'utilisateur devra configurer sa clé MISTRAL_API_KEY
     API_KEY = os.environ.get("MISTRAL_API_KEY", "VOTRE_CLE_API_ICI")
 
+    # Version de chaque prompt : à incrémenter à toute modification, pour
+    # invalider les réponses en cache obtenues avec l'ancien prompt
+    PROMPT_VERSIONS = {
+        "analyze_project": 1,
+        "suggest_documents": 1,
+        "configure_custom_project": 1,
+    }
+
+    # Clés des réponses validées de chaque méthode
+    ANALYSIS_KEYS = ["couleurFacade", "couleurToiture", "materiauFacade", "materiauToiture", "hauteurConstruction"]
+    DOCUMENT_KEYS = ["dp1", "dp2", "dp3", "dp4", "dp5", "dp6", "dp7", "dp8"]
+    CONFIGURATION_FIELDS = ["surfaceTerrain", "surfacePlancherCreee", "hauteurConstruction", "couleurFacade",
+                            "materiauFacade", "couleurToiture", "materiauToiture"]
+    # Pièces toujours exigées, ajoutées si l'IA les omet
+    ALWAYS_REQUIRED_DOCUMENTS = ["dp1", "dp7"]
+
+    @staticmethod
+    def default_configuration():
+        """Configuration d'un projet personnalisé utilisée si l'IA échoue."""
+        return {
+            "requiredFields": ["surfaceTerrain", "surfacePlancherCreee"],
+            "requiredDocuments": ["dp1", "dp2", "dp6", "dp7"],
+            "specificQuestions": [],
+            "projectCategory": "autre"
+        }
+
+    @classmethod
+    def analysis_result(cls, data):
+        """Analyse validée (toutes les clés attendues, éventuellement nulles), ou None si aucune clé n'est renseignée."""
+        if not isinstance(data, dict) or not any(key in data for key in cls.ANALYSIS_KEYS):
+            return None
+        return {key: data.get(key) for key in cls.ANALYSIS_KEYS}
+
+    @classmethod
+    def documents_result(cls, data):
+        """Pièces DP validées ({dp1: bool, ...}, dp1 et dp7 toujours requis), ou None si aucune pièce n'est renseignée."""
+        if not isinstance(data, dict):
+            return None
+        documents = {key: bool(data[key]) for key in cls.DOCUMENT_KEYS if key in data}
+        if not documents:
+            return None
+        for doc in cls.ALWAYS_REQUIRED_DOCUMENTS:
+            documents[doc] = True
+        return documents
+
+    @classmethod
+    def configuration_result(cls, data):
+        """Configuration validée (dp1 et dp7 toujours requis), ou None."""
+        if not isinstance(data, dict):
+            return None
+        required_docs = data.get("requiredDocuments")
+        if not isinstance(required_docs, list):
+            required_docs = []
+        for doc in cls.ALWAYS_REQUIRED_DOCUMENTS:
+            if doc not in required_docs:
+                required_docs.append(doc)
+        data["requiredDocuments"] = required_docs
+        return data
+
     @classmethod
-    def call_mistral(cls, prompt):
-        """Appel à l'API Mistral Cloud."""
+    def cached_response(cls, method, description):
+        """Réponse en cache d'une méthode pour cette description, ou None."""
+        return ai_response_cache.get(method, cls.PROMPT_VERSIONS[method], cls.MODEL_NAME, description)
+
+    @classmethod
+    def cache_response(cls, method, description, response):
+        """Met en cache une réponse valide de Mistral."""
+        ai_response_cache.set(method, cls.PROMPT_VERSIONS[method], cls.MODEL_NAME, description, response)
+
+    @staticmethod
+    def clean_content(content):
+        """Contenu JSON d'une réponse, sans balises markdown."""
+        content = content.strip()
+        # Nettoyage si jamais le modèle a inclus des balises markdown malgré json_object
+        if content.startswith("```"):
+            parts = content.split("```")
+            if len(parts) > 1:
+                content = parts[1]
+                if content.startswith("json"):
+                    content = content[4:]
+        return content.strip()
+
+    @classmethod
+    def call_mistral(cls, prompt, timeout=20, on_token=None):
+        """Appel à l'API Mistral Cloud.
+
+        Avec `on_token`, la réponse est demandée en flux (stream) : chaque
+        fragment de texte reçu lui est passé au fil de la génération. Le
+        délai `timeout` s'applique alors entre deux fragments.
+        """
         if cls.API_KEY == "VOTRE_CLE_API_ICI" or not cls.API_KEY:
             logger.error("Clé API Mistral non configurée.")
             return None
@@ -42,26 +132,44 @@ class AIService:
         }
 
         try:
-            response = requests.post(cls.MISTRAL_URL, json=payload, headers=headers, timeout=20)
+            if on_token is not None:
+                return cls.clean_content(cls._stream_mistral(payload, headers, timeout, on_token))
+            response = requests.post(cls.MISTRAL_URL, json=payload, headers=headers, timeout=timeout)
             response.raise_for_status()
             result = response.json()
-            content = result['choices'][0]['message']['content'].strip()
-            
-            # Nettoyage si jamais le modèle a inclus des balises markdown malgré json_object
-            if content.startswith("```"):
-                parts = content.split("```")
-                if len(parts) > 1:
-                    content = parts[1]
-                    if content.startswith("json"):
-                        content = content[4:]
-            return content.strip()
+            return cls.clean_content(result['choices'][0]['message']['content'])
         except Exception as e:
             logger.error(f"Erreur lors de l'appel à Mistral Cloud: {str(e)}")
             return None
 
     @classmethod
-    def analyze_project(cls, description):
+    def _stream_mistral(cls, payload, headers, timeout, on_token):
+        """Réponse de Mistral en flux (server-sent events), transmise fragment par fragment."""
+        payload = dict(payload, stream=True)
+        headers = dict(headers, Accept="text/event-stream")
+        chunks = []
+        with requests.post(cls.MISTRAL_URL, json=payload, headers=headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            # chunk_size=None : chaque fragment (transfer-encoding chunked) est lu dès sa réception
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    chunks.append(delta)
+                    on_token(delta)
+        return "".join(chunks)
+
+    @classmethod
+    def analyze_project(cls, description, on_token=None):
         """Analyse la description du projet pour suggérer des matériaux et couleurs."""
+        cached = cls.cached_response("analyze_project", description)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         Analyse la description suivante d'un projet de travaux pour un formulaire CERFA.
         Extrais les informations sous forme de JSON uniquement.
@@ -79,20 +187,37 @@ class AIService:
         
         Règle : Si une information n'est pas mentionnée, mets null.
         """
-        response_text = cls.call_mistral(prompt)
+        response_text = cls.call_mistral(prompt, on_token=on_token)
         if response_text:
             try:
-                data = json.loads(response_text)
                 # Assurer que les clés attendues existent (même si null)
-                expected_keys = ["couleurFacade", "couleurToiture", "materiauFacade", "materiauToiture", "hauteurConstruction"]
-                return {key: data.get(key) for key in expected_keys}
+                result = cls.analysis_result(json.loads(response_text))
+                if result is not None:
+                    cls.cache_response("analyze_project", description, result)
+                    return result
             except json.JSONDecodeError:
                 logger.error(f"Erreur de décodage JSON: {response_text}")
-        return {"couleurFacade": None, "couleurToiture": None, "materiauFacade": None, "materiauToiture": None, "hauteurConstruction": None}
+        return {key: None for key in cls.ANALYSIS_KEYS}
 
     @classmethod
-    def suggest_documents(cls, description):
-        """Détermine les documents DP obligatoires en fonction du type de projet."""
+    def suggest_documents(cls, description, nature_travaux=None, on_token=None):
+        """Détermine les documents DP obligatoires en fonction du type de projet.
+
+        Les règles (voir dp_rules) répondent sans appel à Mistral lorsque le
+        type de travaux est sans ambiguïté.
+        """
+        decision = dp_rules.decide("suggest_documents", description, nature_travaux)
+        if decision is not None:
+            return decision.documents()
+        return cls.suggest_documents_llm(description, on_token=on_token)
+
+    @classmethod
+    def suggest_documents_llm(cls, description, on_token=None):
+        """Documents DP obligatoires selon Mistral (ou le cache), sans les règles."""
+        cached = cls.cached_response("suggest_documents", description)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         En fonction de la description du projet ci-dessous, détermine si les pièces suivantes (DP1 à DP8) sont obligatoires pour une déclaration préalable.
         
@@ -110,21 +235,34 @@ class AIService:
 
         Réponds uniquement avec un objet JSON où les clés sont dp1, dp2, etc. et les valeurs sont des booléens.
         """
-        response_text = cls.call_mistral(prompt)
+        response_text = cls.call_mistral(prompt, on_token=on_token)
         if response_text:
             try:
-                return json.loads(response_text)
+                result = cls.documents_result(json.loads(response_text))
+                if result is not None:
+                    cls.cache_response("suggest_documents", description, result)
+                return result
             except json.JSONDecodeError:
                 logger.error("Erreur de décodage JSON de la réponse Mistral")
         return None
 
     @classmethod
-    def configure_custom_project(cls, description):
+    def configure_custom_project(cls, description, nature_travaux=None, on_token=None):
         """Configure dynamiquement un projet personnalisé (type 'Autre').
         
         Retourne une configuration complète incluant les champs requis,
-        les documents obligatoires et les questions spécifiques.
+        les documents obligatoires et les questions spécifiques. Si la
+        description relève sans ambiguïté d'un type de travaux connu, sa
+        configuration est retournée sans appel à Mistral (voir dp_rules).
         """
+        decision = dp_rules.decide("configure_custom_project", description, nature_travaux)
+        if decision is not None:
+            return decision.configuration()
+
+        cached = cls.cached_response("configure_custom_project", description)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         Analyse la description suivante d'un projet de travaux (type personnalisé/autre) pour configurer un formulaire CERFA.
         
@@ -155,24 +293,139 @@ class AIService:
             "projectCategory": "construction|modification|amenagement|demolition"
         }}
         """
-        response_text = cls.call_mistral(prompt)
+        response_text = cls.call_mistral(prompt, on_token=on_token)
         if response_text:
             try:
-                data = json.loads(response_text)
                 # S'assurer que dp1 et dp7 sont toujours présents
-                required_docs = data.get("requiredDocuments", [])
-                if "dp1" not in required_docs:
-                    required_docs.append("dp1")
-                if "dp7" not in required_docs:
-                    required_docs.append("dp7")
-                data["requiredDocuments"] = required_docs
-                return data
+                data = cls.configuration_result(json.loads(response_text))
+                if data is not None:
+                    cls.cache_response("configure_custom_project", description, data)
+                    return data
             except json.JSONDecodeError:
                 logger.error(f"Erreur de décodage JSON pour configure_custom_project: {response_text}")
         # Configuration par défaut si l'IA échoue
-        return {
-            "requiredFields": ["surfaceTerrain", "surfacePlancherCreee"],
-            "requiredDocuments": ["dp1", "dp2", "dp6", "dp7"],
-            "specificQuestions": [],
-            "projectCategory": "autre"
+        return cls.default_configuration()
+
+    @classmethod
+    def analyze_all(cls, description, nature_travaux=None, on_token=None):
+        """Analyse complète d'un projet en un seul appel à Mistral.
+
+        Réunit les réponses d'analyze_project (« analysis »), de
+        suggest_documents (« documents ») et de configure_custom_project
+        (« configuration »). Chaque partie valide est mise en cache sous sa
+        méthode d'origine : les points d'entrée existants la servent ensuite
+        sans nouvel appel. Seules les parties absentes du cache sont
+        demandées ; une partie invalide dans la réponse combinée est obtenue
+        par l'appel dédié. Si l'appel échoue, chaque partie prend la valeur de
+        repli de sa méthode. Les pièces et la configuration décidées par les
+        règles (voir dp_rules) ne sont pas demandées ; s'il ne reste que
+        l'analyse, le prompt dédié, plus court, est utilisé.
+
+        `on_token` reçoit le texte des réponses de Mistral au fil de leur
+        génération (voir call_mistral).
+
+        Le prompt combiné reprend les règles des trois prompts : toute
+        modification de l'un doit s'y reporter (et incrémenter sa version).
+        """
+        # Par partie : méthode d'origine, validation, appel dédié, valeur de repli.
+        # L'analyse (matériaux, couleurs) ne dépend pas de la nature des travaux.
+        methods = {
+            "analysis": ("analyze_project", cls.analysis_result,
+                         lambda: cls.analyze_project(description, on_token=on_token),
+                         lambda: {key: None for key in cls.ANALYSIS_KEYS}),
+            "documents": ("suggest_documents", cls.documents_result,
+                          lambda: cls.suggest_documents(description, nature_travaux, on_token=on_token),
+                          lambda: None),
+            "configuration": ("configure_custom_project", cls.configuration_result,
+                              lambda: cls.configure_custom_project(description, nature_travaux, on_token=on_token),
+                              cls.default_configuration),
+        }
+        decision = dp_rules.decide("analyze_all", description, nature_travaux)
+        ruled = {} if decision is None else {
+            "documents": decision.documents(),
+            "configuration": decision.configuration(),
         }
+        result = {
+            part: ruled[part] if part in ruled else cls.cached_response(method, description)
+            for part, (method, *_) in methods.items()
+        }
+        missing = [part for part, value in result.items() if value is None]
+        if not missing:
+            return result
+        if missing == ["analysis"]:
+            result["analysis"] = methods["analysis"][2]()
+            return result
+
+        prompt = f"""
+        Analyse la description suivante d'un projet de travaux pour un formulaire CERFA de déclaration préalable.
+
+        Description: "{description}"
+
+        Réponds uniquement avec un objet JSON valide contenant les trois parties suivantes :
+        {{
+            "analysis": {{
+                "couleurFacade": "choisir précisément parmi [Blanc, Beige, Gris clair, Gris foncé, Noir, Bleu, Vert, Marron, Rouge, Terracotta, Autre]",
+                "couleurToiture": "choisir précisément parmi [Blanc, Beige, Gris clair, Gris foncé, Noir, Bleu, Vert, Marron, Rouge, Terracotta, Autre]",
+                "materiauFacade": "choisir précisément parmi [Enduit, Crépi, Bardage bois, Pierre, Brique, Béton, Métal, Autre]",
+                "materiauToiture": "choisir précisément parmi [Tuiles, Ardoises, Zinc, Bac acier, Toit terrasse, Bois, Autre]",
+                "hauteurConstruction": "nombre en mètres (float) ou null si non mentionné"
+            }},
+            "documents": {{ "dp1": true, "dp2": false, ... "dp8": true }},
+            "configuration": {{
+                "requiredFields": ["surfaceTerrain", ...],
+                "requiredDocuments": ["dp1", "dp2", ...],
+                "specificQuestions": [
+                    {{ "field": "nomDuChamp", "label": "Question à afficher", "type": "text|number|boolean|select", "options": ["option1", "option2"] }}
+                ],
+                "projectCategory": "construction|modification|amenagement|demolition"
+            }}
+        }}
+
+        Règles pour "analysis" : si une information n'est pas mentionnée, mets null.
+
+        Règles pour "documents" (booléen pour chaque pièce dp1 à dp8) :
+        - dp1: Plan de situation (Toujours obligatoire)
+        - dp2: Plan de masse (Obligatoire si création de construction ou modification d'emprise au sol)
+        - dp3: Plan de coupe (Obligatoire si le profil du terrain est modifié)
+        - dp4: Plans des façades et des toitures (Obligatoire si modification de l'aspect extérieur)
+        - dp5: Représentation de l'aspect extérieur (Si modification visible depuis l'espace public)
+        - dp6: Document graphique d'insertion (Si modification du volume ou de l'aspect extérieur)
+        - dp7: Photographie environnement proche (Toujours obligatoire)
+        - dp8: Photographie environnement lointain (Toujours obligatoire)
+
+        Règles pour "configuration" (configuration du formulaire pour un projet de type personnalisé/autre) :
+        1. requiredFields : champs obligatoires parmi surfaceTerrain, surfacePlancherCreee, hauteurConstruction, couleurFacade, materiauFacade, couleurToiture, materiauToiture
+        2. requiredDocuments : documents obligatoires parmi dp1 à dp8
+           - dp1 (Plan de situation) : TOUJOURS obligatoire
+           - dp2 (Plan de masse) : Si création de construction ou modification d'emprise au sol
+           - dp3 (Plan de coupe) : Si modification du profil du terrain ou création en hauteur
+           - dp4 (Façades et toitures) : Si modification de l'aspect extérieur d'un bâtiment
+           - dp5 (Représentation extérieure) : Si modification visible depuis l'espace public
+           - dp6 (Insertion paysagère) : Si création ou modification de volume
+           - dp7 (Photo proche) : TOUJOURS obligatoire
+           - dp8 (Photo lointaine) : Si impact paysager significatif
+        3. specificQuestions : questions spécifiques à ce type de projet (0 à 3 questions max)
+        """
+        # Réponse environ trois fois plus longue que celle d'un prompt dédié
+        response_text = cls.call_mistral(prompt, timeout=40, on_token=on_token)
+        data = {}
+        if response_text:
+            try:
+                data = json.loads(response_text)
+            except json.JSONDecodeError:
+                logger.error(f"Erreur de décodage JSON pour analyze_all: {response_text}")
+            if not isinstance(data, dict):
+                data = {}
+
+        for part in missing:
+            method, validate, dedicated, default = methods[part]
+            value = validate(data.get(part))
+            if value is not None:
+                cls.cache_response(method, description, value)
+            elif response_text:
+                logger.warning(f"Partie '{part}' invalide dans la réponse combinée, appel dédié")
+                value = dedicated()
+            else:
+                value = default()
+            result[part] = value
+        return result
@@ -0,0 +1,199 @@
+"""
+Client asynchrone des API cadastre et adresse, pour les vues ASGI.
+
+Les appels amont passent par une session aiohttp à pool de connexions
+partagé : une attente amont n'occupe pas de thread, si bien qu'un seul
+processus ASGI peut en mener plusieurs centaines de front.
+
+Les caches, le stockage local, les disjoncteurs et le limiteur de débit
+sont ceux de `cadastre_service` ; les recherches locales (index, SQLite),
+synchrones et sans attente réseau, s'exécutent dans un thread.
+"""
+
+import asyncio
+import logging
+from collections import namedtuple
+from typing import Optional, Dict, Any, List
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .cadastre_service import (
+    CadastreService, cadastre_service, APICARTO_BASE, API_ADRESSE_BASE,
+    parse_geocode_results, parse_reverse_result, point_geom_param,
+)
+from .circuit_breaker import CircuitOpenError
+from .geocode_cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+# Erreurs d'un appel amont (réseau, timeout, statut HTTP, JSON invalide)
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+# Statut et corps JSON décodé d'une réponse amont
+UpstreamResponse = namedtuple('UpstreamResponse', ['status_code', 'data'])
+
+
+class AsyncCadastreClient:
+    """Variantes asynchrones des recherches de CadastreService."""
+
+    def __init__(self, service: CadastreService):
+        self.service = service
+        # Une session par boucle d'événements (boucle du worker ASGI, ou
+        # boucle éphémère d'une vue async servie en WSGI), avec son gardien
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._guards: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+    async def session(self) -> aiohttp.ClientSession:
+        """
+        Session HTTP partagée de la boucle d'événements courante.
+
+        Elle est fermée dans sa boucle, juste avant l'arrêt de celle-ci :
+        son gardien est un générateur asynchrone, que la boucle finalise via
+        loop.shutdown_asyncgens() (appelé par asyncio.run, donc par uvicorn et
+        par async_to_sync). Les sessions de boucles fermées sans cette étape
+        sont oubliées.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            for other in [other for other in self._sessions if other.is_closed()]:
+                logger.warning("Dropping aiohttp session of a closed event loop")
+                self._sessions.pop(other, None)
+                self._guards.pop(other, None)
+            session = aiohttp.ClientSession(
+                headers=dict(self.service.session.headers),
+                connector=aiohttp.TCPConnector(limit=settings.ASYNC_UPSTREAM_MAX_CONNECTIONS),
+            )
+            self._sessions[loop] = session
+            guard = self._close_at_shutdown(loop, session)
+            await guard.__anext__()
+            self._guards[loop] = guard
+        return session
+
+    async def _close_at_shutdown(self, loop, session: aiohttp.ClientSession):
+        try:
+            yield
+        finally:
+            if self._sessions.get(loop) is session:
+                del self._sessions[loop]
+                self._guards.pop(loop, None)
+            await session.close()
+
+    async def _get_json(self, upstream: str, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET amont protégé par le disjoncteur du service, avec timeout adaptatif.
+
+        Raises:
+            CircuitOpenError: Si le circuit du service est ouvert
+            aiohttp.ClientError: Erreur réseau ou statut HTTP >= 400
+        """
+        breaker = self.service.breakers[upstream]
+        timeout = aiohttp.ClientTimeout(sock_connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+                                        sock_read=breaker.timeout())
+        params = {key: str(value) for key, value in params.items()}
+
+        async def request():
+            session = await self.session()
+            async with session.get(url, params=params, timeout=timeout) as response:
+                data = await response.json(content_type=None) if response.status < 400 else None
+                return UpstreamResponse(response.status, data)
+
+        response = await breaker.acall(request)
+        if response.status_code >= 400:
+            raise aiohttp.ClientError(f"{response.status_code} error for url: {url}")
+        return response.data
+
+    async def geocode_address(self, address: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Voir CadastreService.geocode_address."""
+        cache = self.service.geocode_cache
+        cached = cache.get(address, limit)
+        if cached is not None:
+            return cached
+
+        try:
+            cache.record_upstream_call()
+            await self.service.adresse_limiter.acquire_async()
+            data = await self._get_json('adresse', f"{API_ADRESSE_BASE}/search/",
+                                        {'q': address, 'limit': limit})
+            results = parse_geocode_results(data)
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Error geocoding address: {e}")
+            return []
+        cache.set(address, limit, results)
+        return results
+
+    async def reverse_geocode(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        """Voir CadastreService.reverse_geocode."""
+        cache = self.service.reverse_cache
+        cached = cache.get(lon, lat)
+        if cached is not MISSING:
+            return cached
+
+        try:
+            await self.service.adresse_limiter.acquire_async()
+            data = await self._get_json('adresse', f"{API_ADRESSE_BASE}/reverse/", {'lon': lon, 'lat': lat})
+            result = parse_reverse_result(data)
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Error reverse geocoding: {e}")
+            return None
+        cache.set(lon, lat, result)
+        return result
+
+    async def _apicarto_first_feature(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            data = await self._get_json('apicarto', f"{APICARTO_BASE}/parcelle", params)
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Error fetching parcelle: {e}")
+            return None
+        features = data.get('features') or []
+        return features[0] if features else None
+
+    async def get_parcelle_by_id(self, code_insee: str, section: str, numero: str) -> Optional[Dict[str, Any]]:
+        """Voir CadastreService.get_parcelle_by_id."""
+        code_insee = code_insee.zfill(5)
+        section = section.upper().strip()
+        numero = numero.zfill(4)
+
+        parcelle = await sync_to_async(self.service._find_parcelle_by_id_locally, thread_sensitive=False)(
+            code_insee, section, numero
+        )
+        if parcelle is not MISSING:
+            return parcelle
+        return await self._apicarto_first_feature({'code_insee': code_insee, 'section': section, 'numero': numero})
+
+    async def search_parcelles(self, code_insee: str, section: Optional[str] = None) -> Dict[str, Any]:
+        """Voir CadastreService.search_parcelles."""
+        params = {'code_insee': code_insee.zfill(5)}
+        if section:
+            params['section'] = section.upper().strip()
+        try:
+            return await self._get_json('apicarto', f"{APICARTO_BASE}/parcelle", params)
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Error searching parcelles: {e}")
+            return {"type": "FeatureCollection", "features": []}
+
+    async def get_parcelle_by_coordinates(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Voir CadastreService.get_parcelle_by_coordinates."""
+        find_loaded = sync_to_async(self.service._find_parcelle_loaded, thread_sensitive=False)
+        parcelle = await find_loaded(lat, lon)
+        if parcelle:
+            return parcelle
+
+        try:
+            address = await self.reverse_geocode(lon, lat)
+        except CircuitOpenError as e:
+            logger.warning(f"Local parcel lookup skipped: {e}")
+            address = None
+        if address and address.get('citycode'):
+            find_in_commune = sync_to_async(self.service._find_parcelle_in_commune, thread_sensitive=False)
+            parcelle = await find_in_commune(address['citycode'], lat, lon)
+            if parcelle:
+                return parcelle
+
+        return await self._apicarto_first_feature({'geom': point_geom_param(lat, lon)})
+
+
+# Instance singleton pour réutilisation
+async_cadastre_client = AsyncCadastreClient(cadastre_service)
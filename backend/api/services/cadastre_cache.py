@@ -0,0 +1,475 @@
+"""
+Cache disque persistant pour les fichiers GeoJSON communaux Etalab.
+
+Chaque couche (parcelles, batiments) d'une commune est stockée compressée
+en gzip sous ``<cache_dir>/<layer>/<code_insee>.json.gz``, accompagnée d'un
+fichier ``.meta.json`` contenant les en-têtes de revalidation (ETag,
+Last-Modified) et la date de récupération.
+
+Le fichier gzip est directement servable avec ``Content-Encoding: gzip``,
+sans recompression.
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DATA_SUFFIX = ".json.gz"
+META_SUFFIX = ".meta.json"
+LOCK_SUFFIX = ".lock"
+
+# Code INSEE normalisé : 5 chiffres, ou 2A/2B suivi de 3 chiffres (Corse)
+CODE_INSEE_RE = re.compile(r"\d{5}|2[AB]\d{3}")
+# Composant de chemin admis pour une couche ou un nom de fichier dérivé
+PATH_SEGMENT_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
+
+def is_valid_code_insee(code_insee) -> bool:
+    return isinstance(code_insee, str) and CODE_INSEE_RE.fullmatch(code_insee) is not None
+
+
+def cache_path(directory: str, *parts: str) -> str:
+    """
+    Construit un chemin sous `directory` à partir de composants de clé.
+
+    Chaque composant doit être un nom simple (pas de séparateur ni de '..'),
+    et le chemin résolu (liens symboliques compris) doit rester sous le
+    répertoire du cache ; sinon ValueError.
+    """
+    for part in parts:
+        if not PATH_SEGMENT_RE.fullmatch(part):
+            raise ValueError(f"Composant de chemin de cache invalide : {part!r}")
+    path = os.path.join(directory, *parts)
+    root = os.path.realpath(directory)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f"Chemin hors du répertoire de cache : {path}")
+    return path
+
+
+def check_code_insee(code_insee: str) -> None:
+    if not is_valid_code_insee(code_insee):
+        raise ValueError(f"Code INSEE invalide : {code_insee!r}")
+
+
+def iter_file(path: str, compressed: bool = True, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Itère par blocs sur un fichier gzip, brut ou décompressé.
+
+    Le fichier est ouvert immédiatement : un remplacement ou une éviction
+    concurrente n'interrompt pas une lecture déjà commencée.
+    """
+    f = open(path, 'rb') if compressed else gzip.open(path, 'rb')
+
+    def _chunks():
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    return _chunks()
+
+
+class CommuneFileCache:
+    """Cache disque LRU, borné en taille, des fichiers communaux."""
+
+    def __init__(self, directory: str, max_bytes: int, ttl: int):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'stale_served': 0,
+            'coalesced': 0,
+            'evictions': 0,
+        }
+
+    @classmethod
+    def from_settings(cls) -> "CommuneFileCache":
+        """Construit le cache à partir des réglages Django (CADASTRE_CACHE_*)."""
+        from django.conf import settings
+
+        return cls(
+            directory=settings.CADASTRE_CACHE_DIR,
+            max_bytes=settings.CADASTRE_CACHE_MAX_BYTES,
+            ttl=settings.CADASTRE_CACHE_TTL,
+        )
+
+    # ------------------------------------------------------------------
+    # Chemins et métadonnées
+    # ------------------------------------------------------------------
+
+    def _path(self, layer: str, code_insee: str, suffix: str) -> str:
+        check_code_insee(code_insee)
+        return cache_path(self.directory, layer, f"{code_insee}{suffix}")
+
+    def path_for(self, layer: str, code_insee: str) -> str:
+        return self._path(layer, code_insee, DATA_SUFFIX)
+
+    def _meta_path(self, layer: str, code_insee: str) -> str:
+        return self._path(layer, code_insee, META_SUFFIX)
+
+    def get_entry(self, layer: str, code_insee: str) -> Optional[Dict[str, Any]]:
+        """
+        Retourne les métadonnées d'une entrée en cache, ou None.
+
+        Le dictionnaire retourné contient 'path', 'etag', 'last_modified',
+        'fetched_at', 'stored_at' et 'size'.
+        """
+        path = self.path_for(layer, code_insee)
+        try:
+            with open(self._meta_path(layer, code_insee), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        meta['path'] = path
+        return meta
+
+    @contextmanager
+    def lock(self, layer: str, code_insee: str):
+        """
+        Verrou exclusif inter-processus (fichier .lock) sur une entrée.
+
+        Permet à un seul worker gunicorn à la fois de rafraîchir une entrée ;
+        les autres attendent puis relisent le cache.
+        """
+        path = self._path(layer, code_insee, LOCK_SUFFIX)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    def _write_meta(self, layer: str, code_insee: str, meta: Dict[str, Any]) -> None:
+        meta = {k: v for k, v in meta.items() if k != 'path'}
+        meta_path = self._meta_path(layer, code_insee)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    # ------------------------------------------------------------------
+    # Accès
+    # ------------------------------------------------------------------
+
+    def touch(self, entry: Dict[str, Any]) -> None:
+        """Marque une entrée comme récemment utilisée (ordre LRU = mtime)."""
+        try:
+            os.utime(entry['path'], None)
+        except OSError:
+            pass
+
+    def record(self, counter: str) -> None:
+        with self._lock:
+            self._stats[counter] += 1
+
+    def mark_revalidated(self, layer: str, code_insee: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Met à jour la date de récupération après une réponse 304."""
+        entry['fetched_at'] = time.time()
+        self._write_meta(layer, code_insee, entry)
+        self.touch(entry)
+        return entry
+
+    def annotate(self, layer: str, code_insee: str, entry: Dict[str, Any], **fields) -> None:
+        """
+        Ajoute des données précalculées aux métadonnées d'une entrée.
+
+        Les annotations sont conservées lors d'une revalidation (304) et
+        disparaissent quand le fichier est remplacé.
+        """
+        current = self.get_entry(layer, code_insee)
+        if current is None or current.get('stored_at') != entry.get('stored_at'):
+            return
+        current.update(fields)
+        self._write_meta(layer, code_insee, current)
+        entry.update(fields)
+
+    def store(self, layer: str, code_insee: str, chunks: Iterable[bytes],
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Écrit le contenu en gzip de façon atomique puis applique l'éviction LRU.
+
+        Args:
+            layer: Couche ('parcelles', 'batiments')
+            code_insee: Code INSEE normalisé
+            chunks: Itérable d'octets JSON non compressés
+            etag: En-tête ETag de la réponse amont
+            last_modified: En-tête Last-Modified de la réponse amont
+
+        Returns:
+            Métadonnées de la nouvelle entrée
+        """
+        path = self.path_for(layer, code_insee)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as gz:
+                    for chunk in chunks:
+                        if chunk:
+                            gz.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        now = time.time()
+        entry = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': now,
+            # Identifie le contenu : inchangé par une simple revalidation (304)
+            'stored_at': now,
+            'size': os.path.getsize(path),
+        }
+        self._write_meta(layer, code_insee, entry)
+        entry['path'] = path
+        self.evict(keep=path)
+        return entry
+
+    def open(self, entry: Dict[str, Any]):
+        """Ouvre le fichier compressé en lecture binaire (octets gzip bruts)."""
+        return open(entry['path'], 'rb')
+
+    def iter_bytes(self, entry: Dict[str, Any], compressed: bool = True,
+                   chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Itère sur le contenu d'une entrée par blocs, sans parsing JSON.
+
+        Args:
+            entry: Entrée du cache
+            compressed: True pour les octets gzip bruts, False pour le JSON décompressé
+            chunk_size: Taille des blocs lus
+        """
+        return iter_file(entry['path'], compressed=compressed, chunk_size=chunk_size)
+
+    def load_json(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with gzip.open(entry['path'], 'rb') as f:
+            return json.load(f)
+
+    # ------------------------------------------------------------------
+    # Éviction et statistiques
+    # ------------------------------------------------------------------
+
+    def _data_files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for layer in os.listdir(self.directory):
+            layer_dir = os.path.join(self.directory, layer)
+            if not os.path.isdir(layer_dir):
+                continue
+            for name in os.listdir(layer_dir):
+                if not name.endswith(DATA_SUFFIX):
+                    continue
+                path = os.path.join(layer_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes."""
+        files = self._data_files()
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            meta_path = path[:-len(DATA_SUFFIX)] + META_SUFFIX
+            for p in (path, meta_path):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            self.record('evictions')
+            logger.info(f"Evicted cadastre cache entry {path}")
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._data_files()
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': len(files),
+            'size_bytes': sum(size for _, size, _ in files),
+            'max_bytes': self.max_bytes,
+            'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else None,
+        })
+        return stats
+
+
+class DerivedFileCache:
+    """
+    Fichiers dérivés d'une couche communale (tuiles, variantes simplifiées,
+    plans rendus).
+
+    Les fichiers sont rangés par version du fichier communal source
+    (``stored_at``) : ``<dir>/<layer>/<code_insee>/<version>/<name><suffix>``.
+    L'écriture d'une nouvelle version purge les versions précédentes.
+
+    Si `max_bytes` est donné, le cache est borné en taille avec éviction LRU
+    (ordre = mtime, rafraîchi à chaque lecture). La taille occupée est suivie
+    en mémoire et recalculée sur disque lorsque la borne est atteinte, ce qui
+    corrige aussi les écritures des autres workers.
+    """
+
+    # Après éviction, le cache est ramené à cette fraction de max_bytes
+    EVICT_TARGET = 0.9
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self._evictions = 0
+
+    def _commune_dir(self, layer: str, code_insee: str) -> str:
+        check_code_insee(code_insee)
+        return cache_path(self.directory, layer, code_insee)
+
+    def path_for(self, layer: str, code_insee: str, version: int, name: str,
+                 suffix: str = DATA_SUFFIX) -> str:
+        check_code_insee(code_insee)
+        # `name` peut contenir des sous-répertoires (ex: tuiles 'z/x/y')
+        return cache_path(self.directory, layer, code_insee, str(int(version)),
+                          *f"{name}{suffix}".split('/'))
+
+    def get(self, layer: str, code_insee: str, version: int, name: str,
+            suffix: str = DATA_SUFFIX) -> Optional[str]:
+        path = self.path_for(layer, code_insee, version, name, suffix)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def store(self, layer: str, code_insee: str, version: int, name: str,
+              data: Dict[str, Any]) -> str:
+        """Écrit un fichier dérivé (JSON compact gzip, atomique)."""
+        payload = gzip.compress(json.dumps(data, separators=(',', ':')).encode(), mtime=0)
+        return self.store_bytes(layer, code_insee, version, name, payload)
+
+    def store_bytes(self, layer: str, code_insee: str, version: int, name: str,
+                    payload: bytes, suffix: str = DATA_SUFFIX) -> str:
+        """Écrit un fichier dérivé tel quel (atomique)."""
+        commune_dir = self._commune_dir(layer, code_insee)
+        version_dir = os.path.join(commune_dir, str(version))
+        if not os.path.isdir(version_dir) and os.path.isdir(commune_dir):
+            for other in os.listdir(commune_dir):
+                if other != str(version):
+                    logger.info(f"Purging outdated derived files {layer} {code_insee} v{other}")
+                    shutil.rmtree(cache_path(commune_dir, other), ignore_errors=True)
+
+        path = self.path_for(layer, code_insee, version, name, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._account(len(payload), keep=path)
+        return path
+
+    # ------------------------------------------------------------------
+    # Éviction et statistiques
+    # ------------------------------------------------------------------
+
+    def _files(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _account(self, size: int, keep: Optional[str] = None) -> None:
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(s for _, s, _ in self._files())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._size = self._evict(keep)
+
+    def _evict(self, keep: Optional[str]) -> int:
+        """Supprime les fichiers les moins récemment utilisés ; retourne la taille restante."""
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return total
+        target = self.max_bytes * self.EVICT_TARGET
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._evictions += 1
+            # Supprime les répertoires devenus vides
+            parent = os.path.dirname(path)
+            while parent != self.directory and parent.startswith(self.directory):
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+                parent = os.path.dirname(parent)
+        logger.info(f"Evicted derived files in {self.directory} ({total} bytes kept)")
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._files()
+        with self._lock:
+            evictions = self._evictions
+        return {
+            'entries': len(files),
+            'size_bytes': sum(size for _, size, _ in files),
+            'max_bytes': self.max_bytes,
+            'evictions': evictions,
+        }
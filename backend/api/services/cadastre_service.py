@@ -7,30 +7,183 @@ APIs utilisées:
 - api-adresse.data.gouv.fr - Géocodage d'adresses
 """
 
+import json
 import requests
 import logging
-from typing import Optional, Dict, Any, List
-from functools import lru_cache
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
+
+from django.conf import settings
+
+from .cadastre_cache import CommuneFileCache, DerivedFileCache
+from .cadastre_store import CadastreStore
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .geocode_cache import GeocodeCache, ReverseGeocodeCache, MISSING
+from .geometry import simplify_collection
+from .rate_limiter import RateLimiter
+from .single_flight import SingleFlight
+from .spatial_index import CommuneIndex
+from .tiles import build_tile, tile_in_extent
 
 logger = logging.getLogger(__name__)
 
-# URLs des APIs officielles
-CADASTRE_ETALAB_BASE = "https://cadastre.data.gouv.fr/data/etalab-cadastre/latest/geojson/communes"
-APICARTO_BASE = "https://apicarto.ign.fr/api/cadastre"
-API_ADRESSE_BASE = "https://api-adresse.data.gouv.fr"
+# URLs des APIs officielles (surchargeables pour pointer vers un serveur local de test)
+CADASTRE_ETALAB_BASE = os.environ.get(
+    'CADASTRE_ETALAB_BASE', "https://cadastre.data.gouv.fr/data/etalab-cadastre/latest/geojson/communes"
+)
+APICARTO_BASE = os.environ.get('APICARTO_BASE', "https://apicarto.ign.fr/api/cadastre")
+API_ADRESSE_BASE = os.environ.get('API_ADRESSE_BASE', "https://api-adresse.data.gouv.fr")
+
+# Écart (en mètres) en deçà duquel deux parcelles sont considérées contiguës
+PARCEL_ADJACENCY_TOLERANCE = 0.5
+
+# Niveaux de simplification servis (tolérances en degrés, ~0,1 m à ~100 m) :
+# une tolérance demandée est ramenée au plus grand niveau qui ne la dépasse pas
+SIMPLIFY_LEVELS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3)
+# Décimales conservées pour la quantification (~11 m à ~1 mm)
+PRECISION_MIN = 4
+PRECISION_MAX = 8
+
+
+def snap_simplify_params(tolerance: float, precision: Optional[int]):
+    """
+    Ramène (tolérance, précision) à un ensemble fini de variantes.
+
+    Returns:
+        Tuple (tolerance, precision) : tolérance 0 ou l'un des SIMPLIFY_LEVELS,
+        précision None ou comprise entre PRECISION_MIN et PRECISION_MAX
+    """
+    if tolerance > 0:
+        tolerance = max([level for level in SIMPLIFY_LEVELS if level <= tolerance] or [SIMPLIFY_LEVELS[0]])
+    else:
+        tolerance = 0
+    if precision is not None:
+        precision = min(max(int(precision), PRECISION_MIN), PRECISION_MAX)
+    return tolerance, precision
+
+
+def parse_geocode_results(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Résultats de /search (api-adresse) au format renvoyé par l'API."""
+    results = []
+    for feature in data.get('features', []):
+        props = feature.get('properties', {})
+        coords = feature.get('geometry', {}).get('coordinates', [])
+        
+        results.append({
+            'label': props.get('label', ''),
+            'city': props.get('city', ''),
+            'citycode': props.get('citycode', ''),  # Code INSEE
+            'postcode': props.get('postcode', ''),
+            'street': props.get('street', ''),
+            'housenumber': props.get('housenumber', ''),
+            'longitude': coords[0] if len(coords) > 0 else None,
+            'latitude': coords[1] if len(coords) > 1 else None,
+            'score': props.get('score', 0)
+        })
+    return results
+
+
+def parse_reverse_result(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Première adresse de /reverse (api-adresse), ou None."""
+    if data.get('features') and len(data['features']) > 0:
+        props = data['features'][0].get('properties', {})
+        return {
+            'label': props.get('label', ''),
+            'city': props.get('city', ''),
+            'citycode': props.get('citycode', ''),
+            'postcode': props.get('postcode', ''),
+        }
+    return None
+
+
+def parse_coordinates(params) -> Tuple[float, float]:
+    """
+    Coordonnées WGS84 (lat, lon) lues dans des paramètres de requête.
+
+    Raises:
+        ValueError: Paramètre absent, non numérique, non fini ou hors des
+            bornes (-90..90 pour lat, -180..180 pour lon)
+    """
+    try:
+        lat = float(params['lat'])
+        lon = float(params['lon'])
+    except (KeyError, TypeError):
+        raise ValueError("lat/lon manquants")
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon hors limites")
+    return lat, lon
+
+
+def point_geom_param(lat: float, lon: float) -> str:
+    """Paramètre `geom` APICarto pour un point."""
+    return json.dumps({"type": "Point", "coordinates": [lon, lat]})
 
 
 class CadastreService:
     """Service pour interagir avec l'API Cadastre officielle."""
     
-    def __init__(self, timeout: int = 30):
-        self.timeout = timeout
+    def __init__(self, timeout: Optional[float] = None, cache: Optional[CommuneFileCache] = None,
+                 max_index_bytes: Optional[int] = None):
+        # Timeout de lecture maximal ; le timeout effectif s'adapte aux latences observées
+        self.timeout = timeout or settings.UPSTREAM_TIMEOUT_MAX
+        self.breakers = {
+            name: CircuitBreaker.from_settings(name, max_timeout=self.timeout)
+            for name in ('etalab', 'apicarto', 'adresse')
+        }
+        self.cache = cache or CommuneFileCache.from_settings()
+        self.tiles = DerivedFileCache(settings.CADASTRE_TILE_DIR, settings.CADASTRE_TILE_MAX_BYTES)
+        self.variants = DerivedFileCache(settings.CADASTRE_VARIANT_DIR, settings.CADASTRE_VARIANT_MAX_BYTES)
+        # Départements préchargés (manage.py load_cadastre), consultés avant l'amont
+        self.store = CadastreStore.from_settings()
+        self.geocode_cache = GeocodeCache.from_settings()
+        self.reverse_cache = ReverseGeocodeCache.from_settings()
+        # Débit maximal vers api-adresse.data.gouv.fr (50 req/s par IP côté amont)
+        self.adresse_limiter = RateLimiter(settings.GEOCODE_RATE_LIMIT, burst=5)
+        self._batch_pool = ThreadPoolExecutor(
+            max_workers=settings.GEOCODE_BATCH_WORKERS, thread_name_prefix='geocode'
+        )
+        # Un seul téléchargement amont en vol par (couche, code INSEE)
+        self._flights = SingleFlight()
+        # Pool borné pour les récupérations parallèles (bundle communal)
+        self._pool = ThreadPoolExecutor(
+            max_workers=settings.CADASTRE_FETCH_WORKERS, thread_name_prefix='cadastre'
+        )
+        # Rafraîchissements en arrière-plan des couches servies périmées
+        self._refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cadastre-refresh')
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        # Index spatiaux en mémoire (géométries compactes), LRU par (couche, code INSEE)
+        # borné par l'empreinte mémoire estimée
+        self.max_index_bytes = max_index_bytes or settings.CADASTRE_INDEX_MAX_BYTES
+        self._indexes = OrderedDict()
+        self._index_bytes = 0
+        self._indexes_lock = threading.Lock()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Urbania-DP-Platform/1.0',
             'Accept': 'application/json'
         })
     
+    def _get(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        """
+        GET amont protégé par le disjoncteur du service, avec timeout adaptatif.
+        
+        Raises:
+            CircuitOpenError: Si le circuit du service est ouvert
+        """
+        breaker = self.breakers[upstream]
+        kwargs.setdefault('timeout', (settings.UPSTREAM_CONNECT_TIMEOUT, breaker.timeout()))
+        return breaker.call(self.session.get, url, **kwargs)
+    
+    def upstream_stats(self) -> Dict[str, Any]:
+        """État des disjoncteurs et latences par service amont."""
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+    
     def get_parcelles_commune(self, code_insee: str) -> Dict[str, Any]:
         """
         Récupère toutes les parcelles d'une commune.
@@ -41,25 +194,7 @@ class CadastreService:
         Returns:
             GeoJSON FeatureCollection des parcelles
         """
-        # Normaliser le code INSEE (5 caractères)
-        code_insee = code_insee.zfill(5)
-        
-        # Construire l'URL Etalab
-        url = f"{CADASTRE_ETALAB_BASE}/{code_insee}/cadastre-{code_insee}-parcelles.json"
-        
-        try:
-            logger.info(f"Fetching parcelles for commune {code_insee}")
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                logger.warning(f"Commune {code_insee} not found in cadastre")
-                return {"type": "FeatureCollection", "features": []}
-            raise
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching parcelles: {e}")
-            raise
+        return self._load_commune_layer('parcelles', code_insee)
     
     def get_batiments_commune(self, code_insee: str) -> Dict[str, Any]:
         """
@@ -71,25 +206,333 @@ class CadastreService:
         Returns:
             GeoJSON FeatureCollection des bâtiments
         """
+        return self._load_commune_layer('batiments', code_insee)
+    
+    def _load_commune_layer(self, layer: str, code_insee: str) -> Dict[str, Any]:
+        """Charge une couche communale (depuis le cache disque si possible)."""
+        entry = self.fetch_commune_layer(layer, code_insee)
+        if entry is None:
+            return {"type": "FeatureCollection", "features": []}
+        return self.cache.load_json(entry)
+    
+    def get_commune_index(self, layer: str, code_insee: str) -> CommuneIndex:
+        """
+        Retourne l'index spatial d'une couche communale.
+        
+        L'index est construit une seule fois par version du fichier en cache
+        et conservé en mémoire sous forme compacte (LRU borné à
+        `max_index_bytes`).
+        
+        Args:
+            layer: 'parcelles' ou 'batiments'
+            code_insee: Code INSEE de la commune
+            
+        Returns:
+            CommuneIndex (vide si la commune n'existe pas)
+        """
+        code_insee = code_insee.zfill(5)
+        entry = self.fetch_commune_layer(layer, code_insee)
+        return self._index_for_entry(layer, code_insee, entry)
+    
+    def _index_for_entry(self, layer: str, code_insee: str,
+                         entry: Optional[Dict[str, Any]]) -> CommuneIndex:
+        if entry is None:
+            return CommuneIndex([])
+        
+        key = (layer, code_insee)
+        version = entry.get('stored_at')
+        with self._indexes_lock:
+            cached = self._indexes.get(key)
+            if cached and cached[0] == version:
+                self._indexes.move_to_end(key)
+                return cached[1]
+        
+        logger.info(f"Building spatial index for {layer} {code_insee}")
+        index = CommuneIndex.from_geojson(self.cache.load_json(entry))
+        if layer == 'parcelles':
+            # Sections précalculées, conservées avec le fichier en cache
+            self.cache.annotate(layer, code_insee, entry, sections=index.section_summary())
+        size = index.nbytes()
+        with self._indexes_lock:
+            previous = self._indexes.pop(key, None)
+            if previous:
+                self._index_bytes -= previous[2]
+            self._indexes[key] = (version, index, size)
+            self._index_bytes += size
+            # L'index le plus récent est toujours conservé
+            while self._index_bytes > self.max_index_bytes and len(self._indexes) > 1:
+                _, (_, _, evicted) = self._indexes.popitem(last=False)
+                self._index_bytes -= evicted
+        return index
+    
+    def index_stats(self) -> Dict[str, Any]:
+        """Occupation du cache mémoire des index communaux."""
+        with self._indexes_lock:
+            return {
+                'entries': len(self._indexes),
+                'size_bytes': self._index_bytes,
+                'max_bytes': self.max_index_bytes,
+            }
+    
+    def get_parcelles_bbox(self, code_insee: str, bbox) -> Dict[str, Any]:
+        """
+        Récupère les parcelles d'une commune intersectant une emprise.
+        
+        Args:
+            code_insee: Code INSEE de la commune
+            bbox: Tuple (minx, miny, maxx, maxy) en WGS84
+            
+        Returns:
+            GeoJSON FeatureCollection des parcelles visibles
+        """
+        index = self.get_commune_index('parcelles', code_insee)
+        return {"type": "FeatureCollection", "features": index.query_bbox(bbox)}
+    
+    def get_tile(self, layer: str, code_insee: str, z: int, x: int, y: int) -> Optional[Tuple[str, int]]:
+        """
+        Retourne le chemin d'une tuile GeoJSON (gzip) d'une couche communale.
+        
+        La tuile est générée à la première demande puis servie depuis le
+        disque tant que le fichier communal n'a pas changé. Seules les tuiles
+        recoupant l'emprise de la commune sont générées et stockées.
+        
+        Args:
+            layer: 'parcelles' ou 'batiments'
+            code_insee: Code INSEE de la commune
+            z, x, y: Coordonnées de la tuile XYZ web-mercator
+            
+        Returns:
+            Tuple (chemin du fichier de tuile compressé, version du fichier
+            communal), ou None si la commune n'existe pas ou si la tuile est
+            hors de son emprise
+        """
+        code_insee = code_insee.zfill(5)
+        entry = self.fetch_commune_layer(layer, code_insee)
+        if entry is None:
+            return None
+        version = int(entry['stored_at'])
+        
+        name = f"{z}/{x}/{y}"
+        path = self.tiles.get(layer, code_insee, version, name)
+        if path:
+            return path, version
+        
+        index = self._index_for_entry(layer, code_insee, entry)
+        if not tile_in_extent(index, z, x, y):
+            return None
+        tile = build_tile(index, z, x, y)
+        return self.tiles.store(layer, code_insee, version, name, tile), version
+    
+    def get_simplified_layer(self, layer: str, code_insee: str, tolerance: float,
+                             precision: Optional[int] = None) -> Optional[str]:
+        """
+        Retourne le chemin d'une variante simplifiée / quantifiée d'une couche.
+        
+        Les options sont ramenées à un nombre fini de variantes (voir
+        snap_simplify_params) ; chacune est calculée une seule fois par
+        version du fichier communal puis servie depuis le disque.
+        
+        Args:
+            layer: 'parcelles' ou 'batiments'
+            code_insee: Code INSEE de la commune
+            tolerance: Tolérance Douglas-Peucker en degrés (0 = aucune)
+            precision: Nombre de décimales conservées (None = inchangé)
+            
+        Returns:
+            Chemin du fichier compressé, ou None si la commune n'existe pas
+        """
+        code_insee = code_insee.zfill(5)
+        entry = self.fetch_commune_layer(layer, code_insee)
+        if entry is None:
+            return None
+        
+        version = int(entry['stored_at'])
+        tolerance, precision = snap_simplify_params(tolerance, precision)
+        name = f"s{tolerance:g}_p{precision}"
+        path = self.variants.get(layer, code_insee, version, name)
+        if path:
+            return path
+        
+        logger.info(f"Simplifying {layer} {code_insee} (tolerance={tolerance}, precision={precision})")
+        collection = simplify_collection(self.cache.load_json(entry), tolerance, precision)
+        return self.variants.store(layer, code_insee, version, name, collection)
+    
+    def get_commune_bundle(self, code_insee: str, layers: List[str]):
+        """
+        Récupère en parallèle plusieurs couches d'une commune.
+        
+        Les couches manquantes du cache sont téléchargées simultanément sur
+        un pool de threads borné : le temps total est celui de la couche la
+        plus lente, et non la somme des temps.
+        
+        Args:
+            code_insee: Code INSEE de la commune
+            layers: Sous-ensemble de ['parcelles', 'batiments', 'sections']
+            
+        Returns:
+            Tuple (résultats, erreurs) : `résultats` associe à 'parcelles' /
+            'batiments' une entrée du cache (ou None) et à 'sections' la liste
+            des sections ; `erreurs` associe aux couches en échec un message
+            
+        Raises:
+            CircuitOpenError: Si toutes les couches ont échoué sur un circuit ouvert
+        """
+        loaders = {
+            'parcelles': lambda: self.fetch_commune_layer('parcelles', code_insee),
+            'batiments': lambda: self.fetch_commune_layer('batiments', code_insee),
+            'sections': lambda: self.get_sections_commune(code_insee),
+        }
+        futures = {layer: self._pool.submit(loaders[layer]) for layer in layers}
+        
+        results, errors, unavailable = {}, {}, []
+        for layer, future in futures.items():
+            try:
+                results[layer] = future.result()
+            except CircuitOpenError as e:
+                errors[layer] = str(e)
+                unavailable.append(e)
+            except Exception as e:
+                logger.error(f"Error fetching {layer} for bundle {code_insee}: {e}")
+                errors[layer] = str(e)
+        if unavailable and len(unavailable) == len(layers):
+            raise unavailable[0]
+        return results, errors
+    
+    def fetch_commune_layer(self, layer: str, code_insee: str) -> Optional[Dict[str, Any]]:
+        """
+        Garantit la présence en cache disque d'une couche communale Etalab.
+        
+        Les entrées fraîches sont servies sans appel amont. Les entrées
+        expirées (depuis moins de CADASTRE_CACHE_STALE_TTL) sont servies
+        immédiatement pendant qu'un rafraîchissement en arrière-plan les
+        revalide par requête conditionnelle (ETag / Last-Modified) ; au-delà,
+        la revalidation est synchrone. En cas d'erreur réseau, une entrée
+        périmée est servie.
+        
+        Les rafraîchissements concurrents d'une même couche sont coalescés :
+        entre threads d'un worker (single-flight) et entre workers (verrou
+        fichier), si bien qu'un seul appel amont a lieu par rafraîchissement.
+        
+        Args:
+            layer: 'parcelles' ou 'batiments'
+            code_insee: Code INSEE de la commune
+            
+        Returns:
+            Entrée du cache (voir CommuneFileCache.get_entry), ou None si la
+            commune n'existe pas dans le cadastre
+        """
+        # Normaliser le code INSEE (5 caractères)
         code_insee = code_insee.zfill(5)
-        url = f"{CADASTRE_ETALAB_BASE}/{code_insee}/cadastre-{code_insee}-batiments.json"
+        
+        entry = self.cache.get_entry(layer, code_insee)
+        if entry and self.cache.is_fresh(entry):
+            self.cache.record('hits')
+            self.cache.touch(entry)
+            return entry
+        if entry and time.time() - entry['fetched_at'] < settings.CADASTRE_CACHE_STALE_TTL:
+            self.cache.record('stale_served')
+            self.cache.touch(entry)
+            self._refresh_in_background(layer, code_insee)
+            return entry
+        
+        entry, shared = self._flights.do(
+            (layer, code_insee),
+            lambda: self._refresh_commune_layer(layer, code_insee)
+        )
+        if shared:
+            self.cache.record('coalesced')
+        return entry
+    
+    def _refresh_in_background(self, layer: str, code_insee: str) -> None:
+        """Planifie le rafraîchissement d'une couche (au plus un en attente par couche)."""
+        key = (layer, code_insee)
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh():
+            try:
+                self._flights.do(key, lambda: self._refresh_commune_layer(layer, code_insee))
+            except Exception as e:
+                logger.warning(f"Background refresh failed for {layer} {code_insee}: {e}")
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+        
+        self._refresh_pool.submit(refresh)
+    
+    def _refresh_commune_layer(self, layer: str, code_insee: str) -> Optional[Dict[str, Any]]:
+        """Télécharge ou revalide une couche communale, sous verrou inter-workers."""
+        with self.cache.lock(layer, code_insee):
+            # Un autre worker a pu rafraîchir l'entrée pendant l'attente du verrou
+            entry = self.cache.get_entry(layer, code_insee)
+            if entry and self.cache.is_fresh(entry):
+                self.cache.record('coalesced')
+                self.cache.touch(entry)
+                return entry
+            stored = self._load_from_store(layer, code_insee, entry)
+            if stored is not None:
+                return stored
+            return self._download_commune_layer(layer, code_insee, entry)
+    
+    def _load_from_store(self, layer: str, code_insee: str,
+                         entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Alimente le cache disque depuis le stockage local, si la commune y est chargée."""
+        version = self.store.commune_version(layer, code_insee)
+        if version is None:
+            return None
+        etag = f"store:{version}"
+        if entry and entry.get('etag') == etag:
+            return self.cache.mark_revalidated(layer, code_insee, entry)
+        logger.info(f"Loading {layer} for commune {code_insee} from local store")
+        return self.cache.store(layer, code_insee, self.store.iter_commune_json(layer, code_insee), etag=etag)
+    
+    def _download_commune_layer(self, layer: str, code_insee: str,
+                                entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Appel amont Etalab (conditionnel si une entrée périmée existe)."""
+        # Construire l'URL Etalab
+        url = f"{CADASTRE_ETALAB_BASE}/{code_insee}/cadastre-{code_insee}-{layer}.json"
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
         
         try:
-            logger.info(f"Fetching batiments for commune {code_insee}")
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                return {"type": "FeatureCollection", "features": []}
-            raise
+            logger.info(f"Fetching {layer} for commune {code_insee}")
+            with self._get('etalab', url, headers=headers, stream=True) as response:
+                if response.status_code == 304 and entry:
+                    self.cache.record('revalidations')
+                    return self.cache.mark_revalidated(layer, code_insee, entry)
+                if response.status_code == 404:
+                    logger.warning(f"Commune {code_insee} not found in cadastre ({layer})")
+                    return None
+                response.raise_for_status()
+                self.cache.record('misses')
+                return self.cache.store(
+                    layer, code_insee,
+                    response.iter_content(chunk_size=64 * 1024),
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                )
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching batiments: {e}")
+            if entry:
+                logger.warning(f"Upstream error for {layer} {code_insee}, serving stale cache: {e}")
+                self.cache.record('stale_served')
+                return entry
+            logger.error(f"Error fetching {layer}: {e}")
             raise
     
     def get_parcelle_by_id(self, code_insee: str, section: str, numero: str) -> Optional[Dict[str, Any]]:
         """
-        Récupère une parcelle spécifique via APICarto.
+        Récupère une parcelle spécifique.
+        
+        La parcelle est lue dans le stockage local si la commune y est
+        préchargée. Si le fichier des parcelles de la commune est en cache,
+        la recherche est une lecture de dictionnaire dans l'index communal ;
+        sinon APICarto est interrogé.
         
         Args:
             code_insee: Code INSEE de la commune
@@ -103,6 +546,24 @@ class CadastreService:
         section = section.upper().strip()
         numero = numero.zfill(4)
         
+        parcelle = self._find_parcelle_by_id_locally(code_insee, section, numero)
+        if parcelle is not MISSING:
+            return parcelle
+        return self._get_parcelle_by_id_apicarto(code_insee, section, numero)
+    
+    def _find_parcelle_by_id_locally(self, code_insee: str, section: str, numero: str):
+        """Parcelle (ou None) si la commune est disponible localement ; `MISSING` sinon."""
+        if self.store.commune_version('parcelles', code_insee) is not None:
+            return self.store.get_parcelle(code_insee, section, numero)
+        if self.cache.get_entry('parcelles', code_insee) is not None:
+            try:
+                return self.get_commune_index('parcelles', code_insee).get_by_id(section, numero)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Parcel index unavailable for {code_insee}: {e}")
+        return MISSING
+    
+    def _get_parcelle_by_id_apicarto(self, code_insee: str, section: str, numero: str) -> Optional[Dict[str, Any]]:
+        """Recherche d'une parcelle par identifiant via APICarto."""
         url = f"{APICARTO_BASE}/parcelle"
         params = {
             'code_insee': code_insee,
@@ -111,13 +572,10 @@ class CadastreService:
         }
         
         try:
-            url_full = f"{url}?code_insee={code_insee}&section={section}&numero={numero}"
-            logger.info(f"Fetching parcelle from APICarto: {url_full}")
-            response = self.session.get(url, params=params, timeout=self.timeout)
-            logger.info(f"APICarto response status: {response.status_code}")
-            
+            logger.debug(f"Fetching parcelle {code_insee} {section} {numero} from APICarto")
+            response = self._get('apicarto', url, params=params)
             if response.status_code != 200:
-                logger.error(f"APICarto error response: {response.text}")
+                logger.error(f"APICarto error {response.status_code}: {response.text[:200]}")
                 
             response.raise_for_status()
             data = response.json()
@@ -125,10 +583,65 @@ class CadastreService:
             if data.get('features') and len(data['features']) > 0:
                 return data['features'][0]
             return None
+        except CircuitOpenError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching parcelle: {e}")
             return None
     
+    def get_parcelle_neighbourhood(self, code_insee: str, section: str, numero: str,
+                                   radius: float) -> Optional[Dict[str, Any]]:
+        """
+        Parcelle et son voisinage, pour le plan cadastral (DP1).
+        
+        Les voisines et les bâtiments sont sélectionnés sur les index
+        spatiaux communaux ; seules les entités à moins de `radius` mètres
+        de la parcelle sont renvoyées, avec leur distance
+        (propriété `distance_m`).
+        
+        Args:
+            code_insee: Code INSEE de la commune
+            section: Section cadastrale (ex: 'AB')
+            numero: Numéro de parcelle (ex: '0123')
+            radius: Rayon de recherche en mètres
+            
+        Returns:
+            Dict {'parcelle', 'radius', 'bbox', 'adjacentes', 'voisines',
+            'batiments'} (FeatureCollections pour les trois dernières clés),
+            ou None si la parcelle n'existe pas
+        """
+        code_insee = code_insee.zfill(5)
+        parcelles = self.get_commune_index('parcelles', code_insee)
+        position = parcelles.position(section, numero)
+        if position is None:
+            return None
+        parts = parcelles.features.parts(position)
+        
+        def collect(index: CommuneIndex, found) -> Dict[str, Any]:
+            features = []
+            for i, distance in found:
+                feature = index.features[i]
+                feature['properties']['distance_m'] = round(distance, 1)
+                features.append(feature)
+            return {"type": "FeatureCollection", "features": features}
+        
+        nearby = [(i, d) for i, d in parcelles.within_distance(parts, radius) if i != position]
+        batiments = self.get_commune_index('batiments', code_insee)
+        nearby_batiments = batiments.within_distance(parts, radius)
+        
+        bboxes = [parcelles.features.bbox(i) for i, _ in nearby + [(position, 0.0)]]
+        bboxes += [batiments.features.bbox(i) for i, _ in nearby_batiments]
+        bboxes = [b for b in bboxes if b is not None]
+        return {
+            'parcelle': parcelles.features[position],
+            'radius': radius,
+            'bbox': [min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+                     max(b[2] for b in bboxes), max(b[3] for b in bboxes)] if bboxes else None,
+            'adjacentes': collect(parcelles, [(i, d) for i, d in nearby if d <= PARCEL_ADJACENCY_TOLERANCE]),
+            'voisines': collect(parcelles, [(i, d) for i, d in nearby if d > PARCEL_ADJACENCY_TOLERANCE]),
+            'batiments': collect(batiments, nearby_batiments),
+        }
+    
     def search_parcelles(self, code_insee: str, section: Optional[str] = None) -> Dict[str, Any]:
         """
         Recherche des parcelles via APICarto.
@@ -149,9 +662,11 @@ class CadastreService:
             params['section'] = section.upper().strip()
         
         try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
+            response = self._get('apicarto', url, params=params)
             response.raise_for_status()
             return response.json()
+        except CircuitOpenError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Error searching parcelles: {e}")
             return {"type": "FeatureCollection", "features": []}
@@ -160,6 +675,9 @@ class CadastreService:
         """
         Géocode une adresse pour obtenir les coordonnées et le code INSEE.
         
+        Les résultats sont mis en cache par requête normalisée ; une saisie
+        plus longue peut être servie à partir des résultats d'un préfixe.
+        
         Args:
             address: Adresse à géocoder
             limit: Nombre max de résultats
@@ -167,43 +685,84 @@ class CadastreService:
         Returns:
             Liste de résultats avec coordonnées et métadonnées
         """
+        cached = self.geocode_cache.get(address, limit)
+        if cached is not None:
+            return cached
+        
+        try:
+            results = self._geocode_upstream(address, limit)
+        except CircuitOpenError:
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error geocoding address: {e}")
+            return []
+        self.geocode_cache.set(address, limit, results)
+        return results
+    
+    def _geocode_upstream(self, address: str, limit: int) -> List[Dict[str, Any]]:
+        """Appel à api-adresse.data.gouv.fr (/search)."""
         url = f"{API_ADRESSE_BASE}/search/"
         params = {
             'q': address,
             'limit': limit
         }
         
-        try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for feature in data.get('features', []):
-                props = feature.get('properties', {})
-                coords = feature.get('geometry', {}).get('coordinates', [])
-                
-                results.append({
-                    'label': props.get('label', ''),
-                    'city': props.get('city', ''),
-                    'citycode': props.get('citycode', ''),  # Code INSEE
-                    'postcode': props.get('postcode', ''),
-                    'street': props.get('street', ''),
-                    'housenumber': props.get('housenumber', ''),
-                    'longitude': coords[0] if len(coords) > 0 else None,
-                    'latitude': coords[1] if len(coords) > 1 else None,
-                    'score': props.get('score', 0)
-                })
+        self.geocode_cache.record_upstream_call()
+        self.adresse_limiter.acquire()
+        response = self._get('adresse', url, params=params)
+        response.raise_for_status()
+        return parse_geocode_results(response.json())
+    
+    def geocode_batch(self, rows: Iterable[Dict[str, Any]],
+                      with_parcelle: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Géocode une liste d'adresses en parallèle, résultats dans l'ordre.
+        
+        Les lignes sont traitées sur un pool borné (GEOCODE_BATCH_WORKERS) ;
+        les appels amont passent par le cache de géocodage et le limiteur de
+        débit. Les résultats sont produits au fil de l'eau.
+        
+        Args:
+            rows: Dictionnaires {'id' (optionnel), 'address'}
+            with_parcelle: Ajoute la parcelle trouvée aux coordonnées retenues
             
-            return results
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error geocoding address: {e}")
-            return []
+        Yields:
+            {'row', 'id', 'query', 'result', ['parcelle']} pour chaque ligne
+        """
+        def process(index, row):
+            address = (row.get('address') or '').strip()
+            item = {'row': index, 'id': row.get('id'), 'query': address, 'result': None}
+            if not address:
+                item['error'] = "Adresse vide"
+                return item
+            try:
+                results = self.geocode_address(address, limit=1)
+                if results:
+                    item['result'] = results[0]
+                    if with_parcelle and results[0]['latitude'] is not None:
+                        parcelle = self.get_parcelle_by_coordinates(results[0]['latitude'], results[0]['longitude'])
+                        item['parcelle'] = parcelle.get('properties') if parcelle else None
+            except Exception as e:
+                logger.error(f"Error in batch geocoding row {index}: {e}")
+                item['error'] = str(e)
+            return item
+        
+        window = deque()
+        max_in_flight = settings.GEOCODE_BATCH_WORKERS * 2
+        for index, row in enumerate(rows):
+            window.append(self._batch_pool.submit(process, index, row))
+            if len(window) >= max_in_flight:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
     
     def reverse_geocode(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
         """
         Géocodage inverse: coordonnées -> adresse et code INSEE.
         
+        Les résultats sont mis en cache par cellule de grille (~10 m) : des
+        clics voisins ne répètent pas l'appel amont.
+        
         Args:
             lon: Longitude
             lat: Latitude
@@ -211,35 +770,41 @@ class CadastreService:
         Returns:
             Informations sur l'adresse
         """
+        cached = self.reverse_cache.get(lon, lat)
+        if cached is not MISSING:
+            return cached
+        
+        try:
+            result = self._reverse_geocode_upstream(lon, lat)
+        except CircuitOpenError:
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error reverse geocoding: {e}")
+            return None
+        self.reverse_cache.set(lon, lat, result)
+        return result
+    
+    def _reverse_geocode_upstream(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        """Appel à api-adresse.data.gouv.fr (/reverse)."""
         url = f"{API_ADRESSE_BASE}/reverse/"
         params = {
             'lon': lon,
             'lat': lat
         }
         
-        try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get('features') and len(data['features']) > 0:
-                feature = data['features'][0]
-                props = feature.get('properties', {})
-                return {
-                    'label': props.get('label', ''),
-                    'city': props.get('city', ''),
-                    'citycode': props.get('citycode', ''),
-                    'postcode': props.get('postcode', ''),
-                }
-            return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error reverse geocoding: {e}")
-            return None
-
+        self.adresse_limiter.acquire()
+        response = self._get('adresse', url, params=params)
+        response.raise_for_status()
+        return parse_reverse_result(response.json())
+    
     def get_parcelle_by_coordinates(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """
         Trouve la parcelle correspondant à des coordonnées GPS.
         
+        La recherche se fait localement (point-dans-polygone sur l'index
+        spatial des parcelles de la commune) ; APICarto n'est interrogé
+        qu'en cas d'échec de la recherche locale.
+        
         Args:
             lat: Latitude
             lon: Longitude
@@ -247,17 +812,57 @@ class CadastreService:
         Returns:
             GeoJSON Feature de la parcelle
         """
-        import json
+        parcelle = self._find_parcelle_locally(lat, lon)
+        if parcelle:
+            return parcelle
+        return self._get_parcelle_by_coordinates_apicarto(lat, lon)
+    
+    def _find_parcelle_locally(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Recherche point-dans-polygone dans les index de parcelles."""
+        feature = self._find_parcelle_loaded(lat, lon)
+        if feature:
+            return feature
+        
+        # 3. Résolution de la commune par géocodage inverse, puis index communal
+        try:
+            address = self.reverse_geocode(lon, lat)
+        except CircuitOpenError as e:
+            logger.warning(f"Local parcel lookup skipped: {e}")
+            return None
+        if not address or not address.get('citycode'):
+            return None
+        return self._find_parcelle_in_commune(address['citycode'], lat, lon)
+    
+    def _find_parcelle_loaded(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Recherche sans appel réseau : index en mémoire puis stockage local."""
+        # 1. Communes déjà indexées en mémoire
+        with self._indexes_lock:
+            loaded = [index for (layer, _), (_, index, _) in self._indexes.items() if layer == 'parcelles']
+        for index in loaded:
+            feature = index.find_containing(lon, lat)
+            if feature:
+                return feature
+        
+        # 2. Départements préchargés : requête R*Tree
+        return self.store.find_parcelle_at(lon, lat)
+    
+    def _find_parcelle_in_commune(self, code_insee: str, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Recherche point-dans-polygone dans l'index des parcelles d'une commune."""
+        try:
+            index = self.get_commune_index('parcelles', code_insee)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Local parcel lookup unavailable for {code_insee}: {e}")
+            return None
+        return index.find_containing(lon, lat)
+    
+    def _get_parcelle_by_coordinates_apicarto(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Recherche de parcelle par coordonnées via APICarto."""
         url = f"{APICARTO_BASE}/parcelle"
-        geom = {
-            "type": "Point",
-            "coordinates": [lon, lat]
-        }
-        params = {'geom': json.dumps(geom)}
+        params = {'geom': point_geom_param(lat, lon)}
         
         try:
             logger.info(f"Searching parcelle by coordinates: [{lon}, {lat}]")
-            response = self.session.get(url, params=params, timeout=self.timeout)
+            response = self._get('apicarto', url, params=params)
             response.raise_for_status()
             data = response.json()
             
@@ -265,6 +870,8 @@ class CadastreService:
                 logger.info(f"Found parcelle: {data['features'][0].get('properties', {}).get('id')}")
                 return data['features'][0]
             return None
+        except CircuitOpenError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching parcelle by coordinates: {e}")
             return None
@@ -279,11 +886,52 @@ class CadastreService:
         Returns:
             Liste des sections (ex: ['A', 'AB', 'AC', ...])
         """
+        return [s['section'] for s in self.get_sections_summary(code_insee)]
+    
+    def get_sections_summary(self, code_insee: str) -> List[Dict[str, Any]]:
+        """
+        Sections d'une commune avec nombre de parcelles et emprise.
+        
+        Les communes préchargées sont servies par une agrégation SQL sur le
+        stockage local. Ailleurs, les sections sont dérivées du fichier des
+        parcelles en cache : depuis
+        l'index en mémoire s'il est chargé, sinon depuis les métadonnées du
+        cache, sinon en indexant le fichier. APICarto (/division) n'est
+        interrogé que si le fichier communal est indisponible.
+        
+        Args:
+            code_insee: Code INSEE de la commune
+            
+        Returns:
+            Liste triée de {'section', 'count', 'bbox'}
+        """
+        code_insee = code_insee.zfill(5)
+        if self.store.commune_version('parcelles', code_insee) is not None:
+            return self.store.section_summary(code_insee)
+        try:
+            entry = self.fetch_commune_layer('parcelles', code_insee)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Parcel file unavailable for {code_insee}, using APICarto sections: {e}")
+            return [{'section': s, 'count': None, 'bbox': None}
+                    for s in self._get_sections_apicarto(code_insee)]
+        if entry is None:
+            return []
+        
+        with self._indexes_lock:
+            cached = self._indexes.get(('parcelles', code_insee))
+        if cached and cached[0] == entry.get('stored_at'):
+            return cached[1].section_summary()
+        if entry.get('sections') is not None:
+            return entry['sections']
+        return self._index_for_entry('parcelles', code_insee, entry).section_summary()
+    
+    def _get_sections_apicarto(self, code_insee: str) -> List[str]:
+        """Liste des sections via APICarto (/division)."""
         url = f"{APICARTO_BASE}/division"
         params = {'code_insee': code_insee.zfill(5)}
         
         try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
+            response = self._get('apicarto', url, params=params)
             response.raise_for_status()
             data = response.json()
             
@@ -294,6 +942,8 @@ class CadastreService:
                     sections.add(section)
             
             return sorted(list(sections))
+        except CircuitOpenError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching sections: {e}")
             return []
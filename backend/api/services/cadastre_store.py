@@ -0,0 +1,202 @@
+"""
+Stockage local indexé des données cadastrales préchargées.
+
+Les entités Etalab (parcelles, bâtiments) d'un département sont chargées par
+``manage.py load_cadastre`` dans une base SQLite dédiée, avec une table
+R*Tree sur les emprises. CadastreService interroge ce stockage avant les
+API amont : les départements préchargés ne dépendent plus de leur
+disponibilité.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List, Iterable, Iterator
+
+from .spatial_index import geometry_bbox, polygon_parts, parts_contain, parcel_key
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS communes (
+    layer TEXT NOT NULL,
+    code_insee TEXT NOT NULL,
+    departement TEXT NOT NULL,
+    feature_count INTEGER NOT NULL,
+    loaded_at REAL NOT NULL,
+    PRIMARY KEY (layer, code_insee)
+);
+CREATE TABLE IF NOT EXISTS features (
+    id INTEGER PRIMARY KEY,
+    layer TEXT NOT NULL,
+    code_insee TEXT NOT NULL,
+    section TEXT,
+    numero TEXT,
+    section_label TEXT,
+    minx REAL NOT NULL,
+    miny REAL NOT NULL,
+    maxx REAL NOT NULL,
+    maxy REAL NOT NULL,
+    geojson TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS features_commune ON features (layer, code_insee);
+CREATE INDEX IF NOT EXISTS features_parcel ON features (code_insee, section, numero);
+-- Emprises en simple précision (arrondies vers l'extérieur) : filtre grossier uniquement
+CREATE VIRTUAL TABLE IF NOT EXISTS features_rtree USING rtree (id, minx, maxx, miny, maxy);
+"""
+
+
+class CadastreStore:
+    """Base SQLite (R*Tree) des communes préchargées."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls) -> "CadastreStore":
+        from django.conf import settings
+
+        return cls(settings.CADASTRE_STORE_PATH)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connexion propre au thread courant (schéma créé à la première ouverture)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+
+    def load_features(self, layer: str, code_insee: str, departement: str,
+                      features: Iterable[Dict[str, Any]]) -> int:
+        """
+        Remplace les entités d'une couche communale.
+
+        Returns:
+            Nombre d'entités chargées
+        """
+        conn = self.conn
+        count = 0
+        with conn:
+            self._delete_commune(layer, code_insee)
+            for feature in features:
+                bbox = geometry_bbox(feature.get('geometry'))
+                if bbox is None:
+                    continue
+                props = feature.get('properties') or {}
+                section, numero = None, None
+                if props.get('section') and props.get('numero'):
+                    section, numero = parcel_key(props['section'], props['numero'])
+                cur = conn.execute(
+                    "INSERT INTO features (layer, code_insee, section, numero, section_label, "
+                    "minx, miny, maxx, maxy, geojson) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (layer, code_insee, section, numero, props.get('section') or None, *bbox,
+                     json.dumps(feature, separators=(',', ':')))
+                )
+                conn.execute(
+                    "INSERT INTO features_rtree (id, minx, maxx, miny, maxy) VALUES (?, ?, ?, ?, ?)",
+                    (cur.lastrowid, bbox[0], bbox[2], bbox[1], bbox[3])
+                )
+                count += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO communes (layer, code_insee, departement, feature_count, loaded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (layer, code_insee, departement, count, time.time())
+            )
+        return count
+
+    def _delete_commune(self, layer: str, code_insee: str) -> None:
+        self.conn.execute(
+            "DELETE FROM features_rtree WHERE id IN "
+            "(SELECT id FROM features WHERE layer = ? AND code_insee = ?)",
+            (layer, code_insee)
+        )
+        self.conn.execute("DELETE FROM features WHERE layer = ? AND code_insee = ?", (layer, code_insee))
+        self.conn.execute("DELETE FROM communes WHERE layer = ? AND code_insee = ?", (layer, code_insee))
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    def commune_version(self, layer: str, code_insee: str) -> Optional[float]:
+        """Date de chargement de la couche communale, ou None si absente."""
+        if not self.exists():
+            return None
+        row = self.conn.execute(
+            "SELECT loaded_at FROM communes WHERE layer = ? AND code_insee = ?", (layer, code_insee)
+        ).fetchone()
+        return row[0] if row else None
+
+    def iter_commune_json(self, layer: str, code_insee: str) -> Iterator[bytes]:
+        """FeatureCollection de la commune, sérialisée par morceaux sans re-parsing."""
+        rows = self.conn.execute(
+            "SELECT geojson FROM features WHERE layer = ? AND code_insee = ? ORDER BY id",
+            (layer, code_insee)
+        )
+        yield b'{"type":"FeatureCollection","features":['
+        for i, (geojson,) in enumerate(rows):
+            yield (b',' if i else b'') + geojson.encode()
+        yield b']}'
+
+    def get_parcelle(self, code_insee: str, section: str, numero: str) -> Optional[Dict[str, Any]]:
+        section, numero = parcel_key(section, numero)
+        row = self.conn.execute(
+            "SELECT geojson FROM features WHERE layer = 'parcelles' AND code_insee = ? "
+            "AND section = ? AND numero = ? LIMIT 1",
+            (code_insee, section, numero)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_parcelle_at(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        """Parcelle contenant le point, tous départements chargés confondus."""
+        if not self.exists():
+            return None
+        rows = self.conn.execute(
+            "SELECT f.geojson FROM features_rtree r JOIN features f ON f.id = r.id "
+            "WHERE r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ? "
+            "AND f.layer = 'parcelles' AND f.minx <= ? AND f.maxx >= ? AND f.miny <= ? AND f.maxy >= ?",
+            (lon, lon, lat, lat, lon, lon, lat, lat)
+        )
+        for (geojson,) in rows:
+            feature = json.loads(geojson)
+            if parts_contain(polygon_parts(feature.get('geometry')), lon, lat):
+                return feature
+        return None
+
+    def section_summary(self, code_insee: str) -> List[Dict[str, Any]]:
+        """Sections de la commune avec nombre de parcelles et emprise."""
+        rows = self.conn.execute(
+            "SELECT section_label, COUNT(*), MIN(minx), MIN(miny), MAX(maxx), MAX(maxy) "
+            "FROM features WHERE layer = 'parcelles' AND code_insee = ? AND section_label IS NOT NULL "
+            "GROUP BY section_label ORDER BY section_label",
+            (code_insee,)
+        )
+        return [
+            {'section': section, 'count': count, 'bbox': [minx, miny, maxx, maxy]}
+            for section, count, minx, miny, maxx, maxy in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.exists():
+            return {'communes': 0, 'features': 0, 'departements': []}
+        communes, features = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(feature_count), 0) FROM communes"
+        ).fetchone()
+        departements = [r[0] for r in self.conn.execute(
+            "SELECT DISTINCT departement FROM communes ORDER BY departement"
+        )]
+        return {'communes': communes, 'features': features, 'departements': departements}
@@ -0,0 +1,237 @@
+"""
+Disjoncteur (circuit breaker) par service amont.
+
+Chaque appel amont est mesuré sur une fenêtre glissante. Le circuit s'ouvre
+si la proportion d'erreurs ou d'appels lents dépasse son seuil ; tant qu'il
+est ouvert, les appels échouent immédiatement (CircuitOpenError) au lieu de
+bloquer un worker jusqu'au timeout. Après `open_seconds`, un appel d'essai
+(semi-ouvert) décide de la fermeture ou d'une nouvelle ouverture.
+
+Le timeout de lecture est adaptatif : un multiple du 95e centile des
+latences récentes, borné par [min_timeout, max_timeout].
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Appel refusé : le circuit du service amont est ouvert."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"Service {upstream} indisponible (circuit ouvert, nouvel essai dans {retry_after:.0f} s)")
+
+
+class CircuitBreaker:
+    """Disjoncteur à seuils de taux d'erreur et de latence, avec timeout adaptatif."""
+
+    def __init__(self, name: str, window: float = 60.0, min_calls: int = 10,
+                 error_rate: float = 0.5, slow_call: float = 5.0, slow_rate: float = 0.5,
+                 open_seconds: float = 30.0, min_timeout: float = 2.0, max_timeout: float = 15.0,
+                 timeout_factor: float = 4.0):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+
+        self._lock = threading.Lock()
+        # (instant, succès, durée) des appels de la fenêtre
+        self._calls = deque()
+        self._state = CLOSED
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._totals = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    @classmethod
+    def from_settings(cls, name: str, max_timeout: Optional[float] = None) -> "CircuitBreaker":
+        from django.conf import settings
+
+        return cls(
+            name,
+            window=settings.UPSTREAM_BREAKER_WINDOW,
+            min_calls=settings.UPSTREAM_BREAKER_MIN_CALLS,
+            error_rate=settings.UPSTREAM_BREAKER_ERROR_RATE,
+            slow_call=settings.UPSTREAM_BREAKER_SLOW_CALL,
+            slow_rate=settings.UPSTREAM_BREAKER_SLOW_RATE,
+            open_seconds=settings.UPSTREAM_BREAKER_OPEN_SECONDS,
+            min_timeout=settings.UPSTREAM_TIMEOUT_MIN,
+            max_timeout=max_timeout or settings.UPSTREAM_TIMEOUT_MAX,
+        )
+
+    # ------------------------------------------------------------------
+    # Appels
+    # ------------------------------------------------------------------
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs):
+        """
+        Exécute un appel HTTP amont sous la protection du disjoncteur.
+
+        Les exceptions `requests` et les réponses 5xx / 429 comptent comme
+        des échecs ; la réponse est renvoyée telle quelle dans ce dernier cas.
+
+        Raises:
+            CircuitOpenError: Si le circuit est ouvert
+        """
+        probe = self._before_call()
+        start = time.monotonic()
+        try:
+            response = fn(*args, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(False, time.monotonic() - start, probe)
+            raise
+        except BaseException:
+            self._release_probe(probe)
+            raise
+        ok = response.status_code < 500 and response.status_code != 429
+        self._record(ok, time.monotonic() - start, probe)
+        return response
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """
+        Variante asynchrone de call (client HTTP asynchrone).
+
+        Toute exception levée par l'appel compte comme un échec.
+
+        Raises:
+            CircuitOpenError: Si le circuit est ouvert
+        """
+        probe = self._before_call()
+        start = time.monotonic()
+        try:
+            response = await fn(*args, **kwargs)
+        except Exception:
+            self._record(False, time.monotonic() - start, probe)
+            raise
+        except BaseException:
+            self._release_probe(probe)
+            raise
+        ok = response.status_code < 500 and response.status_code != 429
+        self._record(ok, time.monotonic() - start, probe)
+        return response
+
+    def _before_call(self) -> bool:
+        """Vérifie l'état du circuit ; retourne True pour un appel d'essai."""
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._totals['rejected'] += 1
+            retry_after = max(0.0, self.open_seconds - (now - self._opened_at))
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _release_probe(self, probe: bool) -> None:
+        if probe:
+            with self._lock:
+                self._probe_in_flight = False
+
+    def _record(self, ok: bool, duration: float, probe: bool) -> None:
+        now = time.monotonic()
+        slow = duration >= self.slow_call
+        with self._lock:
+            self._totals['calls'] += 1
+            if not ok:
+                self._totals['failures'] += 1
+            if slow:
+                self._totals['slow_calls'] += 1
+            self._calls.append((now, ok, duration))
+            self._prune(now)
+
+            if probe:
+                self._probe_in_flight = False
+                if ok and not slow:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if self._state == CLOSED and self._should_open():
+                self._open(now)
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _should_open(self) -> bool:
+        n = len(self._calls)
+        if n < self.min_calls:
+            return False
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, _, d in self._calls if d >= self.slow_call)
+        return failures / n >= self.error_rate or slow / n >= self.slow_rate
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._totals['opened'] += 1
+
+    # ------------------------------------------------------------------
+    # Timeout adaptatif et état
+    # ------------------------------------------------------------------
+
+    def _latency_percentile(self, q: float) -> Optional[float]:
+        durations = sorted(d for _, ok, d in self._calls if ok)
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(math.ceil(q * len(durations))) - 1)]
+
+    def timeout(self) -> float:
+        """Timeout de lecture : timeout_factor x p95 des latences récentes, borné."""
+        with self._lock:
+            self._prune(time.monotonic())
+            p95 = self._latency_percentile(0.95)
+        if p95 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self) -> Dict[str, Any]:
+        timeout = self.timeout()
+        state = self.state
+        with self._lock:
+            n = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            slow = sum(1 for _, _, d in self._calls if d >= self.slow_call)
+            p50, p95 = self._latency_percentile(0.5), self._latency_percentile(0.95)
+            retry_after = None
+            if state == OPEN:
+                retry_after = round(self.open_seconds - (time.monotonic() - self._opened_at), 1)
+            stats = dict(self._totals)
+        stats.update({
+            'state': state,
+            'window_calls': n,
+            'error_rate': round(failures / n, 3) if n else None,
+            'slow_rate': round(slow / n, 3) if n else None,
+            'latency_p50_ms': round(p50 * 1000) if p50 is not None else None,
+            'latency_p95_ms': round(p95 * 1000) if p95 is not None else None,
+            'timeout_s': round(timeout, 2),
+            'retry_after_s': retry_after,
+        })
+        return stats
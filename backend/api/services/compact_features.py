@@ -0,0 +1,212 @@
+"""
+Stockage compact en mémoire des entités d'une couche communale.
+
+Une FeatureCollection GeoJSON décodée coûte environ dix fois la taille brute
+de ses coordonnées (un objet float et une liste par sommet). Ici, toutes les
+coordonnées d'une commune tiennent dans un seul tableau NumPy (N, 2) et la
+structure Polygon / MultiPolygon est décrite par des tableaux d'offsets :
+
+    feature_offsets[i]:feature_offsets[i + 1]  -> parties de l'entité i
+    part_offsets[p]:part_offsets[p + 1]        -> anneaux de la partie p
+    ring_offsets[r]:ring_offsets[r + 1]        -> sommets de l'anneau r
+
+Les propriétés sont conservées dans des enregistrements à `__slots__` dont
+les clés sont partagées. Le GeoJSON n'est reconstruit qu'à la sérialisation.
+"""
+
+import sys
+from array import array
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+
+# Types de géométrie par entité
+GEOM_NONE = 0
+GEOM_POLYGON = 1
+GEOM_MULTIPOLYGON = 2
+GEOM_OTHER = 3
+
+# Chaînes courtes répétées (code commune, préfixe, section...) internées
+INTERN_MAX_LENGTH = 16
+
+
+class FeatureRecord:
+    """Identifiant et propriétés d'une entité (clés partagées entre entités)."""
+
+    __slots__ = ('id', 'keys', 'values')
+
+    def __init__(self, feature_id, keys: Tuple[str, ...], values: Tuple[Any, ...]):
+        self.id = feature_id
+        self.keys = keys
+        self.values = values
+
+    def get(self, key: str, default=None):
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            return default
+
+    def properties(self) -> Dict[str, Any]:
+        return dict(zip(self.keys, self.values))
+
+
+def _intern(value):
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+class CompactFeatures:
+    """Entités d'une couche communale en tampons de coordonnées et offsets."""
+
+    def __init__(self, coords: np.ndarray, ring_offsets: np.ndarray, part_offsets: np.ndarray,
+                 feature_offsets: np.ndarray, geom_types: np.ndarray, bboxes: np.ndarray,
+                 records: List[FeatureRecord], others: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.part_offsets = part_offsets
+        self.feature_offsets = feature_offsets
+        self.geom_types = geom_types
+        # Emprises (F, 4) ; NaN pour les entités sans géométrie
+        self.bboxes = bboxes
+        self.records = records
+        # Géométries autres que (Multi)Polygon, conservées telles quelles
+        self.others = others or {}
+
+    @classmethod
+    def from_features(cls, features: List[Dict[str, Any]]) -> "CompactFeatures":
+        coords = array('d')
+        ring_offsets = array('q', [0])
+        part_offsets = array('q', [0])
+        feature_offsets = array('q', [0])
+        geom_types = array('b')
+        records = []
+        others = {}
+        key_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+        for i, feature in enumerate(features):
+            geometry = feature.get('geometry') or {}
+            gtype = geometry.get('type')
+            if gtype == 'Polygon':
+                polygons = [geometry.get('coordinates') or []]
+                geom_types.append(GEOM_POLYGON)
+            elif gtype == 'MultiPolygon':
+                polygons = geometry.get('coordinates') or []
+                geom_types.append(GEOM_MULTIPOLYGON)
+            else:
+                polygons = []
+                if geometry:
+                    others[i] = geometry
+                geom_types.append(GEOM_OTHER if geometry else GEOM_NONE)
+
+            for polygon in polygons:
+                for ring in polygon:
+                    for position in ring:
+                        coords.append(position[0])
+                        coords.append(position[1])
+                    ring_offsets.append(len(coords) // 2)
+                part_offsets.append(len(ring_offsets) - 1)
+            feature_offsets.append(len(part_offsets) - 1)
+
+            props = feature.get('properties') or {}
+            keys = tuple(props)
+            keys = key_sets.setdefault(keys, keys)
+            records.append(FeatureRecord(
+                _intern(feature.get('id')), keys, tuple(_intern(v) for v in props.values())
+            ))
+
+        compact = cls(
+            np.frombuffer(coords, dtype=np.float64).reshape(-1, 2),
+            np.frombuffer(ring_offsets, dtype=np.int64),
+            np.frombuffer(part_offsets, dtype=np.int64),
+            np.frombuffer(feature_offsets, dtype=np.int64),
+            np.frombuffer(geom_types, dtype=np.int8),
+            np.empty((0, 4)),
+            records,
+            others,
+        )
+        compact.bboxes = compact._compute_bboxes()
+        return compact
+
+    def _compute_bboxes(self) -> np.ndarray:
+        n = len(self.records)
+        bboxes = np.full((n, 4), np.nan)
+        # Premier / dernier sommet de chaque entité (offsets imbriqués)
+        first = self.ring_offsets[self.part_offsets[self.feature_offsets[:-1]]]
+        last = self.ring_offsets[self.part_offsets[self.feature_offsets[1:]]]
+        has_coords = last > first
+        if has_coords.any():
+            starts = first[has_coords]
+            bboxes[has_coords, 0:2] = np.minimum.reduceat(self.coords, starts)
+            bboxes[has_coords, 2:4] = np.maximum.reduceat(self.coords, starts)
+        if not self.others:
+            return bboxes
+        from .spatial_index import geometry_bbox
+
+        for i, geometry in self.others.items():
+            bbox = geometry_bbox(geometry)
+            if bbox is not None:
+                bboxes[i] = bbox
+        return bboxes
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.feature(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.records)):
+            yield self.feature(i)
+
+    def bbox(self, i: int) -> Optional[Tuple[float, float, float, float]]:
+        b = self.bboxes[i]
+        if np.isnan(b[0]):
+            return None
+        return tuple(float(v) for v in b)
+
+    def parts(self, i: int) -> List[List[np.ndarray]]:
+        """Parties de l'entité i, en vues (sans copie) sur le tampon de coordonnées."""
+        parts = []
+        for p in range(self.feature_offsets[i], self.feature_offsets[i + 1]):
+            parts.append([
+                self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+                for r in range(self.part_offsets[p], self.part_offsets[p + 1])
+            ])
+        return parts
+
+    def geometry(self, i: int) -> Optional[Dict[str, Any]]:
+        """Géométrie GeoJSON de l'entité i, reconstruite à la demande."""
+        gtype = self.geom_types[i]
+        if gtype == GEOM_NONE:
+            return None
+        if gtype == GEOM_OTHER:
+            return self.others[i]
+        polygons = [[ring.tolist() for ring in part] for part in self.parts(i)]
+        if gtype == GEOM_POLYGON:
+            return {"type": "Polygon", "coordinates": polygons[0] if polygons else []}
+        return {"type": "MultiPolygon", "coordinates": polygons}
+
+    def properties(self, i: int) -> Dict[str, Any]:
+        return self.records[i].properties()
+
+    def feature(self, i: int) -> Dict[str, Any]:
+        """Entité GeoJSON complète (les listes produites ne sont pas partagées)."""
+        feature = {"type": "Feature"}
+        record = self.records[i]
+        if record.id is not None:
+            feature["id"] = record.id
+        feature["geometry"] = self.geometry(i)
+        feature["properties"] = record.properties()
+        return feature
+
+    def nbytes(self) -> int:
+        """Estimation de l'empreinte mémoire (tampons et enregistrements)."""
+        total = sum(a.nbytes for a in (
+            self.coords, self.ring_offsets, self.part_offsets,
+            self.feature_offsets, self.geom_types, self.bboxes,
+        ))
+        total += sys.getsizeof(self.records)
+        for record in self.records:
+            total += sys.getsizeof(record) + sys.getsizeof(record.values)
+        return total
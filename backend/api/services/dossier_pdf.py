@@ -0,0 +1,352 @@
+"""
+Assemblage serveur du PDF d'un dossier de déclaration préalable.
+
+Le formulaire CERFA reprend la mise en page de pdfGenerator.js (sections
+1 à 7, mêmes libellés), suivi du plan de situation (DP1) rendu par
+`plan_renderer` lorsqu'aucun DP1 n'a été joint, puis des pièces jointes
+(images en data URL de `piecesJointes`), une par page.
+"""
+
+import base64
+import binascii
+import io
+import logging
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+from PIL import Image, UnidentifiedImageError
+from reportlab.lib.colors import Color, white
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
+
+from .plan_renderer import plan_renderer, dossier_parcel_reference
+
+logger = logging.getLogger(__name__)
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 40
+
+PRIMARY_COLOR = Color(0, 0.2, 0.4)  # #003366 (bleu officiel CERFA)
+TEXT_COLOR = Color(0.1, 0.1, 0.1)
+GRAY_COLOR = Color(0.4, 0.4, 0.4)
+
+FOOTER_TEXT = 'Document généré par Urbania CERFA Builder'
+
+# Cf. travauxLabels (pdfGenerator.js)
+TRAVAUX_LABELS = {
+    'piscine': 'Piscine',
+    'garage': 'Garage / Carport',
+    'extension': 'Extension',
+    'cloture': 'Clôture / Portail',
+    'abri_jardin': 'Abri de jardin',
+    'veranda': 'Véranda',
+    'terrasse': 'Terrasse',
+    'autre': 'Autre',
+}
+
+# Cf. DOCUMENTS_INFO (projectConfigs.js), dans l'ordre du bordereau
+PIECE_LABELS = {
+    'dp1': 'DP1 - Plan de situation',
+    'dp2': 'DP2 - Plan de masse',
+    'dp3': 'DP3 - Plan de coupe',
+    'dp4': 'DP4 - Façades et toitures',
+    'dp5': 'DP5 - Représentation extérieure',
+    'dp6': 'DP6 - Insertion paysagère',
+    'dp7': 'DP7 - Photographie proche',
+    'dp8': 'DP8 - Photographie lointaine',
+}
+
+# Résolution maximale des images intégrées (A4 à 300 dpi)
+MAX_IMAGE_SIZE = (2480, 3508)
+
+DATA_URL_RE = re.compile(r'data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,(?P<data>.*)', re.S)
+
+
+class NumberedCanvas(canvas.Canvas):
+    """Canvas qui ajoute le pied de page « Page n/N » une fois le nombre de pages connu."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._page_states = []
+
+    def showPage(self):
+        self._page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        for number, state in enumerate(self._page_states, start=1):
+            self.__dict__.update(state)
+            self.setFont('Helvetica', 8)
+            self.setFillColor(GRAY_COLOR)
+            self.drawString(50, 30, FOOTER_TEXT)
+            self.drawString(PAGE_WIDTH - 80, 30, f"Page {number}/{len(self._page_states)}")
+            super().showPage()
+        super().save()
+
+
+class CerfaWriter:
+    """Écriture séquentielle des sections du CERFA, avec saut de page automatique."""
+
+    def __init__(self, pdf: canvas.Canvas):
+        self.pdf = pdf
+        self.y = PAGE_HEIGHT - 50
+
+    def ensure(self, height: float) -> None:
+        """Passe à la page suivante s'il reste moins de `height` points."""
+        if self.y - height < 60:
+            self.pdf.showPage()
+            self.y = PAGE_HEIGHT - 50
+
+    def text(self, text: str, x: float, y: float, size: float = 10, bold: bool = False,
+             color: Color = TEXT_COLOR) -> None:
+        self.pdf.setFont('Helvetica-Bold' if bold else 'Helvetica', size)
+        self.pdf.setFillColor(color)
+        self.pdf.drawString(x, y, text or '')
+
+    def section(self, title: str) -> None:
+        self.ensure(60)
+        self.pdf.setFillColor(PRIMARY_COLOR)
+        self.pdf.rect(MARGIN, self.y - 4, PAGE_WIDTH - 2 * MARGIN, 18, stroke=0, fill=1)
+        self.text(title, 50, self.y, size=10, bold=True, color=white)
+        self.y -= 25
+
+    def field(self, label: str, value: Any) -> None:
+        value = '' if value is None else str(value)
+        lines = simpleSplit(value, 'Helvetica-Bold', 9, PAGE_WIDTH - 2 * MARGIN - 110) or ['']
+        self.ensure(15 * len(lines))
+        self.text(label + ' :', 50, self.y, size=9, color=GRAY_COLOR)
+        for line in lines:
+            self.text(line or '_____________', 150, self.y, size=9, bold=True)
+            self.y -= 15
+
+    def checkbox(self, label: str, checked: bool, x: float) -> None:
+        self.pdf.setStrokeColor(TEXT_COLOR)
+        self.pdf.setLineWidth(0.8)
+        self.pdf.rect(x, self.y - 1, 8, 8, stroke=1, fill=0)
+        if checked:
+            self.pdf.line(x + 1.5, self.y + 0.5, x + 6.5, self.y + 5.5)
+            self.pdf.line(x + 1.5, self.y + 5.5, x + 6.5, self.y + 0.5)
+        self.text(label, x + 12, self.y, size=9)
+
+    def paragraph(self, text: str, size: float = 9, leading: float = 12) -> None:
+        for line in simpleSplit(text, 'Helvetica', size, PAGE_WIDTH - 100):
+            self.ensure(leading)
+            self.text(line, 50, self.y, size=size)
+            self.y -= leading
+        self.y -= 3
+
+
+def _draw_cerfa(pdf: canvas.Canvas, data: Dict[str, Any]) -> None:
+    """Formulaire CERFA 16702*01 (cf. generateCerfaPDF)."""
+    w = CerfaWriter(pdf)
+
+    w.text('N° 16702*01', PAGE_WIDTH - 80, w.y + 20, size=7, bold=True)
+    w.text('DÉCLARATION PRÉALABLE', PAGE_WIDTH / 2 - 80, w.y, size=16, bold=True, color=PRIMARY_COLOR)
+    w.y -= 18
+    w.text('Constructions et travaux non soumis à permis de construire', PAGE_WIDTH / 2 - 130, w.y,
+           size=10, bold=True)
+    w.y -= 15
+    w.text("Ce document est émis par le ministère en charge de l'urbanisme", PAGE_WIDTH / 2 - 120, w.y,
+           size=7, color=GRAY_COLOR)
+    w.y -= 30
+
+    # Section 1 : Identité du déclarant
+    w.section('1. IDENTITÉ DU DÉCLARANT')
+    is_particulier = data.get('typeDeclarant') == 'particulier'
+    w.checkbox('Particulier', is_particulier, 50)
+    w.checkbox('Personne morale', not is_particulier, 150)
+    w.y -= 20
+    if is_particulier:
+        w.field('Civilité', data.get('civilite'))
+        w.field('Nom', data.get('nom'))
+        w.field('Prénom', data.get('prenom'))
+        w.field('Né(e) le', data.get('dateNaissance'))
+        w.field('À', data.get('lieuNaissance'))
+    else:
+        w.field('Dénomination', data.get('denomination'))
+        w.field('SIRET', data.get('siret'))
+        w.field('Type', data.get('typeSociete'))
+        w.field('Représentant', f"{data.get('representantPrenom') or ''} {data.get('representantNom') or ''}".strip())
+        w.field('Qualité', data.get('representantQualite'))
+    w.y -= 10
+
+    # Section 2 : Coordonnées
+    w.section('2. COORDONNÉES DU DÉCLARANT')
+    w.field('Adresse', data.get('adresse'))
+    if data.get('complementAdresse'):
+        w.field('Complément', data.get('complementAdresse'))
+    w.field('Code postal', data.get('codePostal'))
+    w.field('Ville', data.get('ville'))
+    w.field('Téléphone', data.get('telephone'))
+    w.field('Email', data.get('email'))
+    w.y -= 10
+
+    # Section 3 : Terrain
+    w.section('3. TERRAIN CONCERNÉ PAR LE PROJET')
+    w.field('Adresse', data.get('terrainAdresse'))
+    w.field('Code postal', data.get('terrainCodePostal'))
+    w.field('Ville', data.get('terrainVille'))
+    reference = f"{data.get('prefixe') or ''}{data.get('section') or ''} {data.get('numeroParcelle') or ''}"
+    w.field('Réf. cadastrale', reference.strip())
+    w.field('Surface terrain', f"{data['surfaceTerrain']} m²" if data.get('surfaceTerrain') else '')
+    w.y -= 10
+
+    # Section 4 : Nature des travaux
+    w.section('4. NATURE DES TRAVAUX')
+    w.field('Type de travaux', data.get('typeTravaux'))
+    natures = data.get('natureTravaux') or []
+    if not isinstance(natures, list):
+        natures = [natures]
+    w.text('Nature des travaux :', 50, w.y, size=9, color=GRAY_COLOR)
+    w.y -= 15
+    w.text(', '.join(TRAVAUX_LABELS.get(n, str(n)) for n in natures) or 'Non spécifié', 50, w.y,
+           size=9, bold=True)
+    w.y -= 20
+
+    # Section 5 : Description
+    w.section('5. DESCRIPTION DU PROJET')
+    w.paragraph(str(data.get('descriptionProjet') or 'Aucune description fournie'))
+    w.field('Couleur façades', data.get('couleurFacade'))
+    w.field('Couleur toiture', data.get('couleurToiture'))
+    w.field('Matériau façades', data.get('materiauFacade'))
+    w.field('Matériau toiture', data.get('materiauToiture'))
+    w.field('Hauteur', f"{data['hauteurConstruction']} m" if data.get('hauteurConstruction') else '')
+    w.y -= 10
+
+    # Section 6 : Surfaces
+    w.section('6. SURFACES')
+    for title, prefix in (('Surface de plancher (m²)', 'surfacePlancher'), ('Emprise au sol (m²)', 'empriseSol')):
+        w.ensure(60)
+        w.text(title, 50, w.y, size=9, bold=True, color=GRAY_COLOR)
+        w.y -= 15
+        w.field('Existante', data.get(f'{prefix}Existante') or '0')
+        w.field('Créée', data.get(f'{prefix}Creee') or '0')
+        w.field('Totale', data.get(f'{prefix}Totale') or '0')
+        w.y -= 5
+    w.y -= 5
+
+    # Section 7 : Signature
+    w.section('7. ENGAGEMENT ET SIGNATURE')
+    w.ensure(150)
+    w.checkbox("Je certifie l'exactitude des renseignements fournis", True, 50)
+    w.y -= 15
+    w.checkbox("Je m'engage à respecter les règles d'urbanisme applicables", True, 50)
+    w.y -= 25
+    w.field('Fait à', data.get('lieuDeclaration'))
+    w.field('Le', data.get('dateDeclaration'))
+    w.y -= 20
+    w.text('Signature du déclarant :', 50, w.y, size=9, color=GRAY_COLOR)
+    w.y -= 10
+    pdf.setStrokeColor(GRAY_COLOR)
+    pdf.setLineWidth(1)
+    pdf.rect(50, w.y - 50, 200, 50, stroke=1, fill=0)
+    pdf.showPage()
+
+
+def decode_piece(value: Any) -> Optional[Image.Image]:
+    """
+    Image d'une pièce jointe (data URL base64), ou None si illisible.
+
+    L'image est aplatie sur fond blanc et réduite à MAX_IMAGE_SIZE.
+    """
+    if not isinstance(value, str):
+        return None
+    match = DATA_URL_RE.match(value)
+    if not match:
+        return None
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(match.group('data'))))
+        image.load()
+    except (binascii.Error, ValueError, UnidentifiedImageError, OSError):
+        return None
+    except Image.DecompressionBombError as e:
+        logger.warning(f"Pièce jointe ignorée : {e}")
+        return None
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail(MAX_IMAGE_SIZE)
+    return image
+
+
+def _draw_image_page(pdf: canvas.Canvas, title: str, image: ImageReader,
+                     size: Tuple[int, int]) -> None:
+    """Une page titrée contenant l'image, centrée et ajustée à la page."""
+    pdf.setFillColor(PRIMARY_COLOR)
+    pdf.rect(MARGIN, PAGE_HEIGHT - 54, PAGE_WIDTH - 2 * MARGIN, 18, stroke=0, fill=1)
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.setFillColor(white)
+    pdf.drawString(50, PAGE_HEIGHT - 50, title.upper())
+
+    box_width, box_height = PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT - 140
+    ratio = min(box_width / size[0], box_height / size[1])
+    width, height = size[0] * ratio, size[1] * ratio
+    x = (PAGE_WIDTH - width) / 2
+    y = 60 + (box_height - height) / 2
+    pdf.drawImage(image, x, y, width, height)
+    pdf.showPage()
+
+
+def _situation_plan(data: Dict[str, Any]) -> Optional[Image.Image]:
+    """Plan de situation rendu côté serveur, ou None sans référence cadastrale."""
+    reference = dossier_parcel_reference(data)
+    if reference is None:
+        return None
+    payload = plan_renderer.render(*reference, data, fmt='png', scale=3)
+    if not payload:
+        logger.warning(f"Parcel {' '.join(reference)} not found, PDF built without situation plan")
+        return None
+    with Image.open(io.BytesIO(payload)) as image:
+        return image.convert('RGB')
+
+
+def build_dossier_pdf(data: Dict[str, Any], include_plan: bool = True) -> bytes:
+    """
+    Construit le PDF complet d'un dossier.
+
+    Args:
+        data: Données du formulaire CERFA (Dossier.data)
+        include_plan: Rendre le plan de situation si aucun DP1 n'est joint
+
+    Returns:
+        Contenu du fichier PDF
+
+    Raises:
+        Les erreurs du rendu du plan de situation (service cadastre
+        indisponible...), pour que la génération puisse être retentée.
+    """
+    buffer = io.BytesIO()
+    pdf = NumberedCanvas(buffer, pagesize=A4)
+    pdf.setTitle('Déclaration préalable')
+    pdf.setCreator('Urbania CERFA Builder')
+
+    _draw_cerfa(pdf, data)
+
+    pieces = data.get('piecesJointes') or {}
+    if not isinstance(pieces, dict):
+        pieces = {}
+    pages: List[Tuple[str, Image.Image]] = []
+    for doc_id in list(PIECE_LABELS) + sorted(set(pieces) - set(PIECE_LABELS)):
+        if not pieces.get(doc_id):
+            continue
+        image = decode_piece(pieces[doc_id])
+        if image is None:
+            logger.warning(f"Unreadable attachment '{doc_id}' skipped")
+            continue
+        pages.append((PIECE_LABELS.get(doc_id, doc_id), image))
+
+    if include_plan and not any(title == PIECE_LABELS['dp1'] for title, _ in pages):
+        plan = _situation_plan(data)
+        if plan is not None:
+            pages.insert(0, (PIECE_LABELS['dp1'], plan))
+
+    for title, image in pages:
+        _draw_image_page(pdf, title, ImageReader(image), image.size)
+
+    pdf.save()
+    return buffer.getvalue()
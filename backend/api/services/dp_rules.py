@@ -0,0 +1,277 @@
+"""
+Moteur de règles des pièces DP (dp1 à dp8), en amont de l'IA.
+
+Le choix des pièces découle presque toujours du type de travaux : dp1 et
+dp7 sont toujours exigées, dp2 et dp6 dès qu'un volume ou une emprise au sol
+est créé, dp4 et dp5 dès que l'aspect extérieur change. Le moteur reconnaît
+le type de travaux :
+
+- d'après `natureTravaux` (types du formulaire, configuration identique à
+  frontend/src/config/projectConfigs.js, à tenir synchronisée) ;
+- à défaut, d'après les mots-clés de la description (« abri de jardin »,
+  « carport », « remplacement des fenêtres »...).
+
+Une décision s'accompagne d'un indice de confiance ; en dessous de
+AI_RULES_MIN_CONFIDENCE (description sans type reconnu, plusieurs types de
+construction, démolition, changement de destination, équipement posé en
+façade ou sur le toit...), la question est posée à Mistral.
+
+Calibrage : manage.py eval_dp_rules.
+"""
+
+import re
+import threading
+from collections import defaultdict
+from typing import Optional, Dict, Any, List
+
+from django.conf import settings
+
+from .similarity_index import description_tokens
+
+DOCUMENT_KEYS = ["dp1", "dp2", "dp3", "dp4", "dp5", "dp6", "dp7", "dp8"]
+
+# Configuration des types de travaux : pièces et champs requis, questions
+# spécifiques (reprises de projectConfigs.js) et catégorie de projet
+PROJECT_TYPES = {
+    'piscine': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp6', 'dp7', 'dp8'],
+        'requiredFields': ['surfaceTerrain', 'surfacePlancherCreee'],
+        'specificQuestions': [
+            {'field': 'piscineCouverture', 'label': 'Piscine couverte ?', 'type': 'boolean'},
+            {'field': 'piscineSecurite', 'label': 'Système de sécurité', 'type': 'select',
+             'options': ['Alarme', 'Barrière', 'Couverture', 'Abri']},
+            {'field': 'piscineDimensions', 'label': 'Dimensions du bassin (L x l)', 'type': 'text'},
+        ],
+        'projectCategory': 'construction',
+    },
+    'extension': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp4', 'dp5', 'dp6', 'dp7', 'dp8'],
+        'requiredFields': ['surfaceTerrain', 'surfacePlancherCreee', 'hauteurConstruction', 'couleurFacade',
+                           'materiauFacade', 'couleurToiture', 'materiauToiture'],
+        'specificQuestions': [
+            {'field': 'extensionUsage', 'label': "Destination de l'extension", 'type': 'select',
+             'options': ['Habitation', 'Garage', 'Bureau', 'Autre']},
+            {'field': 'extensionEtages', 'label': 'Nombre de niveaux', 'type': 'number'},
+        ],
+        'projectCategory': 'construction',
+    },
+    'cloture': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp4', 'dp5', 'dp7'],
+        'requiredFields': ['hauteurConstruction'],
+        'specificQuestions': [
+            {'field': 'clotureType', 'label': 'Type de clôture', 'type': 'select',
+             'options': ['Mur', 'Grillage', 'Bois', 'PVC', 'Mixte']},
+            {'field': 'cloturePortail', 'label': 'Inclut un portail ?', 'type': 'boolean'},
+            {'field': 'clotureLineaire', 'label': 'Linéaire total (m)', 'type': 'number'},
+        ],
+        'projectCategory': 'amenagement',
+    },
+    'garage': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp4', 'dp6', 'dp7', 'dp8'],
+        'requiredFields': ['surfaceTerrain', 'surfacePlancherCreee', 'hauteurConstruction', 'materiauFacade',
+                           'materiauToiture'],
+        'specificQuestions': [
+            {'field': 'garageType', 'label': 'Type', 'type': 'select',
+             'options': ['Garage fermé', 'Carport ouvert', 'Abri voiture']},
+            {'field': 'garageVehicules', 'label': 'Nombre de véhicules', 'type': 'number'},
+        ],
+        'projectCategory': 'construction',
+    },
+    'abri_jardin': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp4', 'dp6', 'dp7'],
+        'requiredFields': ['surfacePlancherCreee', 'hauteurConstruction'],
+        'specificQuestions': [
+            {'field': 'abriUsage', 'label': 'Usage prévu', 'type': 'select',
+             'options': ['Rangement', 'Atelier', 'Local technique', 'Autre']},
+        ],
+        'projectCategory': 'construction',
+    },
+    'veranda': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp4', 'dp5', 'dp6', 'dp7', 'dp8'],
+        'requiredFields': ['surfacePlancherCreee', 'hauteurConstruction', 'materiauFacade', 'materiauToiture',
+                           'couleurFacade'],
+        'specificQuestions': [
+            {'field': 'verandaVitrages', 'label': 'Type de vitrage', 'type': 'select',
+             'options': ['Simple', 'Double', 'Triple']},
+            {'field': 'verandaChauffee', 'label': 'Véranda chauffée ?', 'type': 'boolean'},
+        ],
+        'projectCategory': 'construction',
+    },
+    'terrasse': {
+        'requiredDocuments': ['dp1', 'dp2', 'dp3', 'dp6', 'dp7'],
+        'requiredFields': ['surfacePlancherCreee'],
+        'specificQuestions': [
+            {'field': 'terrasseMateriau', 'label': 'Matériau du revêtement', 'type': 'select',
+             'options': ['Bois', 'Composite', 'Carrelage', 'Pierre', 'Béton']},
+            {'field': 'terrasseSurelevee', 'label': 'Terrasse surélevée ?', 'type': 'boolean'},
+        ],
+        'projectCategory': 'amenagement',
+    },
+    'toiture': {
+        'requiredDocuments': ['dp1', 'dp4', 'dp5', 'dp6', 'dp7', 'dp8'],
+        'requiredFields': ['materiauToiture', 'couleurToiture'],
+        'specificQuestions': [
+            {'field': 'toitureType', 'label': 'Type de travaux', 'type': 'select',
+             'options': ['Réfection complète', 'Changement matériau', 'Modification pente', 'Ravalement façade']},
+            {'field': 'toitureIsolation', 'label': 'Isolation thermique ?', 'type': 'boolean'},
+        ],
+        'projectCategory': 'modification',
+    },
+}
+
+# Mots-clés de chaque type, appliqués à la description réduite à ses mots
+# significatifs (minuscules, sans accents ni articles, au singulier : voir
+# similarity_index.description_tokens : « bois » y devient « boi », « velux » « velu »)
+KEYWORDS = {
+    'piscine': r"\bpiscine\b|\bbassin\b|\bspa\b|\bjacuzzi\b|\bnage\b",
+    'garage': r"(?<!porte )\bgarage\b|\bcarport\b|\babri (?:pour )?(?:voiture|auto|vehicule|camping car)\b",
+    'abri_jardin': r"\babri (?:jardin|boi|outil|velo)\b|\bcabanon\b|\bcabane\b|\bremise\b|\bchalet\b"
+                   r"|\bbucher\b|\bpool house\b|\batelier jardin\b|\bserre\b",
+    'veranda': r"\bveranda\b|\bjardin hiver\b",
+    'extension': r"\bextension\b|\bagrandissement\b|\bagrandir\b|\bsurelevation\b|\bpiece supplementaire\b",
+    'terrasse': r"\bterrasse\b|\bdeck\b|\bpergola\b|\bplancher bois\b",
+    'cloture': r"\bcloture\b|\bclore\b|\bportail\b|\bportillon\b|\bgrillage\b|\bmuret\b|\bmur (?:limite|separatif)\b",
+    'toiture': r"\btoiture\b|\btoit\b|\bcouverture\b|\btuile\b|\bardoise\b|\bravalement\b|\bfacade\b"
+               r"|\bfenetre\b|\bvelux?\b|\bchassi\b|\bbaie\b|\bvolet\b|\bmenuiserie\b|\bporte\b|\benduit\b"
+               r"|\bbardage\b|\bpanneau solaire\b|\bphotovoltaique\b|\bisolation exterieure\b",
+}
+
+# Types qui créent une construction : leurs mots décrivent souvent des
+# matériaux (« garage avec toit en tuiles »), qui ne font pas des travaux de
+# toiture ou de façade pour autant
+CONSTRUCTION_TYPES = frozenset(['piscine', 'garage', 'abri_jardin', 'veranda', 'extension', 'terrasse', 'cloture'])
+
+# Travaux dont les pièces ne découlent pas du type reconnu : toujours confiés à l'IA.
+# Les équipements (pompe à chaleur, climatiseur...) citent souvent la façade
+# ou le toit où ils sont posés, sans être des travaux de toiture ou de façade.
+AMBIGUOUS = re.compile(
+    r"\bdemoli|\bdemolition\b|\bdestruction\b|\bchangement (?:destination|usage)\b|\btransformation\b"
+    r"|\btransformer\b|\bcomble\b|\bsou sol\b|\bdivision\b|\bmobil home\b|\beolienne\b|\bantenne\b"
+    r"|\bpompe chaleur\b|\bpac\b|\bclimati|\bunite exterieure\b|\bgroupe exterieur\b|\bparabole\b"
+    r"|\bmonument historique\b|\bsite classe\b|\bsecteur sauvegarde\b"
+)
+
+CONFIDENCE_NATURE = 1.0
+CONFIDENCE_SINGLE_TYPE = 0.9
+CONFIDENCE_SEVERAL_TYPES = 0.6
+CONFIDENCE_AMBIGUOUS = 0.3
+
+_KEYWORD_RES = {project_type: re.compile(pattern) for project_type, pattern in KEYWORDS.items()}
+
+
+def description_text(description: str) -> str:
+    """Description réduite à ses mots significatifs, séparés par des espaces."""
+    words, _ = description_tokens(description)
+    return ' '.join(words)
+
+
+def detect_types(text: str) -> List[str]:
+    """Types de travaux reconnus par mots-clés dans une description réduite (voir description_text)."""
+    found = [project_type for project_type, regex in _KEYWORD_RES.items() if regex.search(text)]
+    if any(t in CONSTRUCTION_TYPES for t in found):
+        found = [t for t in found if t in CONSTRUCTION_TYPES]
+    return found
+
+
+def nature_types(nature_travaux) -> List[str]:
+    """Types connus de `natureTravaux` (liste ou chaîne) ; 'autre' et les inconnus sont ignorés."""
+    if isinstance(nature_travaux, str):
+        nature_travaux = [nature_travaux]
+    if not isinstance(nature_travaux, (list, tuple)):
+        return []
+    return [t for t in nature_travaux if t in PROJECT_TYPES]
+
+
+class RulesDecision:
+    """Pièces décidées par les règles, avec leur indice de confiance et leur origine."""
+
+    __slots__ = ('types', 'confidence', 'source', 'reason')
+
+    def __init__(self, types: List[str], confidence: float, source: str, reason: str = ''):
+        self.types = types
+        self.confidence = confidence
+        self.source = source
+        self.reason = reason
+
+    def required_documents(self) -> List[str]:
+        required = {doc for t in self.types for doc in PROJECT_TYPES[t]['requiredDocuments']}
+        required.update(['dp1', 'dp7'])
+        return [doc for doc in DOCUMENT_KEYS if doc in required]
+
+    def documents(self) -> Dict[str, bool]:
+        """Réponse au format de suggest_documents ({dp1: bool, ..., dp8: bool})."""
+        required = set(self.required_documents())
+        return {doc: doc in required for doc in DOCUMENT_KEYS}
+
+    def configuration(self) -> Dict[str, Any]:
+        """Réponse au format de configure_custom_project."""
+        fields, questions = [], []
+        for t in self.types:
+            config = PROJECT_TYPES[t]
+            fields.extend(f for f in config['requiredFields'] if f not in fields)
+            questions.extend(config['specificQuestions'])
+        categories = {PROJECT_TYPES[t]['projectCategory'] for t in self.types}
+        return {
+            'requiredFields': fields,
+            'requiredDocuments': self.required_documents(),
+            'specificQuestions': questions,
+            'projectCategory': categories.pop() if len(categories) == 1 else 'construction',
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'types': self.types, 'confidence': self.confidence, 'source': self.source, 'reason': self.reason}
+
+
+class DPRulesEngine:
+    """Décide des pièces DP sans appel à l'IA lorsque le type de travaux est sans ambiguïté."""
+
+    def __init__(self, min_confidence: float):
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'decided': 0, 'deferred': 0})
+
+    @classmethod
+    def from_settings(cls) -> "DPRulesEngine":
+        return cls(min_confidence=settings.AI_RULES_MIN_CONFIDENCE)
+
+    def classify(self, description: str, nature_travaux=None) -> RulesDecision:
+        """Types de travaux reconnus et confiance, quel que soit le seuil."""
+        text = description_text(description)
+        ambiguous = AMBIGUOUS.search(text)
+        natures = nature_types(nature_travaux)
+        detected = detect_types(text)
+
+        if ambiguous:
+            types = natures or detected
+            return RulesDecision(types, CONFIDENCE_AMBIGUOUS if types else 0.0, 'keywords',
+                                 f"travaux à examiner : {ambiguous.group(0)}")
+        if natures:
+            # Types du formulaire, complétés des constructions citées dans la description
+            extra = [t for t in detected if t not in natures and t in CONSTRUCTION_TYPES]
+            return RulesDecision(natures + extra, CONFIDENCE_NATURE, 'nature')
+        if len(detected) == 1:
+            return RulesDecision(detected, CONFIDENCE_SINGLE_TYPE, 'keywords')
+        if detected:
+            return RulesDecision(detected, CONFIDENCE_SEVERAL_TYPES, 'keywords', "plusieurs types de travaux")
+        return RulesDecision([], 0.0, 'keywords', "aucun type de travaux reconnu")
+
+    def decide(self, method: str, description: str, nature_travaux=None) -> Optional[RulesDecision]:
+        """Décision des règles si sa confiance atteint le seuil, sinon None (question posée à l'IA)."""
+        decision = self.classify(description, nature_travaux)
+        decided = bool(decision.types) and decision.confidence >= self.min_confidence
+        with self._lock:
+            self._stats[method]['decided' if decided else 'deferred'] += 1
+        return decision if decided else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Décisions des règles et questions laissées à l'IA, par méthode (processus courant)."""
+        with self._lock:
+            methods = {method: dict(counters) for method, counters in self._stats.items()}
+        for counters in methods.values():
+            total = counters['decided'] + counters['deferred']
+            counters['decided_ratio'] = round(counters['decided'] / total, 3) if total else None
+        return {'min_confidence': self.min_confidence, 'methods': methods}
+
+
+# Instance singleton pour réutilisation
+dp_rules = DPRulesEngine.from_settings()
@@ -0,0 +1,197 @@
+"""
+Caches en mémoire des résultats de géocodage (api-adresse.data.gouv.fr).
+
+- Géocodage direct : les requêtes sont normalisées (casse, accents et
+  espaces) avant d'être utilisées comme clé. En saisie semi-automatique, une
+  requête plus longue peut être servie en filtrant les résultats déjà obtenus
+  pour l'un de ses préfixes, sans nouvel appel amont.
+- Géocodage inverse : les coordonnées sont ramenées sur une grille
+  (~10 m par défaut), si bien que des clics voisins partagent la même entrée.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+# Longueur minimale d'un préfixe réutilisable
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize_query(query: str) -> str:
+    """Minuscules, sans accents, ponctuation et espaces multiples réduits."""
+    text = unicodedata.normalize('NFKD', query or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w]+", ' ', text.lower())
+    return ' '.join(text.split())
+
+
+def matches_query(result: Dict[str, Any], tokens: List[str]) -> bool:
+    """Vrai si chaque mot de la requête débute un mot du libellé du résultat."""
+    words = normalize_query(result.get('label', '')).split()
+    return all(any(w.startswith(t) for w in words) for t in tokens)
+
+
+# Mètres par degré de latitude
+METERS_PER_DEGREE = 111320.0
+
+# Marqueur d'absence en cache (None est un résultat valide du géocodage inverse)
+MISSING = object()
+
+
+class TTLCache:
+    """Dictionnaire LRU borné dont les entrées expirent après `ttl` secondes."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class GeocodeCache:
+    """Cache LRU borné, à durée de vie (TTL), des résultats de géocodage."""
+
+    def __init__(self, max_entries: int = 5000, ttl: int = 24 * 3600):
+        self.max_entries = max_entries
+        self._entries = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'prefix_hits': 0, 'misses': 0, 'upstream_calls': 0}
+
+    @classmethod
+    def from_settings(cls) -> "GeocodeCache":
+        from django.conf import settings
+
+        return cls(
+            max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES,
+            ttl=settings.GEOCODE_CACHE_TTL,
+        )
+
+    def get(self, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Résultats en cache pour une requête, ou None.
+
+        À défaut de correspondance exacte, le plus long préfixe en cache est
+        filtré : sa liste est réutilisée si elle était exhaustive (moins de
+        `limit` résultats) ou si le filtre conserve au moins `limit` résultats.
+        """
+        normalized = normalize_query(query)
+        results = self._entries.get((normalized, limit))
+        if results is not None:
+            self._record('hits')
+            return results
+
+        tokens = normalized.split()
+        for end in range(len(normalized) - 1, MIN_PREFIX_LENGTH - 1, -1):
+            candidates = self._entries.get((normalized[:end].rstrip(), limit))
+            if candidates is None:
+                continue
+            filtered = [r for r in candidates if matches_query(r, tokens)]
+            if filtered and (len(candidates) < limit or len(filtered) >= limit):
+                self._record('prefix_hits')
+                return filtered[:limit]
+            break
+
+        self._record('misses')
+        return None
+
+    def set(self, query: str, limit: int, results: List[Dict[str, Any]]) -> None:
+        self._entries.set((normalize_query(query), limit), results)
+
+    def _record(self, counter: str) -> None:
+        with self._lock:
+            self._stats[counter] += 1
+
+    def record_upstream_call(self) -> None:
+        self._record('upstream_calls')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['prefix_hits'] + stats['misses']
+        stats['max_entries'] = self.max_entries
+        stats['hit_ratio'] = (
+            round((stats['hits'] + stats['prefix_hits']) / lookups, 3) if lookups else None
+        )
+        return stats
+
+
+class ReverseGeocodeCache:
+    """
+    Cache du géocodage inverse, indexé par coordonnées ramenées sur une grille.
+
+    Les résultats vides (aucune adresse trouvée) sont aussi mis en cache.
+    """
+
+    def __init__(self, grid_meters: float = 10.0, max_entries: int = 20000, ttl: int = 24 * 3600):
+        self.grid_meters = grid_meters
+        self.max_entries = max_entries
+        self._entries = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @classmethod
+    def from_settings(cls) -> "ReverseGeocodeCache":
+        from django.conf import settings
+
+        return cls(
+            grid_meters=settings.REVERSE_GEOCODE_GRID_METERS,
+            max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES,
+            ttl=settings.GEOCODE_CACHE_TTL,
+        )
+
+    def cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        """Cellule de grille (~grid_meters de côté) contenant le point."""
+        lat_step = self.grid_meters / METERS_PER_DEGREE
+        iy = math.floor(lat / lat_step)
+        # Pas en longitude calculé au centre de la bande de latitude
+        center_lat = (iy + 0.5) * lat_step
+        lon_step = lat_step / max(math.cos(math.radians(center_lat)), 1e-6)
+        return (math.floor(lon / lon_step), iy)
+
+    def get(self, lon: float, lat: float):
+        """Résultat en cache (dictionnaire ou None) ; `MISSING` si absent."""
+        value = self._entries.get(self.cell(lon, lat), MISSING)
+        with self._lock:
+            self._stats['misses' if value is MISSING else 'hits'] += 1
+        return value
+
+    def set(self, lon: float, lat: float, result: Optional[Dict[str, Any]]) -> None:
+        self._entries.set(self.cell(lon, lat), result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': len(self._entries),
+            'grid_meters': self.grid_meters,
+            'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else None,
+        })
+        return stats
@@ -0,0 +1,210 @@
+"""
+Opérations géométriques sur les géométries GeoJSON cadastrales.
+
+- Simplification Douglas-Peucker vectorisée (NumPy)
+- Quantification des coordonnées (arrondi à `precision` décimales)
+- Découpage (clipping) de polygones sur une emprise rectangulaire
+"""
+
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+BBox = Tuple[float, float, float, float]
+
+
+def simplify_line(coords: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifie une polyligne ou un anneau par Douglas-Peucker.
+
+    Les distances d'un segment à tous ses sommets intermédiaires sont
+    calculées en une seule opération NumPy ; la récursion est remplacée par
+    une pile explicite.
+
+    Args:
+        coords: Tableau (N, 2) des sommets
+        tolerance: Distance maximale tolérée, dans l'unité des coordonnées
+
+    Returns:
+        Sous-ensemble des sommets (premier et dernier toujours conservés)
+    """
+    n = len(coords)
+    if tolerance <= 0 or n <= 3:
+        return coords
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a = coords[start]
+        dx, dy = coords[end] - a
+        seg = coords[start + 1:end]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (seg[:, 1] - a[1]) - dy * (seg[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            index = start + 1 + i
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return coords[keep]
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplifie un anneau fermé ; l'anneau d'origine est conservé s'il dégénère."""
+    simplified = simplify_line(ring, tolerance)
+    if len(simplified) < 4:
+        return ring
+    return simplified
+
+
+def quantize_ring(ring: np.ndarray, precision: int) -> np.ndarray:
+    """Arrondit les coordonnées et supprime les sommets consécutifs devenus identiques."""
+    rounded = np.round(ring, precision)
+    if len(rounded) < 2:
+        return rounded
+    changed = np.any(rounded[1:] != rounded[:-1], axis=1)
+    rounded = rounded[np.concatenate(([True], changed))]
+    if len(rounded) < 4:
+        return np.round(ring, precision)
+    return rounded
+
+
+def clip_ring(ring: List[List[float]], bbox: BBox) -> List[List[float]]:
+    """
+    Découpe un anneau sur une emprise (algorithme de Sutherland-Hodgman).
+
+    Returns:
+        Anneau fermé découpé, ou liste vide si l'anneau est hors emprise
+    """
+    minx, miny, maxx, maxy = bbox
+    edges = (
+        (lambda p: p[0] >= minx, lambda p, q: _intersect_x(p, q, minx)),
+        (lambda p: p[0] <= maxx, lambda p, q: _intersect_x(p, q, maxx)),
+        (lambda p: p[1] >= miny, lambda p, q: _intersect_y(p, q, miny)),
+        (lambda p: p[1] <= maxy, lambda p, q: _intersect_y(p, q, maxy)),
+    )
+    points = ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring
+    for inside, intersect in edges:
+        if not points:
+            break
+        output = []
+        prev = points[-1]
+        for cur in points:
+            if inside(cur):
+                if not inside(prev):
+                    output.append(intersect(prev, cur))
+                output.append(cur)
+            elif inside(prev):
+                output.append(intersect(prev, cur))
+            prev = cur
+        points = output
+    if len(points) < 3:
+        return []
+    return points + [points[0]]
+
+
+def _intersect_x(p, q, x):
+    t = (x - p[0]) / (q[0] - p[0])
+    return [x, p[1] + t * (q[1] - p[1])]
+
+
+def _intersect_y(p, q, y):
+    t = (y - p[1]) / (q[1] - p[1])
+    return [p[0] + t * (q[0] - p[0]), y]
+
+
+def _polygons_of(geometry: Dict[str, Any]) -> Optional[List]:
+    gtype = geometry.get('type')
+    if gtype == 'Polygon':
+        return [geometry.get('coordinates') or []]
+    if gtype == 'MultiPolygon':
+        return geometry.get('coordinates') or []
+    return None
+
+
+def _as_geometry(polygons: List) -> Optional[Dict[str, Any]]:
+    if not polygons:
+        return None
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def simplify_geometry(geometry: Optional[Dict[str, Any]], tolerance: float,
+                      precision: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Simplifie chaque anneau d'un Polygon / MultiPolygon (autres types inchangés).
+
+    Args:
+        geometry: Géométrie GeoJSON
+        tolerance: Tolérance Douglas-Peucker (0 pour ne pas simplifier)
+        precision: Nombre de décimales conservées (None pour ne pas arrondir)
+    """
+    if not geometry or (tolerance <= 0 and precision is None):
+        return geometry
+    polygons = _polygons_of(geometry)
+    if polygons is None:
+        return geometry
+    simplified = []
+    for polygon in polygons:
+        rings = []
+        for ring in polygon or []:
+            if not ring:
+                continue
+            try:
+                points = np.asarray(ring, dtype=float)
+            except (TypeError, ValueError):
+                points = None
+            # Anneau dégénéré ou positions hétérogènes : conservé tel quel
+            if points is None or points.ndim != 2 or points.shape[1] < 2 or len(points) < 4:
+                rings.append(ring)
+                continue
+            coords = simplify_ring(points[:, :2], tolerance)
+            if precision is not None:
+                coords = quantize_ring(coords, precision)
+            rings.append(coords.tolist())
+        if rings:
+            simplified.append(rings)
+    return _as_geometry(simplified)
+
+
+def simplify_collection(collection: Dict[str, Any], tolerance: float,
+                        precision: Optional[int] = None) -> Dict[str, Any]:
+    """Applique simplify_geometry à chaque entité d'une FeatureCollection."""
+    features = []
+    for feature in collection.get('features', []):
+        feature = dict(feature)
+        feature['geometry'] = simplify_geometry(feature.get('geometry'), tolerance, precision)
+        features.append(feature)
+    return {"type": "FeatureCollection", "features": features}
+
+
+def clip_geometry(geometry: Optional[Dict[str, Any]], bbox: BBox) -> Optional[Dict[str, Any]]:
+    """
+    Découpe un Polygon / MultiPolygon sur une emprise.
+
+    Returns:
+        Géométrie découpée, ou None si elle est entièrement hors emprise
+    """
+    if not geometry:
+        return None
+    polygons = _polygons_of(geometry)
+    if polygons is None:
+        return geometry
+    clipped = []
+    for polygon in polygons:
+        if not polygon:
+            continue
+        outer = clip_ring(polygon[0], bbox)
+        if not outer:
+            continue
+        holes = [h for h in (clip_ring(ring, bbox) for ring in polygon[1:]) if h]
+        clipped.append([outer] + holes)
+    return _as_geometry(clipped)
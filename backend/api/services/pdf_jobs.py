@@ -0,0 +1,221 @@
+"""
+File d'attente durable de génération des PDF de dossiers.
+
+Les jobs sont des lignes `PdfJob` : la création d'un dossier n'ajoute qu'une
+ligne et rend la main. Un pool de threads par processus web (ou la commande
+`manage.py process_pdf_jobs`) réclame les jobs en attente, assemble le PDF
+(voir dossier_pdf), l'enregistre sur disque, renseigne `Dossier.pdf_url` et
+notifie les administrateurs.
+
+Un job est réclamé par une mise à jour conditionnelle de son statut : un
+seul worker, tous processus confondus, l'obtient. Les jobs en échec sont
+retentés avec un délai croissant ; ceux restés « en cours » après l'arrêt
+d'un processus sont repris après PDF_JOB_STALE_AFTER secondes (vérifié au
+plus une fois par PDF_JOB_HOUSEKEEPING_INTERVAL secondes et par processus).
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from typing import Optional, Dict, Any
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import AdminNotification, Dossier, PdfJob
+from .dossier_pdf import build_dossier_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def dossier_pdf_path(dossier_id: int) -> str:
+    """Chemin du PDF généré d'un dossier."""
+    return os.path.join(settings.DOSSIER_PDF_DIR, f"dossier_{dossier_id}.pdf")
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class PdfJobQueue:
+    """File d'attente des PDF de dossiers et pool de workers du processus."""
+
+    def __init__(self, workers: int, poll_interval: float, max_attempts: int,
+                 retry_delay: float, stale_after: float, housekeeping_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.housekeeping_interval = housekeeping_interval
+        # Dernière reprise des jobs abandonnés (horloge monotone), None avant la première
+        self._housekept_at: Optional[float] = None
+        # Réveil des workers à chaque job ajouté (sinon, interrogation périodique)
+        self._wakeup = threading.Semaphore(0)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {'done': 0, 'failed': 0, 'retried': 0, 'build_seconds': 0.0}
+
+    @classmethod
+    def from_settings(cls) -> "PdfJobQueue":
+        return cls(
+            workers=settings.PDF_JOB_WORKERS,
+            poll_interval=settings.PDF_JOB_POLL_INTERVAL,
+            max_attempts=settings.PDF_JOB_MAX_ATTEMPTS,
+            retry_delay=settings.PDF_JOB_RETRY_DELAY,
+            stale_after=settings.PDF_JOB_STALE_AFTER,
+            housekeeping_interval=settings.PDF_JOB_HOUSEKEEPING_INTERVAL,
+        )
+
+    def _record(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def enqueue(self, dossier: Dossier) -> PdfJob:
+        """
+        Ajoute la génération du PDF d'un dossier à la file.
+
+        Les workers sont réveillés une fois la transaction courante validée.
+        """
+        job = PdfJob.objects.create(dossier=dossier)
+        transaction.on_commit(self.wake)
+        return job
+
+    def wake(self) -> None:
+        """Démarre le pool si besoin et réveille un worker."""
+        self.start()
+        self._wakeup.release()
+
+    def start(self) -> None:
+        """Démarre les workers du processus (sans effet si PDF_JOB_WORKERS vaut 0)."""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"pdf-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.workers} PDF job workers")
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                close_old_connections()
+                if self.run_next():
+                    continue
+            except Exception as e:
+                logger.error(f"PDF job worker error: {e}")
+            finally:
+                close_old_connections()
+            self._wakeup.acquire(timeout=self.poll_interval)
+
+    def _requeue_stale(self) -> None:
+        """
+        Remet en attente (ou en échec) les jobs d'un processus arrêté en cours
+        de génération (au plus une fois par intervalle de nettoyage).
+        """
+        with self._lock:
+            if self._housekept_at is not None and time.monotonic() - self._housekept_at < self.housekeeping_interval:
+                return
+            self._housekept_at = time.monotonic()
+        now = timezone.now()
+        stale = PdfJob.objects.filter(status='running', started_at__lt=now - timedelta(seconds=self.stale_after))
+        stale.filter(attempts__gte=self.max_attempts).update(
+            status='failed', finished_at=now, error="Génération interrompue"
+        )
+        stale.update(status='pending', run_after=now)
+
+    def claim(self) -> Optional[PdfJob]:
+        """Réclame le plus ancien job exécutable, ou None si la file est vide."""
+        self._requeue_stale()
+        now = timezone.now()
+        candidates = PdfJob.objects.filter(status='pending', run_after__lte=now).values_list('pk', flat=True)
+        for pk in candidates[:10]:
+            claimed = PdfJob.objects.filter(pk=pk, status='pending').update(
+                status='running', started_at=now, attempts=F('attempts') + 1
+            )
+            if claimed:
+                return PdfJob.objects.select_related('dossier__user').get(pk=pk)
+        return None
+
+    def run_next(self) -> bool:
+        """Exécute un job en attente ; False si la file est vide."""
+        job = self.claim()
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def drain(self) -> int:
+        """Exécute les jobs en attente jusqu'à vider la file ; retourne leur nombre."""
+        count = 0
+        while self.run_next():
+            count += 1
+        return count
+
+    def process(self, job: PdfJob) -> None:
+        """Génère et enregistre le PDF d'un job réclamé, puis met à jour le job et le dossier."""
+        dossier = job.dossier
+        last_attempt = job.attempts >= self.max_attempts
+        start = time.monotonic()
+        try:
+            # Dernier essai : PDF sans plan de situation plutôt que pas de PDF du tout
+            payload = build_dossier_pdf(dossier.data or {}, include_plan=not last_attempt)
+            _write_atomic(dossier_pdf_path(dossier.pk), payload)
+        except Exception as e:
+            logger.error(f"PDF generation failed for dossier {dossier.pk} (attempt {job.attempts}): {e}")
+            if last_attempt:
+                self._record('failed')
+                PdfJob.objects.filter(pk=job.pk).update(
+                    status='failed', error=str(e), finished_at=timezone.now()
+                )
+            else:
+                self._record('retried')
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                PdfJob.objects.filter(pk=job.pk).update(
+                    status='pending', error=str(e), run_after=timezone.now() + timedelta(seconds=delay)
+                )
+            return
+
+        elapsed = time.monotonic() - start
+        self._record('done')
+        self._record('build_seconds', elapsed)
+        pdf_url = settings.BACKEND_PUBLIC_URL + reverse('dossier_pdf', args=[dossier.pk])
+        with transaction.atomic():
+            Dossier.objects.filter(pk=dossier.pk).update(pdf_url=pdf_url)
+            PdfJob.objects.filter(pk=job.pk).update(status='done', error='', finished_at=timezone.now())
+            AdminNotification.objects.create(
+                title="PDF Généré",
+                message=f"Le PDF du dossier {dossier.pk} de {dossier.user.email or dossier.user.username} est disponible.",
+                notification_type="pdf_generated"
+            )
+        logger.info(f"Generated PDF for dossier {dossier.pk} in {elapsed * 1000:.0f} ms "
+                    f"({len(payload) // 1024} KB)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Jobs par statut (toutes instances) et compteurs du processus courant."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['build_seconds'] = round(stats['build_seconds'], 3)
+        stats['workers'] = len(self._threads)
+        counts = dict(PdfJob.objects.values_list('status').annotate(n=Count('pk')).values_list('status', 'n'))
+        stats['jobs'] = {status: counts.get(status, 0) for status, _ in PdfJob.STATUS_CHOICES}
+        return stats
+
+
+# Instance singleton pour réutilisation
+pdf_job_queue = PdfJobQueue.from_settings()
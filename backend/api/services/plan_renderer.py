@@ -0,0 +1,842 @@
+"""
+Rendu serveur du plan de situation cadastral (DP1), en SVG ou en PNG.
+
+La mise en page reprend celle de cadastralPlanGenerator.js (titre, cadre du
+plan, voies, parcelles, bâtiments, projet, cartouche, flèche nord, échelle),
+mais à partir des géométries réelles du voisinage de la parcelle. Le plan
+est décrit une fois sous forme de primitives (polygones, textes...), puis
+traduit en SVG ou dessiné avec Pillow.
+
+Le fond du plan (géométries et mise en page) est conservé sur disque sous
+une empreinte de ses entrées (parcelle, échelle, format, versions des
+fichiers communaux) ; les textes du projet sont dessinés par-dessus à
+chaque demande, sans nouveau calcul du voisinage.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .cadastre_cache import DerivedFileCache
+from .cadastre_service import cadastre_service
+from .single_flight import SingleFlight
+from .spatial_index import METERS_PER_DEGREE, polygon_parts, parts_contain, parts_bbox
+
+logger = logging.getLogger(__name__)
+
+# Incrémenté à chaque changement de rendu : invalide les plans en cache
+RENDERER_VERSION = 2
+
+# Couleurs officielles du cadastre français (cf. cadastralPlanGenerator.js)
+COLORS = {
+    'parcelFill': '#FFF9C4',
+    'mainParcelFill': '#FFE082',
+    'parcelStroke': '#444444',
+    'streetFill': '#FFFFFF',
+    'streetStroke': '#AAAAAA',
+    'buildingFill': '#FFD700',
+    'buildingStroke': '#8B4513',
+    'projectFill': '#FF7043',
+    'projectStroke': '#D84315',
+    'text': '#000000',
+    'textLight': '#666666',
+    'background': '#FFFFFF',
+    'northArrow': '#003366',
+}
+
+# Feuille (en pixels CSS) et cadre du plan, comme le canvas du client
+SHEET_WIDTH = 600
+SHEET_HEIGHT = 450
+FRAME = (50, 60, 500, 290)
+
+# Taille d'un pixel CSS (96 dpi) en millimètres, pour l'échelle 1:N
+CSS_PIXEL_MM = 25.4 / 96
+
+FORMATS = {
+    'svg': ('.svg', 'image/svg+xml'),
+    'png': ('.png', 'image/png'),
+}
+
+# Champs du projet : nom de l'API, puis clés équivalentes du formulaire CERFA
+PLAN_FIELDS = {
+    'commune': ('commune', 'terrainVille'),
+    'adresse': ('adresse', 'terrainAdresse'),
+    'voie': ('voie', 'terrainVoie'),
+    'surface_plancher': ('surface_plancher', 'surfacePlancher'),
+    'surface_terrain': ('surface_terrain', 'surfaceTerrain'),
+    'echelle': ('echelle', 'echelleDepuis'),
+    'date': ('date',),
+}
+NUMERIC_FIELDS = ('surface_plancher', 'surface_terrain')
+
+FONT_FILES = {
+    ('normal', 'normal'): 'DejaVuSans.ttf',
+    ('bold', 'normal'): 'DejaVuSans-Bold.ttf',
+    ('normal', 'italic'): 'DejaVuSans-Oblique.ttf',
+    ('bold', 'italic'): 'DejaVuSans-BoldOblique.ttf',
+}
+
+# Sur-échantillonnage du rendu PNG (anticrénelage)
+PNG_SUPERSAMPLING = 2
+
+
+def _number(value) -> Optional[float]:
+    if value in (None, ''):
+        return None
+    try:
+        number = float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def plan_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise les données du projet utilisées par le plan.
+
+    Les clés de l'API (`surface_plancher`...) et celles du formulaire CERFA
+    (`surfacePlancher`...) sont acceptées ; les champs absents valent None.
+    La date vaut par défaut la date du jour.
+    """
+    fields = {}
+    for name, keys in PLAN_FIELDS.items():
+        value = next((data[key] for key in keys if data.get(key) not in (None, '')), None)
+        if name in NUMERIC_FIELDS:
+            value = _number(value)
+        elif value is not None:
+            value = str(value).strip()
+        fields[name] = value
+    if not fields['date']:
+        fields['date'] = timezone.localdate().strftime('%d/%m/%Y')
+    return fields
+
+
+def dossier_parcel_reference(data: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """
+    Référence cadastrale (code INSEE, section, numéro) des données d'un dossier.
+
+    Celle du plan cadastral choisi dans l'assistant (`cadastralPlan`) prime
+    sur les champs saisis du terrain ; None si elle est incomplète.
+    """
+    plan = data.get('cadastralPlan') or {}
+    code_insee = plan.get('codeInsee') or data.get('terrainCodeInsee')
+    section = plan.get('section') or data.get('section')
+    numero = plan.get('numero') or data.get('numeroParcelle')
+    if not (code_insee and section and numero):
+        return None
+    return str(code_insee), str(section), str(numero)
+
+
+def parse_scale(value: Optional[str]) -> Optional[int]:
+    """Dénominateur d'une échelle '1:500' / '1/500' / '500', ou None."""
+    if not value:
+        return None
+    match = re.fullmatch(r'\s*(?:1\s*[:/]\s*)?(\d+)\s*', value)
+    if not match or int(match.group(1)) <= 0:
+        return None
+    return int(match.group(1))
+
+
+def _nice_length(maximum: float) -> float:
+    """Plus grande longueur 1, 2 ou 5 x 10^k ne dépassant pas `maximum`."""
+    exponent = math.floor(math.log10(maximum))
+    for factor in (5, 2, 1):
+        length = factor * 10 ** exponent
+        if length <= maximum:
+            return length
+    return 10 ** exponent
+
+
+def _format_length(meters: float) -> str:
+    if meters >= 1000:
+        return f"{meters / 1000:g} km"
+    return f"{meters:g} m"
+
+
+class PlanDrawing:
+    """
+    Liste de primitives de dessin, traduite en SVG ou en PNG.
+
+    Les coordonnées sont en pixels CSS de la feuille. Les primitives
+    `clipped` sont limitées au cadre du plan.
+    """
+
+    def __init__(self, width: int, height: int, frame: Tuple[float, float, float, float]):
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.items: List[Dict[str, Any]] = []
+
+    def polygon(self, rings: List[np.ndarray], fill: Optional[str], stroke: Optional[str],
+                width: float = 1, clipped: bool = True):
+        """Polygone (anneau extérieur et trous, règle pair-impair)."""
+        self.items.append({'kind': 'polygon', 'rings': rings, 'fill': fill, 'stroke': stroke,
+                           'width': width, 'clipped': clipped})
+
+    def rect(self, x: float, y: float, w: float, h: float, fill: Optional[str] = None,
+             stroke: Optional[str] = None, width: float = 1, clipped: bool = False):
+        ring = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h], [x, y]], dtype=float)
+        self.polygon([ring], fill, stroke, width, clipped)
+
+    def line(self, points: List[Tuple[float, float]], stroke: str, width: float = 1, clipped: bool = False):
+        self.items.append({'kind': 'line', 'points': points, 'stroke': stroke, 'width': width,
+                           'clipped': clipped})
+
+    def circle(self, cx: float, cy: float, r: float, fill: Optional[str], stroke: Optional[str],
+               width: float = 1, clipped: bool = False):
+        self.items.append({'kind': 'circle', 'center': (cx, cy), 'r': r, 'fill': fill, 'stroke': stroke,
+                           'width': width, 'clipped': clipped})
+
+    def text(self, x: float, y: float, text: str, size: float, fill: str = COLORS['text'],
+             weight: str = 'normal', style: str = 'normal', anchor: str = 'start',
+             rotate: float = 0, opacity: float = 1, clipped: bool = False):
+        """Texte centré verticalement sur `y` ; `anchor` vaut 'start', 'middle' ou 'end'."""
+        self.items.append({'kind': 'text', 'position': (x, y), 'text': text, 'size': size, 'fill': fill,
+                           'weight': weight, 'style': style, 'anchor': anchor, 'rotate': rotate,
+                           'opacity': opacity, 'clipped': clipped})
+
+    # ------------------------------------------------------------------
+    # SVG
+    # ------------------------------------------------------------------
+
+    def to_svg(self, base: Optional[bytes] = None) -> bytes:
+        """
+        Document SVG de la feuille.
+
+        Avec `base` (SVG d'une feuille déjà rendue), les primitives sont
+        ajoutées par-dessus son contenu.
+        """
+        x, y, w, h = self.frame
+        if base is not None:
+            out = [base[:base.rindex(b'</svg>')].decode().rstrip('\n')]
+        else:
+            out = [
+                f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+                f'viewBox="0 0 {self.width} {self.height}" font-family="Arial, Helvetica, sans-serif">',
+                f'<defs><clipPath id="plan-frame"><rect x="{x}" y="{y}" width="{w}" height="{h}"/></clipPath></defs>',
+            ]
+        in_clip = False
+        for item in self.items:
+            if item['clipped'] != in_clip:
+                out.append('<g clip-path="url(#plan-frame)">' if item['clipped'] else '</g>')
+                in_clip = item['clipped']
+            out.append(self._svg_item(item))
+        if in_clip:
+            out.append('</g>')
+        out.append('</svg>')
+        return '\n'.join(out).encode()
+
+    @staticmethod
+    def _svg_paint(item) -> str:
+        fill = item.get('fill') or 'none'
+        attrs = f'fill="{fill}"'
+        if item.get('stroke'):
+            attrs += f' stroke="{item["stroke"]}" stroke-width="{item["width"]:g}" stroke-linejoin="round"'
+        return attrs
+
+    def _svg_item(self, item) -> str:
+        kind = item['kind']
+        if kind == 'polygon':
+            d = ' '.join(
+                'M' + ' L'.join(f"{px:.1f} {py:.1f}" for px, py in ring.tolist()) + ' Z'
+                for ring in item['rings'] if len(ring)
+            )
+            return f'<path d="{d}" fill-rule="evenodd" {self._svg_paint(item)}/>'
+        if kind == 'line':
+            points = ' '.join(f"{px:.1f},{py:.1f}" for px, py in item['points'])
+            return (f'<polyline points="{points}" fill="none" stroke="{item["stroke"]}" '
+                    f'stroke-width="{item["width"]:g}"/>')
+        if kind == 'circle':
+            cx, cy = item['center']
+            return f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{item["r"]:g}" {self._svg_paint(item)}/>'
+
+        tx, ty = item['position']
+        attrs = (f'x="{tx:.1f}" y="{ty:.1f}" font-size="{item["size"]:g}" fill="{item["fill"]}" '
+                 f'text-anchor="{item["anchor"]}" dominant-baseline="central"')
+        if item['weight'] != 'normal':
+            attrs += f' font-weight="{item["weight"]}"'
+        if item['style'] != 'normal':
+            attrs += f' font-style="{item["style"]}"'
+        if item['rotate']:
+            attrs += f' transform="rotate({item["rotate"]:g} {tx:.1f} {ty:.1f})"'
+        if item['opacity'] != 1:
+            attrs += f' opacity="{item["opacity"]:g}"'
+        return f'<text {attrs}>{escape(item["text"])}</text>'
+
+    # ------------------------------------------------------------------
+    # PNG (Pillow)
+    # ------------------------------------------------------------------
+
+    def to_png(self, scale: float = 1, base: Optional[bytes] = None) -> bytes:
+        """
+        Image PNG de la feuille (`scale` = 1 : 600 x 450 px).
+
+        Avec `base` (image sur-échantillonnée produite par supersampled_png),
+        les primitives sont dessinées par-dessus.
+        """
+        from PIL import Image
+
+        image = self._draw_png(scale, base)
+        image = image.resize((round(self.width * scale), round(self.height * scale)), Image.LANCZOS)
+        out = io.BytesIO()
+        # Encodé à chaque demande : `optimize` coûterait ~40 ms pour ~2 % de gain
+        image.save(out, format='PNG')
+        return out.getvalue()
+
+    def supersampled_png(self, scale: float = 1) -> bytes:
+        """Image sur-échantillonnée, non réduite : fond réutilisable par to_png."""
+        out = io.BytesIO()
+        self._draw_png(scale).save(out, format='PNG')
+        return out.getvalue()
+
+    def _draw_png(self, scale: float, base: Optional[bytes] = None):
+        from PIL import Image, ImageDraw
+
+        k = scale * PNG_SUPERSAMPLING
+        size = (round(self.width * k), round(self.height * k))
+        if base is not None:
+            with Image.open(io.BytesIO(base)) as background:
+                image = background.convert('RGB')
+        else:
+            image = Image.new('RGB', size, COLORS['background'])
+        x, y, w, h = self.frame
+        frame_box = (round(x * k), round(y * k), round((x + w) * k), round((y + h) * k))
+
+        layer = None
+        for item in self.items:
+            if item['clipped'] and layer is None:
+                layer = Image.new('RGBA', size, (0, 0, 0, 0))
+            elif not item['clipped'] and layer is not None:
+                self._paste_clipped(image, layer, frame_box)
+                layer = None
+            target = layer if layer is not None else image
+            self._png_item(target, ImageDraw.Draw(target), item, k)
+        if layer is not None:
+            self._paste_clipped(image, layer, frame_box)
+        return image
+
+    @staticmethod
+    def _paste_clipped(image, layer, box):
+        region = layer.crop(box)
+        image.paste(region, box[:2], region)
+
+    def _png_item(self, image, draw, item, k):
+        from PIL import Image, ImageDraw
+
+        kind = item['kind']
+        width = max(1, round(item.get('width', 1) * k))
+        if kind == 'polygon':
+            rings = [[(px * k, py * k) for px, py in ring.tolist()] for ring in item['rings'] if len(ring) >= 3]
+            if not rings:
+                return
+            if item['fill'] and len(rings) == 1:
+                draw.polygon(rings[0], fill=item['fill'])
+            elif item['fill']:
+                # Trous : masque pair-impair limité à l'emprise du polygone
+                xs = [px for ring in rings for px, _ in ring]
+                ys = [py for ring in rings for _, py in ring]
+                x0, y0 = int(min(xs)), int(min(ys))
+                mask = self._even_odd_mask(rings, x0, y0, (int(max(xs)) - x0 + 2, int(max(ys)) - y0 + 2))
+                image.paste(item['fill'], (x0, y0, x0 + mask.size[0], y0 + mask.size[1]), mask)
+            if item['stroke']:
+                for ring in rings:
+                    draw.line(ring + [ring[0]], fill=item['stroke'], width=width, joint='curve')
+        elif kind == 'line':
+            draw.line([(px * k, py * k) for px, py in item['points']], fill=item['stroke'], width=width)
+        elif kind == 'circle':
+            cx, cy = item['center']
+            r = item['r'] * k
+            draw.ellipse((cx * k - r, cy * k - r, cx * k + r, cy * k + r), fill=item['fill'],
+                         outline=item['stroke'], width=width)
+        else:
+            self._png_text(image, draw, item, k)
+
+    @staticmethod
+    def _even_odd_mask(rings, x0, y0, size):
+        from PIL import Image, ImageChops, ImageDraw
+
+        mask = Image.new('L', size, 0)
+        for ring in rings:
+            ring_mask = Image.new('L', size, 0)
+            ImageDraw.Draw(ring_mask).polygon([(px - x0, py - y0) for px, py in ring], fill=255)
+            mask = ImageChops.logical_xor(mask.convert('1'), ring_mask.convert('1')).convert('L')
+        return mask
+
+    def _png_text(self, image, draw, item, k):
+        from PIL import Image, ImageDraw
+
+        font = _font(round(item['size'] * k), item['weight'], item['style'])
+        tx, ty = item['position']
+        anchor = {'start': 'lm', 'middle': 'mm', 'end': 'rm'}[item['anchor']]
+        if not item['rotate'] and item['opacity'] == 1:
+            draw.text((tx * k, ty * k), item['text'], fill=item['fill'], font=font, anchor=anchor)
+            return
+
+        # Texte pivoté ou translucide : dessiné à part puis composé
+        left, top, right, bottom = draw.textbbox((0, 0), item['text'], font=font, anchor='mm')
+        pad = 2
+        sprite = Image.new('RGBA', (right - left + 2 * pad, bottom - top + 2 * pad), (0, 0, 0, 0))
+        ImageDraw.Draw(sprite).text((-left + pad, -top + pad), item['text'], fill=item['fill'],
+                                    font=font, anchor='mm')
+        if item['opacity'] != 1:
+            alpha = sprite.getchannel('A').point(lambda a: round(a * item['opacity']))
+            sprite.putalpha(alpha)
+        if item['rotate']:
+            # Sens horaire en SVG (axe y vers le bas), anti-horaire pour Pillow
+            sprite = sprite.rotate(-item['rotate'], expand=True, resample=Image.BICUBIC)
+        cx, cy = tx * k, ty * k
+        if anchor == 'lm':
+            cx += sprite.size[0] / 2
+        elif anchor == 'rm':
+            cx -= sprite.size[0] / 2
+        image.paste(sprite, (round(cx - sprite.size[0] / 2), round(cy - sprite.size[1] / 2)), sprite)
+
+
+_fonts: Dict[Tuple[int, str, str], Any] = {}
+
+
+def _font(size: int, weight: str, style: str):
+    """
+    Police DejaVu mise en cache par taille et style ; à défaut la graisse
+    sans l'italique, puis la police par défaut de Pillow.
+    """
+    from PIL import ImageFont
+
+    key = (size, weight, style)
+    if key not in _fonts:
+        for name in (FONT_FILES[(weight, style)], FONT_FILES[(weight, 'normal')], FONT_FILES[('normal', 'normal')]):
+            try:
+                _fonts[key] = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            _fonts[key] = ImageFont.load_default(size)
+    return _fonts[key]
+
+
+class PlanLayout:
+    """Projection des coordonnées WGS84 dans le cadre du plan."""
+
+    def __init__(self, center: Tuple[float, float], meters_per_pixel: float):
+        self.center = center
+        self.meters_per_pixel = meters_per_pixel
+        self.kx = METERS_PER_DEGREE * math.cos(math.radians(center[1]))
+        self.ky = METERS_PER_DEGREE
+        x, y, w, h = FRAME
+        self.origin = (x + w / 2, y + h / 2)
+
+    @classmethod
+    def fit(cls, bbox: Tuple[float, float, float, float], scale: Optional[int]) -> "PlanLayout":
+        """
+        Centre le plan sur l'emprise de la parcelle.
+
+        À l'échelle 1:`scale` si elle est fournie ; sinon la parcelle occupe
+        environ les deux tiers du cadre.
+        """
+        center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        if scale:
+            return cls(center, scale * CSS_PIXEL_MM / 1000)
+        layout = cls(center, 1.0)
+        width_m = (bbox[2] - bbox[0]) * layout.kx
+        height_m = (bbox[3] - bbox[1]) * layout.ky
+        layout.meters_per_pixel = max(width_m * 1.5 / FRAME[2], height_m * 1.5 / FRAME[3], 0.05)
+        return layout
+
+    @property
+    def radius(self) -> float:
+        """Distance (m) couvrant tout le cadre depuis la parcelle."""
+        return math.hypot(FRAME[2], FRAME[3]) / 2 * self.meters_per_pixel
+
+    @property
+    def scale(self) -> int:
+        return round(self.meters_per_pixel * 1000 / CSS_PIXEL_MM)
+
+    def project(self, ring: np.ndarray) -> np.ndarray:
+        """Anneau (N, 2) en degrés -> pixels de la feuille (nord en haut)."""
+        out = np.empty_like(ring)
+        out[:, 0] = self.origin[0] + (ring[:, 0] - self.center[0]) * self.kx / self.meters_per_pixel
+        out[:, 1] = self.origin[1] - (ring[:, 1] - self.center[1]) * self.ky / self.meters_per_pixel
+        return out
+
+    def point(self, lon: float, lat: float) -> Tuple[float, float]:
+        return tuple(self.project(np.array([[lon, lat]], dtype=float))[0])
+
+    def offset(self, lon: float, lat: float, dx: float, dy: float) -> Tuple[float, float]:
+        """Point décalé de (dx, dy) mètres vers l'est et le nord."""
+        return lon + dx / self.kx, lat + dy / self.ky
+
+
+def _feature_rings(parts) -> List[np.ndarray]:
+    return [ring for rings in parts for ring in rings]
+
+
+def _display_numero(numero: Optional[str]) -> str:
+    return str(numero or '').lstrip('0') or str(numero or '')
+
+
+def _street_label_point(layout: PlanLayout, target_parts,
+                        parcels_parts) -> Optional[Tuple[float, float, bool]]:
+    """
+    Point du domaine public (hors parcelles) le plus proche de la parcelle,
+    pour y écrire le nom de la voie.
+
+    Les parcelles couvrent tout sauf la voirie : on cherche, en s'éloignant
+    du centre de la parcelle, un point dont les abords (± 2 m) ne tombent
+    dans aucune parcelle.
+
+    Returns:
+        (lon, lat, vertical) où `vertical` indique une voie orientée
+        nord-sud, ou None si aucune voie n'est visible
+    """
+    all_parts = [target_parts] + parcels_parts
+    boxes = np.array([parts_bbox(parts) or (np.nan,) * 4 for parts in all_parts], dtype=float)
+    lon0, lat0 = layout.center
+
+    def free(lon, lat):
+        hits = np.flatnonzero((boxes[:, 0] <= lon) & (boxes[:, 2] >= lon) &
+                              (boxes[:, 1] <= lat) & (boxes[:, 3] >= lat))
+        return not any(parts_contain(all_parts[i], lon, lat) for i in hits.tolist())
+
+    def free_run(lon, lat, ux, uy, limit=30):
+        """Longueur (m) de voirie libre de part et d'autre du point, selon (ux, uy)."""
+        run = 0
+        for sign in (1, -1):
+            d = 1
+            while d <= limit and free(*layout.offset(lon, lat, sign * ux * d, sign * uy * d)):
+                d += 1
+            run += d - 1
+        return run
+
+    max_distance = min(FRAME[2], FRAME[3]) / 2 * layout.meters_per_pixel
+    step = max(1.0, 4 * layout.meters_per_pixel)
+    distance = step
+    while distance < max_distance:
+        for angle in range(0, 360, 30):
+            dx = distance * math.cos(math.radians(angle))
+            dy = distance * math.sin(math.radians(angle))
+            lon, lat = layout.offset(lon0, lat0, dx, dy)
+            if all(free(*layout.offset(lon, lat, ox, oy)) for ox, oy in
+                   ((0, 0), (2, 0), (-2, 0), (0, 2), (0, -2))):
+                return lon, lat, free_run(lon, lat, 0, 1) > free_run(lon, lat, 1, 0)
+        distance += step
+    return None
+
+
+def build_plan_base(neighbourhood: Dict[str, Any], layout: PlanLayout) -> Tuple[PlanDrawing, Dict[str, Any]]:
+    """
+    Décrit le fond du plan de situation d'une parcelle : tout ce qui ne
+    dépend que des géométries et de la mise en page (parcelles, bâtiments,
+    numéros des parcelles voisines, cadre, flèche nord).
+
+    Args:
+        neighbourhood: Résultat de CadastreService.get_parcelle_neighbourhood
+        layout: Projection dans le cadre du plan
+
+    Returns:
+        Tuple (PlanDrawing du fond, ancres sérialisables en JSON pour
+        build_plan_overlay : mise en page, position de l'étiquette de la
+        parcelle, point de la voie, propriétés de la parcelle)
+    """
+    drawing = PlanDrawing(SHEET_WIDTH, SHEET_HEIGHT, FRAME)
+    width, height = SHEET_WIDTH, SHEET_HEIGHT
+    fx, fy, fw, fh = FRAME
+    target = neighbourhood['parcelle']
+    target_props = target.get('properties') or {}
+    target_parts = polygon_parts(target.get('geometry'))
+    parcels = neighbourhood['adjacentes']['features'] + neighbourhood['voisines']['features']
+    parcels_parts = [polygon_parts(f.get('geometry')) for f in parcels]
+
+    # Filigrane
+    drawing.text(width / 2, height / 2, 'URBANIA', 60, fill=COLORS['northArrow'], weight='bold',
+                 anchor='middle', rotate=-30, opacity=0.03)
+
+    # Voirie (fond du cadre) puis parcelles et bâtiments
+    drawing.rect(fx, fy, fw, fh, fill=COLORS['streetFill'], clipped=True)
+    for parts in parcels_parts:
+        drawing.polygon([layout.project(r) for r in _feature_rings(parts)],
+                        COLORS['parcelFill'], COLORS['parcelStroke'], 1)
+    target_rings = [layout.project(r) for r in _feature_rings(target_parts)]
+    drawing.polygon(target_rings, COLORS['mainParcelFill'], COLORS['parcelStroke'], 2.5)
+    for building in neighbourhood['batiments']['features']:
+        rings = _feature_rings(polygon_parts(building.get('geometry')))
+        drawing.polygon([layout.project(r) for r in rings], COLORS['buildingFill'], COLORS['buildingStroke'], 1)
+
+    # Numéros des parcelles voisines
+    for feature, parts in zip(parcels, parcels_parts):
+        bbox = parts_bbox(parts)
+        if bbox is None:
+            continue
+        (x0, y1), (x1, y0) = layout.point(bbox[0], bbox[1]), layout.point(bbox[2], bbox[3])
+        if x1 - x0 >= 18 and y1 - y0 >= 12:
+            numero = _display_numero((feature.get('properties') or {}).get('numero'))
+            drawing.text((x0 + x1) / 2, (y0 + y1) / 2, numero, 11, anchor='middle', clipped=True)
+
+    # Cadre et flèche nord
+    drawing.rect(fx, fy, fw, fh, stroke='#333333', width=2)
+    _draw_north_arrow(drawing, width - 45, 90)
+
+    label_lon, label_lat = layout.center
+    if target_parts and not parts_contain(target_parts, label_lon, label_lat):
+        # Parcelle concave : étiquette au barycentre des sommets de l'anneau extérieur
+        ring = target_parts[0][0]
+        label_lon, label_lat = float(ring[:, 0].mean()), float(ring[:, 1].mean())
+    point = _street_label_point(layout, target_parts, parcels_parts)
+    anchors = {
+        'center': list(layout.center),
+        'meters_per_pixel': layout.meters_per_pixel,
+        'label': [float(v) for v in layout.point(label_lon, label_lat)],
+        'street': [float(v) for v in layout.point(point[0], point[1])] + [bool(point[2])] if point else None,
+        'parcelle': {key: target_props.get(key) for key in ('commune', 'section', 'numero', 'contenance')},
+    }
+    return drawing, anchors
+
+
+def build_plan_overlay(anchors: Dict[str, Any], fields: Dict[str, Any]) -> PlanDrawing:
+    """
+    Décrit ce qui dépend des données du projet, dessiné par-dessus le fond
+    (build_plan_base) : emprise du projet, étiquette de la parcelle, nom de
+    la voie, cartouche, échelle et titre.
+
+    Args:
+        anchors: Ancres retournées par build_plan_base
+        fields: Données du projet normalisées (plan_fields)
+    """
+    drawing = PlanDrawing(SHEET_WIDTH, SHEET_HEIGHT, FRAME)
+    height = SHEET_HEIGHT
+    layout = PlanLayout(tuple(anchors['center']), anchors['meters_per_pixel'])
+    target_props = anchors['parcelle']
+
+    tx, ty = anchors['label']
+    surface_plancher = fields['surface_plancher'] or 0
+    if surface_plancher > 0:
+        side = _draw_project(drawing, layout, tx, ty, surface_plancher)
+        # Numéro de la parcelle au-dessus du projet
+        ty -= side / 2 + 22
+    drawing.text(tx, ty, _display_numero(target_props.get('numero')), 14, weight='bold',
+                 anchor='middle', clipped=True)
+    surface = fields['surface_terrain'] or _number(target_props.get('contenance'))
+    if surface:
+        drawing.text(tx, ty + 14, f"{surface:g} m²", 9, fill=COLORS['textLight'], anchor='middle', clipped=True)
+
+    # Nom de la voie, sur le domaine public le plus proche
+    voie = fields['voie'] or re.sub(r'^\s*\d+\s*(bis|ter|quater)?\s*,?\s*', '', fields['adresse'] or '', flags=re.I)
+    if voie and anchors['street']:
+        sx, sy, vertical = anchors['street']
+        drawing.text(sx, sy, voie[:40], 10, fill='#333333', style='italic', anchor='middle',
+                     rotate=-90 if vertical else 0, clipped=True)
+
+    # Cartouche, échelle, titre
+    _draw_cartouche(drawing, fields, target_props, 50, height - 50)
+    _draw_scale_bar(drawing, layout, 370, height - 32, fields['echelle'])
+    _draw_title(drawing, fields, 50, 15)
+    return drawing
+
+
+def _draw_project(drawing: PlanDrawing, layout: PlanLayout, cx: float, cy: float, surface: float) -> float:
+    """
+    Emprise indicative du projet (carré de `surface` m²) hachurée, centrée
+    sur (cx, cy).
+
+    Returns:
+        Côté du carré en pixels
+    """
+    # Au-delà de la diagonale du cadre, le carré le recouvre entièrement
+    side = min(math.sqrt(surface) / layout.meters_per_pixel, 2 * math.hypot(FRAME[2], FRAME[3]))
+    x, y = cx - side / 2, cy - side / 2
+    drawing.rect(x, y, side, side, fill=COLORS['projectFill'], stroke=COLORS['projectStroke'], width=2, clipped=True)
+    i = 8
+    while i < 2 * side:
+        drawing.line([(x + min(i, side), y + max(0, i - side)), (x + max(0, i - side), y + min(i, side))],
+                     '#FFFFFF', 1, clipped=True)
+        i += 8
+    if side >= 44:
+        drawing.text(cx, cy, 'PROJET', 10, fill='#FFFFFF', weight='bold', anchor='middle', clipped=True)
+    drawing.text(cx, y + side + 10, f"{surface:g} m²", 8, anchor='middle', clipped=True)
+    return side
+
+
+def _draw_cartouche(drawing: PlanDrawing, fields, props, x: float, y: float):
+    commune = fields['commune'] or f"Commune {props.get('commune', '')}".strip()
+    drawing.rect(x, y, 300, 40, fill='#F9F9F9', stroke='#333333', width=1)
+    drawing.text(x + 8, y + 12, f"Commune: {commune}"[:32], 11, weight='bold')
+    drawing.text(x + 8, y + 27, f"Réf: Section {props.get('section', '')} - "
+                                f"Parcelle n° {_display_numero(props.get('numero'))}", 10)
+    if fields['adresse']:
+        drawing.text(x + 292, y + 12, fields['adresse'][:40], 9, fill=COLORS['textLight'], anchor='end')
+
+
+def _draw_north_arrow(drawing: PlanDrawing, x: float, y: float):
+    drawing.circle(x, y, 20, '#FFFFFF', COLORS['northArrow'], 2)
+    arrow = np.array([[x, y - 15], [x - 6, y + 8], [x, y + 3], [x + 6, y + 8], [x, y - 15]], dtype=float)
+    drawing.polygon([arrow], COLORS['northArrow'], None, clipped=False)
+    drawing.text(x, y - 28, 'N', 10, fill=COLORS['northArrow'], weight='bold', anchor='middle')
+
+
+def _draw_scale_bar(drawing: PlanDrawing, layout: PlanLayout, x: float, y: float, echelle: Optional[str]):
+    """Barre d'échelle graduée (longueur ronde d'au plus 80 px) et échelle 1:N."""
+    length = _nice_length(80 * layout.meters_per_pixel)
+    bar = length / layout.meters_per_pixel
+    for i in range(4):
+        drawing.rect(x + i * bar / 4, y, bar / 4, 6, fill='#000000' if i % 2 == 0 else '#FFFFFF')
+    drawing.rect(x, y, bar, 6, stroke='#000000', width=1)
+    drawing.text(x, y - 7, '0', 8, anchor='middle')
+    drawing.text(x + bar, y - 7, _format_length(length), 8, anchor='middle')
+    drawing.text(x + bar + 10, y + 3, f"Échelle: {echelle or f'1:{layout.scale}'}", 8)
+
+
+def _draw_title(drawing: PlanDrawing, fields, x: float, y: float):
+    drawing.text(x, y + 7, 'PLAN DE SITUATION - Déclaration Préalable', 13, weight='bold')
+    if fields['commune']:
+        drawing.text(x, y + 23, fields['commune'], 11)
+    drawing.text(x + 450, y + 12, f"Généré le {fields['date']}", 9, fill=COLORS['textLight'], anchor='end')
+
+
+class PlanRenderer:
+    """
+    Rendu des plans de situation.
+
+    Le fond du plan (géométries, mise en page) est mis en cache disque, avec
+    ses ancres, sous une empreinte de la parcelle, des versions des couches
+    communales et des options de rendu ; les textes du projet (adresse,
+    commune, date...) sont dessinés par-dessus à chaque demande.
+    """
+
+    # Pas de la résolution des PNG : borne le nombre de fonds en cache
+    SCALE_STEP = 0.25
+
+    def __init__(self, service, cache: DerivedFileCache):
+        self.service = service
+        self.cache = cache
+        # Un seul rendu de fond en vol par empreinte
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'renders': 0, 'render_seconds': 0.0}
+
+    @classmethod
+    def from_settings(cls, service) -> "PlanRenderer":
+        return cls(service, DerivedFileCache(settings.CADASTRE_PLAN_DIR, settings.CADASTRE_PLAN_MAX_BYTES))
+
+    def _record(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['render_seconds'] = round(stats['render_seconds'], 3)
+        stats['cache'] = self.cache.stats()
+        return stats
+
+    def render(self, code_insee: str, section: str, numero: str, data: Dict[str, Any],
+               fmt: str = 'svg', scale: float = 1) -> Optional[bytes]:
+        """
+        Rend le plan de situation d'une parcelle.
+
+        Args:
+            code_insee: Code INSEE de la commune
+            section: Section cadastrale (ex: 'AB')
+            numero: Numéro de parcelle (ex: '0123')
+            data: Données du projet (voir plan_fields)
+            fmt: 'svg' ou 'png'
+            scale: Facteur de résolution du PNG (1 = 600 x 450 px), arrondi
+                au pas SCALE_STEP
+
+        Returns:
+            Contenu du fichier rendu, ou None si la parcelle n'existe pas
+        """
+        code_insee = code_insee.zfill(5)
+        section = section.upper().strip()
+        numero = numero.zfill(4)
+        fields = plan_fields(data)
+        suffix = FORMATS[fmt][0]
+        scale = max(self.SCALE_STEP, round(scale / self.SCALE_STEP) * self.SCALE_STEP) if fmt == 'png' else None
+
+        parcelles = self.service.fetch_commune_layer('parcelles', code_insee)
+        if parcelles is None:
+            return None
+        batiments = self.service.fetch_commune_layer('batiments', code_insee)
+        version = int(parcelles['stored_at'])
+        echelle = parse_scale(fields['echelle'])
+        key = hashlib.sha256(json.dumps({
+            'renderer': RENDERER_VERSION,
+            'parcelle': [section, numero],
+            'echelle': echelle,
+            'format': fmt,
+            'scale': scale,
+            'batiments': batiments.get('stored_at') if batiments else None,
+        }, sort_keys=True).encode()).hexdigest()[:32]
+
+        def cached():
+            base_path = self.cache.get('plans', code_insee, version, key, suffix)
+            anchors_path = self.cache.get('plans', code_insee, version, key)
+            if not (base_path and anchors_path):
+                return None
+            try:
+                with open(base_path, 'rb') as f, gzip.open(anchors_path, 'rb') as a:
+                    return f.read(), json.load(a)
+            except (OSError, ValueError):
+                # Fichier évincé entre-temps : nouveau rendu
+                return None
+
+        def render_base():
+            existing = cached()
+            if existing:
+                return existing
+            start = time.monotonic()
+            built = self._build(code_insee, section, numero, echelle)
+            if built is None:
+                return None
+            drawing, anchors = built
+            payload = drawing.to_svg() if fmt == 'svg' else drawing.supersampled_png(scale)
+            self.cache.store('plans', code_insee, version, key, anchors)
+            self.cache.store_bytes('plans', code_insee, version, key, payload, suffix)
+            elapsed = time.monotonic() - start
+            self._record('renders')
+            self._record('render_seconds', elapsed)
+            logger.info(f"Rendered plan base {code_insee} {section} {numero} ({fmt}) in {elapsed * 1000:.0f} ms")
+            return payload, anchors
+
+        base = cached()
+        if base:
+            self._record('hits')
+        else:
+            base, shared = self._flights.do(key, render_base)
+            if shared:
+                self._record('hits')
+        if base is None:
+            return None
+
+        payload, anchors = base
+        overlay = build_plan_overlay(anchors, fields)
+        return overlay.to_svg(payload) if fmt == 'svg' else overlay.to_png(scale, payload)
+
+    def _build(self, code_insee: str, section: str, numero: str,
+               echelle: Optional[int]) -> Optional[Tuple[PlanDrawing, Dict[str, Any]]]:
+        index = self.service.get_commune_index('parcelles', code_insee)
+        position = index.position(section, numero)
+        bbox = index.features.bbox(position) if position is not None else None
+        if bbox is None:
+            return None
+        layout = PlanLayout.fit(bbox, echelle)
+        radius = min(layout.radius, settings.CADASTRE_NEIGHBOURHOOD_MAX_RADIUS)
+        neighbourhood = self.service.get_parcelle_neighbourhood(code_insee, section, numero, radius)
+        if neighbourhood is None:
+            return None
+        return build_plan_base(neighbourhood, layout)
+
+
+# Instance singleton pour réutilisation
+plan_renderer = PlanRenderer.from_settings(cadastre_service)
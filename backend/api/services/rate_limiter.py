@@ -0,0 +1,49 @@
+"""
+Limiteur de débit (seau à jetons) partagé entre threads.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """Autorise au plus `rate` opérations par seconde (rafales jusqu'à `burst`)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Consomme un jeton si possible ; sinon retourne l'attente nécessaire."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Bloque jusqu'à ce qu'un jeton soit disponible, puis le consomme."""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Variante asynchrone de acquire (n'occupe pas la boucle d'événements)."""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,210 @@
+"""
+Index de similarité des descriptions de projets (MinHash / LSH), sans réseau.
+
+Une description est réduite à ses mots significatifs (minuscules, sans
+accents ni mots vides, pluriels ramenés au singulier, nombres séparés des
+unités : « Pose véranda 15 m² » et « pose d'une véranda de 15m2 » donnent
+les mêmes mots), puis à l'ensemble de ses trigrammes de caractères.
+
+La similarité est l'indice de Jaccard de ces ensembles. Les signatures
+MinHash, découpées en bandes (LSH), ne servent qu'à trouver les candidats
+sans parcourir tout l'index ; la similarité retenue est calculée exactement.
+Deux descriptions dont les nombres (surface, hauteur...), les couleurs ou
+les matériaux diffèrent ne sont jamais considérées comme similaires : les
+réponses de l'IA en dépendent (« façade blanche, toiture ardoise » et
+« façade grise, toiture tuile » ne diffèrent que de quelques trigrammes).
+
+L'index est incrémental : les descriptions s'ajoutent ou se retirent une à
+une, sans reconstruction.
+"""
+
+import re
+import threading
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple, Hashable
+
+import numpy as np
+
+# Mots vides retirés (articles, prépositions) ; « avec », « sans », « sur »... sont conservés
+STOPWORDS = frozenset('a au aux d de des du en et l la le les un une'.split())
+
+# Couleurs et matériaux (mots réduits comme par description_tokens : « gris » devient
+# « gri », « bois » « boi »), ramenés à une valeur canonique
+ATTRIBUTES = {
+    **{word: 'blanc' for word in ('blanc', 'blanche')},
+    **{word: 'gris' for word in ('gri', 'grise')},
+    **{word: 'noir' for word in ('noir', 'noire')},
+    **{word: 'bleu' for word in ('bleu', 'bleue')},
+    **{word: 'vert' for word in ('vert', 'verte')},
+    **{word: 'brun' for word in ('brun', 'brune', 'marron')},
+    **{word: 'metal' for word in ('metal', 'metallique', 'acier', 'alu', 'aluminium')},
+    **{word: word for word in (
+        'beige', 'rouge', 'jaune', 'rose', 'ocre', 'creme', 'sable', 'taupe', 'anthracite', 'terracotta',
+        'tuile', 'ardoise', 'zinc', 'cuivre', 'chaume', 'boi', 'pierre', 'brique', 'beton', 'parpaing',
+        'enduit', 'crepi', 'pvc', 'verre', 'composite',
+    )},
+}
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Hachage universel a * h + b mod p (p premier de Mersenne, sans débordement en uint64)
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20260202)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+\d*")
+# Dimensions '8x4', '8 x 4', '8×4' : le 'x' est séparé des nombres
+DIMENSION_RE = re.compile(r"(\d)\s*[x×*]\s*(?=\d)")
+
+
+def _number(token: str) -> str:
+    """Nombre canonique : '15,0' -> '15', '2,50' -> '2.5'."""
+    value = token.replace(',', '.')
+    if '.' in value:
+        value = value.rstrip('0').rstrip('.')
+    return value.lstrip('0') or '0'
+
+
+def description_tokens(text: str) -> Tuple[List[str], Tuple[str, ...]]:
+    """Mots significatifs (dans l'ordre) et nombres (triés) d'une description."""
+    text = unicodedata.normalize('NFKD', text or '').lower()
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = DIMENSION_RE.sub(r'\1 x ', text)
+    words, numbers = [], []
+    for token in TOKEN_RE.findall(text):
+        if token[0].isdigit():
+            token = _number(token)
+            numbers.append(token)
+        elif token in STOPWORDS:
+            continue
+        elif len(token) > 3 and token[-1] in 'sx':
+            token = token[:-1]
+        words.append(token)
+    return words, tuple(sorted(numbers))
+
+
+def shingles(words: List[str]) -> frozenset:
+    """Trigrammes de caractères de la suite de mots (bornes de mots comprises)."""
+    text = f" {' '.join(words)} "
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset([text])
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def minhash(items: frozenset) -> np.ndarray:
+    """Signature MinHash (NUM_PERM valeurs) d'un ensemble de chaînes."""
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in items), dtype=np.uint64, count=len(items))
+    hashes %= _PRIME
+    return ((np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME).min(axis=0)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class DescriptionFeatures:
+    """Représentation d'une description pour l'index."""
+
+    __slots__ = ('shingles', 'numbers', 'attributes', 'signature')
+
+    def __init__(self, description: str):
+        words, self.numbers = description_tokens(description)
+        self.attributes = tuple(sorted({ATTRIBUTES[word] for word in words if word in ATTRIBUTES}))
+        self.shingles = shingles(words)
+        self.signature = minhash(self.shingles)
+
+    def comparable(self, other: "DescriptionFeatures") -> bool:
+        """Mêmes nombres, couleurs et matériaux : condition de toute similarité."""
+        return self.numbers == other.numbers and self.attributes == other.attributes
+
+    def band_keys(self) -> List[bytes]:
+        return [bytes([band]) + self.signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+
+def similarity(a: str, b: str) -> float:
+    """Similarité de deux descriptions (0 si leurs nombres, couleurs ou matériaux diffèrent)."""
+    fa, fb = DescriptionFeatures(a), DescriptionFeatures(b)
+    if not fa.comparable(fb):
+        return 0.0
+    return jaccard(fa.shingles, fb.shingles)
+
+
+class SimilarityIndex:
+    """
+    Index LSH incrémental de descriptions, partitionné par espace de noms
+    (par exemple méthode et version de prompt : seules les réponses à la
+    même question sont comparables).
+    """
+
+    def __init__(self):
+        self._docs: Dict[Hashable, Tuple[Hashable, DescriptionFeatures]] = {}
+        self._buckets: Dict[Tuple[Hashable, bytes], set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def add(self, doc_id: Hashable, namespace: Hashable, description: str) -> None:
+        """Ajoute (ou remplace) une description."""
+        features = DescriptionFeatures(description)
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = (namespace, features)
+            for key in features.band_keys():
+                self._buckets[(namespace, key)].add(doc_id)
+
+    def remove(self, doc_id: Hashable) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: Hashable) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        namespace, features = entry
+        for key in features.band_keys():
+            bucket = self._buckets.get((namespace, key))
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[(namespace, key)]
+
+    def query(self, namespace: Hashable, description: str, threshold: float,
+              exclude: Optional[Hashable] = None) -> List[Tuple[Hashable, float]]:
+        """
+        Descriptions de l'espace de noms dont la similarité atteint `threshold`.
+
+        Returns:
+            Liste de (identifiant, similarité), de la plus similaire à la moins similaire
+        """
+        features = DescriptionFeatures(description)
+        with self._lock:
+            candidates = set()
+            for key in features.band_keys():
+                candidates |= self._buckets.get((namespace, key), set())
+            candidates.discard(exclude)
+            found = []
+            for doc_id in candidates:
+                other = self._docs[doc_id][1]
+                if not other.comparable(features):
+                    continue
+                score = jaccard(features.shingles, other.shingles)
+                if score >= threshold:
+                    found.append((doc_id, score))
+        found.sort(key=lambda item: item[1], reverse=True)
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'documents': len(self._docs), 'buckets': len(self._buckets)}
@@ -0,0 +1,59 @@
+"""
+Coalescence des appels concurrents (« single-flight »).
+
+Lorsque plusieurs threads demandent la même clé en même temps, un seul
+exécute la fonction ; les autres attendent et partagent son résultat (ou
+son exception).
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Un appel en vol au plus par clé, partagé entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]):
+        """
+        Exécute `fn` pour `key`, ou attend l'appel déjà en cours.
+
+        Returns:
+            Tuple (résultat, partagé) où `partagé` vaut True si le résultat
+            provient de l'appel d'un autre thread
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
@@ -0,0 +1,355 @@
+"""
+Index spatial en mémoire pour les couches cadastrales d'une commune.
+
+L'index est une grille uniforme sur les emprises (bounding boxes) des
+entités GeoJSON. Il est construit une seule fois à partir du fichier
+communal en cache et permet de répondre aux requêtes par fenêtre
+(viewport) et de voisinage sans parcourir toute la commune.
+"""
+
+import math
+from array import array
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from .compact_features import CompactFeatures
+
+BBox = Tuple[float, float, float, float]
+
+# Mètres par degré de latitude (approximation sphérique, suffisante à l'échelle d'un quartier)
+METERS_PER_DEGREE = 111_320.0
+
+
+def _iter_positions(coordinates):
+    """Parcourt récursivement les positions [x, y] d'une géométrie GeoJSON."""
+    if not coordinates:
+        return
+    if isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for part in coordinates:
+        yield from _iter_positions(part)
+
+
+def geometry_bbox(geometry: Optional[Dict[str, Any]]) -> Optional[BBox]:
+    """
+    Calcule l'emprise (minx, miny, maxx, maxy) d'une géométrie GeoJSON.
+
+    Returns:
+        Tuple d'emprise, ou None pour une géométrie vide
+    """
+    if not geometry:
+        return None
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
+    for pos in _iter_positions(geometry.get('coordinates')):
+        x, y = pos[0], pos[1]
+        if x < minx:
+            minx = x
+        if x > maxx:
+            maxx = x
+        if y < miny:
+            miny = y
+        if y > maxy:
+            maxy = y
+    if minx == math.inf:
+        return None
+    return (minx, miny, maxx, maxy)
+
+
+def bbox_intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def ring_contains(ring: np.ndarray, x: float, y: float) -> bool:
+    """
+    Test point-dans-anneau vectorisé (règle pair-impair / ray casting).
+
+    Args:
+        ring: Tableau (N, 2) des sommets de l'anneau
+        x: Longitude du point
+        y: Latitude du point
+    """
+    xs = ring[:, 0]
+    ys = ring[:, 1]
+    xj = np.roll(xs, 1)
+    yj = np.roll(ys, 1)
+    crosses = (ys > y) != (yj > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_inter = (xj - xs) * (y - ys) / (yj - ys) + xs
+    return bool(np.count_nonzero(crosses & (x < x_inter)) % 2)
+
+
+def polygon_parts(geometry: Optional[Dict[str, Any]]) -> List[List[np.ndarray]]:
+    """Convertit un Polygon / MultiPolygon en liste de parties (anneaux NumPy)."""
+    if not geometry:
+        return []
+    gtype = geometry.get('type')
+    coords = geometry.get('coordinates') or []
+    if gtype == 'Polygon':
+        polygons = [coords]
+    elif gtype == 'MultiPolygon':
+        polygons = coords
+    else:
+        return []
+    return [
+        [np.asarray(ring, dtype=float)[:, :2] for ring in polygon if len(ring) >= 3]
+        for polygon in polygons
+    ]
+
+
+def parts_contain(parts: List[List[np.ndarray]], x: float, y: float) -> bool:
+    """Vrai si le point est dans l'anneau extérieur d'une partie et hors de ses trous."""
+    for rings in parts:
+        if not rings or not ring_contains(rings[0], x, y):
+            continue
+        if not any(ring_contains(hole, x, y) for hole in rings[1:]):
+            return True
+    return False
+
+
+def meters_to_degrees(distance: float, lat: float) -> Tuple[float, float]:
+    """Convertit une distance en mètres en écarts (dlon, dlat) en degrés à la latitude `lat`."""
+    dlat = distance / METERS_PER_DEGREE
+    dlon = distance / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return dlon, dlat
+
+
+def parts_bbox(parts: List[List[np.ndarray]]) -> Optional[BBox]:
+    """Emprise des anneaux d'une liste de parties, ou None si elle est vide."""
+    rings = [ring for rings in parts for ring in rings if len(ring)]
+    if not rings:
+        return None
+    coords = np.concatenate(rings)
+    minx, miny = coords.min(axis=0)
+    maxx, maxy = coords.max(axis=0)
+    return (float(minx), float(miny), float(maxx), float(maxy))
+
+
+def _points_segments_distance(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> float:
+    """Distance minimale entre des points (N, 2) et des segments starts[j] -> ends[j] (M, 2)."""
+    d = ends - starts
+    length2 = (d ** 2).sum(axis=1)
+    rel = points[:, None, :] - starts[None, :, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.nan_to_num(np.clip((rel * d).sum(axis=2) / length2, 0.0, 1.0))
+    offset = rel - t[..., None] * d
+    return float(np.sqrt((offset ** 2).sum(axis=2).min()))
+
+
+def parts_distance(a: List[List[np.ndarray]], b: List[List[np.ndarray]],
+                   origin: Tuple[float, float]) -> float:
+    """
+    Distance minimale en mètres entre deux (Multi)Polygones.
+
+    Les coordonnées sont projetées localement (équirectangulaire autour de
+    `origin`). La distance est nulle si les contours se touchent ou si l'un
+    des polygones contient un sommet de l'autre.
+
+    Args:
+        a: Parties du premier polygone (anneaux en degrés)
+        b: Parties du second polygone
+        origin: (lon, lat) de référence de la projection
+
+    Returns:
+        Distance en mètres (inf si l'un des polygones est vide)
+    """
+    rings_a = [ring for rings in a for ring in rings if len(ring) >= 2]
+    rings_b = [ring for rings in b for ring in rings if len(ring) >= 2]
+    if not rings_a or not rings_b:
+        return math.inf
+    if parts_contain(a, *rings_b[0][0]) or parts_contain(b, *rings_a[0][0]):
+        return 0.0
+
+    scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(origin[1])), METERS_PER_DEGREE])
+    project = lambda rings: [(ring - origin) * scale for ring in rings]
+    rings_a, rings_b = project(rings_a), project(rings_b)
+    points_a, points_b = np.concatenate(rings_a), np.concatenate(rings_b)
+    starts_a = np.concatenate([ring[:-1] for ring in rings_a])
+    ends_a = np.concatenate([ring[1:] for ring in rings_a])
+    starts_b = np.concatenate([ring[:-1] for ring in rings_b])
+    ends_b = np.concatenate([ring[1:] for ring in rings_b])
+    return min(_points_segments_distance(points_a, starts_b, ends_b),
+               _points_segments_distance(points_b, starts_a, ends_a))
+
+
+def parcel_key(section: str, numero: str) -> Tuple[str, str]:
+    """Clé normalisée (section sur 2 caractères, numéro sur 4 chiffres)."""
+    return (str(section).upper().strip().rjust(2, '0'), str(numero).strip().zfill(4))
+
+
+class GridIndex:
+    """Grille uniforme sur des emprises, pour requêtes par intersection."""
+
+    def __init__(self, bboxes: np.ndarray, target_per_cell: int = 8):
+        """
+        Args:
+            bboxes: Tableau (N, 4) des emprises ; lignes NaN pour les entités sans géométrie
+            target_per_cell: Nombre moyen visé d'emprises par cellule
+        """
+        self.bboxes = bboxes
+        valid = ~np.isnan(bboxes[:, 0]) if len(bboxes) else np.zeros(0, dtype=bool)
+        self.cells: Dict[Tuple[int, int], array] = {}
+
+        if not valid.any():
+            self.extent = None
+            return
+
+        b = bboxes[valid]
+        self.extent = (
+            float(b[:, 0].min()), float(b[:, 1].min()),
+            float(b[:, 2].max()), float(b[:, 3].max()),
+        )
+        width = max(self.extent[2] - self.extent[0], 1e-9)
+        height = max(self.extent[3] - self.extent[1], 1e-9)
+
+        # Environ `target_per_cell` entités par cellule, grille ~ carrée
+        n_cells = max(1, int(valid.sum()) // target_per_cell)
+        self.cell_size = max(math.sqrt(width * height / n_cells), 1e-9)
+        self.nx = max(1, math.ceil(width / self.cell_size))
+        self.ny = max(1, math.ceil(height / self.cell_size))
+
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for i in np.flatnonzero(valid).tolist():
+            x0, y0, x1, y1 = self._cell_range(bboxes[i].tolist())
+            for ix in range(x0, x1 + 1):
+                for iy in range(y0, y1 + 1):
+                    cells.setdefault((ix, iy), []).append(i)
+        # Listes d'indices compactées (entiers machine plutôt qu'objets int)
+        self.cells = {key: array('l', indices) for key, indices in cells.items()}
+
+    def _cell_range(self, b: BBox) -> Tuple[int, int, int, int]:
+        minx, miny = self.extent[0], self.extent[1]
+        clamp_x = lambda v: min(max(v, 0), self.nx - 1)
+        clamp_y = lambda v: min(max(v, 0), self.ny - 1)
+        return (
+            clamp_x(int((b[0] - minx) // self.cell_size)),
+            clamp_y(int((b[1] - miny) // self.cell_size)),
+            clamp_x(int((b[2] - minx) // self.cell_size)),
+            clamp_y(int((b[3] - miny) // self.cell_size)),
+        )
+
+    def query(self, bbox: BBox) -> List[int]:
+        """Retourne les indices (triés) des emprises intersectant `bbox`."""
+        if self.extent is None or not bbox_intersects(bbox, self.extent):
+            return []
+        x0, y0, x1, y1 = self._cell_range(bbox)
+        found = set()
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                found.update(self.cells.get((ix, iy), ()))
+        if not found:
+            return []
+        candidates = np.fromiter(found, dtype=np.int64, count=len(found))
+        b = self.bboxes[candidates]
+        hits = (b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])
+        return sorted(candidates[hits].tolist())
+
+
+class CommuneIndex:
+    """
+    Entités d'une couche communale et leur index spatial.
+
+    Les entités sont conservées sous forme compacte (CompactFeatures) ;
+    `features[i]` reconstruit l'entité GeoJSON à la demande.
+    """
+
+    def __init__(self, features: List[Dict[str, Any]]):
+        self.features = features if isinstance(features, CompactFeatures) else CompactFeatures.from_features(features)
+        self.bboxes = self.features.bboxes
+        self.grid = GridIndex(self.bboxes)
+        self._sections: Optional[List[Dict[str, Any]]] = None
+        self._by_id: Optional[Dict[Tuple[str, str], int]] = None
+
+    @classmethod
+    def from_geojson(cls, collection: Dict[str, Any]) -> "CommuneIndex":
+        return cls(collection.get('features', []))
+
+    def __len__(self):
+        return len(self.features)
+
+    def nbytes(self) -> int:
+        """Estimation de l'empreinte mémoire (entités compactes et grille)."""
+        grid = sum(cell.buffer_info()[1] * cell.itemsize for cell in self.grid.cells.values())
+        return self.features.nbytes() + grid
+
+    def query_bbox(self, bbox: BBox) -> List[Dict[str, Any]]:
+        """Entités dont l'emprise intersecte la fenêtre `bbox`."""
+        return [self.features[i] for i in self.grid.query(bbox)]
+
+    def find_containing(self, x: float, y: float) -> Optional[Dict[str, Any]]:
+        """Première entité dont le polygone contient le point (x, y), ou None."""
+        for i in self.grid.query((x, y, x, y)):
+            if parts_contain(self.features.parts(i), x, y):
+                return self.features[i]
+        return None
+
+    def section_summary(self) -> List[Dict[str, Any]]:
+        """
+        Sections cadastrales présentes, avec nombre de parcelles et emprise.
+
+        Returns:
+            Liste triée de {'section', 'count', 'bbox': [minx, miny, maxx, maxy]}
+        """
+        if self._sections is None:
+            sections: Dict[str, Dict[str, Any]] = {}
+            for i, record in enumerate(self.features.records):
+                section = record.get('section')
+                if not section:
+                    continue
+                summary = sections.setdefault(section, {'section': section, 'count': 0, 'bbox': None})
+                summary['count'] += 1
+                b = self.features.bbox(i)
+                if b is not None:
+                    cur = summary['bbox']
+                    summary['bbox'] = list(b) if cur is None else [
+                        min(cur[0], b[0]), min(cur[1], b[1]), max(cur[2], b[2]), max(cur[3], b[3])
+                    ]
+            self._sections = [sections[k] for k in sorted(sections)]
+        return self._sections
+
+    def position(self, section: str, numero: str) -> Optional[int]:
+        """Rang de la parcelle (section, numéro), via un index construit au premier appel."""
+        if self._by_id is None:
+            by_id = {}
+            for i, record in enumerate(self.features.records):
+                if record.get('section') and record.get('numero'):
+                    by_id.setdefault(parcel_key(record.get('section'), record.get('numero')), i)
+            self._by_id = by_id
+        return self._by_id.get(parcel_key(section, numero))
+
+    def get_by_id(self, section: str, numero: str) -> Optional[Dict[str, Any]]:
+        """Parcelle par (section, numéro), ou None."""
+        i = self.position(section, numero)
+        return self.features[i] if i is not None else None
+
+    def within_distance(self, parts: List[List[np.ndarray]], distance: float) -> List[Tuple[int, float]]:
+        """
+        Entités situées à au plus `distance` mètres d'un polygone.
+
+        La grille fournit les candidats dont l'emprise recoupe celle du
+        polygone élargie de `distance` ; la distance exacte n'est calculée
+        que pour eux.
+
+        Args:
+            parts: Parties du polygone de référence (anneaux en degrés)
+            distance: Distance maximale en mètres
+
+        Returns:
+            Liste de (rang, distance en mètres), triée par distance croissante
+        """
+        bbox = parts_bbox(parts)
+        if bbox is None:
+            return []
+        origin = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        dlon, dlat = meters_to_degrees(distance, origin[1])
+        window = (bbox[0] - dlon, bbox[1] - dlat, bbox[2] + dlon, bbox[3] + dlat)
+
+        found = []
+        for i in self.grid.query(window):
+            d = parts_distance(parts, self.features.parts(i), origin)
+            if d <= distance:
+                found.append((i, d))
+        found.sort(key=lambda item: item[1])
+        return found
@@ -0,0 +1,76 @@
+"""
+Tuiles GeoJSON (pyramide web-mercator XYZ) pour les couches cadastrales.
+
+Chaque tuile contient les entités d'une commune intersectant l'emprise de
+la tuile, simplifiées selon le niveau de zoom puis découpées sur l'emprise
+(avec une petite marge pour éviter les artefacts aux jointures).
+Les tuiles générées sont stockées sur disque via DerivedFileCache.
+"""
+
+import math
+from typing import Dict, Any
+
+from .geometry import simplify_geometry, clip_geometry
+from .spatial_index import CommuneIndex, bbox_intersects
+
+TILE_SIZE = 256
+# Marge autour de la tuile, en pixels
+TILE_BUFFER = 4
+
+
+def tile_bbox(z: int, x: int, y: int):
+    """Emprise WGS84 (minx, miny, maxx, maxy) d'une tuile XYZ web-mercator."""
+    n = 2 ** z
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return (lon(x), lat(y + 1), lon(x + 1), lat(y))
+
+
+def _buffered_bbox(z: int, x: int, y: int):
+    """Emprise de la tuile élargie de TILE_BUFFER pixels, et taille d'un pixel."""
+    minx, miny, maxx, maxy = tile_bbox(z, x, y)
+    pixel = (maxx - minx) / TILE_SIZE
+    return (
+        minx - TILE_BUFFER * pixel, miny - TILE_BUFFER * pixel,
+        maxx + TILE_BUFFER * pixel, maxy + TILE_BUFFER * pixel,
+    ), pixel
+
+
+def tile_in_extent(index: CommuneIndex, z: int, x: int, y: int) -> bool:
+    """Indique si la tuile (avec sa marge) recoupe l'emprise de la commune."""
+    extent = index.grid.extent
+    return extent is not None and bbox_intersects(_buffered_bbox(z, x, y)[0], extent)
+
+
+def build_tile(index: CommuneIndex, z: int, x: int, y: int) -> Dict[str, Any]:
+    """
+    Construit la FeatureCollection d'une tuile à partir d'un index communal.
+
+    La tolérance de simplification correspond à un demi-pixel au zoom `z`.
+    """
+    buffered, pixel = _buffered_bbox(z, x, y)
+    tolerance = pixel / 2
+
+    features = []
+    for i in index.grid.query(buffered):
+        feature = index.features[i]
+        geometry = simplify_geometry(feature.get('geometry'), tolerance)
+        fb = index.bboxes[i]
+        inside = fb[0] >= buffered[0] and fb[1] >= buffered[1] and fb[2] <= buffered[2] and fb[3] <= buffered[3]
+        if not inside:
+            geometry = clip_geometry(geometry, buffered)
+        if geometry is None:
+            continue
+        features.append({
+            "type": "Feature",
+            "id": feature.get('id'),
+            "geometry": geometry,
+            "properties": feature.get('properties', {}),
+        })
+    return {"type": "FeatureCollection", "features": features}
+
@@ -0,0 +1,55 @@
+"""
+Données de test communes : parcelles carrées autour d'un point, tuiles XYZ.
+"""
+
+import math
+import shutil
+import tempfile
+
+# Origine des parcelles de test (Paris) et côté d'une parcelle, en degrés
+ORIGIN = (2.35, 48.85)
+SIZE = 0.0005
+
+
+def square(x, y, size=SIZE):
+    """Anneau fermé d'un carré de coin inférieur gauche (x, y)."""
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+
+
+def parcel(section, numero, x, y, size=SIZE, code_insee='75056'):
+    """Parcelle Etalab carrée."""
+    return {
+        "type": "Feature",
+        "id": f"{code_insee}000{section}{numero}",
+        "geometry": {"type": "Polygon", "coordinates": [square(x, y, size)]},
+        "properties": {"id": f"{code_insee}000{section}{numero}", "commune": code_insee,
+                       "section": section, "numero": numero, "contenance": 250},
+    }
+
+
+def parcel_grid(columns=3, rows=2, section='AB'):
+    """Grille de parcelles contiguës (numéros 0001, 0002... ligne par ligne)."""
+    x0, y0 = ORIGIN
+    return [
+        parcel(section, f"{row * columns + col + 1:04d}", x0 + col * SIZE, y0 + row * SIZE)
+        for row in range(rows) for col in range(columns)
+    ]
+
+
+def collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def tile_of(lon, lat, z):
+    """Tuile XYZ web-mercator contenant le point."""
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def temp_dir(test_case):
+    """Répertoire temporaire supprimé à la fin du test."""
+    path = tempfile.mkdtemp(prefix='urbania-test-')
+    test_case.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
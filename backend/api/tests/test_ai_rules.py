@@ -0,0 +1,101 @@
+"""
+Tests du moteur de règles des pièces DP, de la similarité des descriptions
+et de la validation des réponses de l'IA.
+"""
+
+from django.test import SimpleTestCase
+
+from api.services.ai_service import AIService
+from api.services.dp_rules import (
+    CONFIDENCE_AMBIGUOUS, CONFIDENCE_NATURE, CONFIDENCE_SEVERAL_TYPES, CONFIDENCE_SINGLE_TYPE, DPRulesEngine,
+)
+from api.services.similarity_index import SimilarityIndex, similarity
+
+
+class DPRulesEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        self.engine = DPRulesEngine(min_confidence=0.8)
+
+    def test_single_type_from_keywords(self):
+        decision = self.engine.classify("Construction d'un abri de jardin en bois de 9 m²")
+        self.assertEqual((decision.types, decision.confidence), (['abri_jardin'], CONFIDENCE_SINGLE_TYPE))
+        documents = decision.documents()
+        self.assertTrue(documents['dp1'] and documents['dp7'])
+        self.assertEqual(sorted(documents), ["dp1", "dp2", "dp3", "dp4", "dp5", "dp6", "dp7", "dp8"])
+
+    def test_nature_travaux_wins(self):
+        decision = self.engine.classify("Projet dans le jardin", ['piscine', 'autre'])
+        self.assertEqual((decision.types, decision.confidence, decision.source),
+                         (['piscine'], CONFIDENCE_NATURE, 'nature'))
+        self.assertEqual(decision.configuration()['projectCategory'], 'construction')
+
+    def test_construction_materials_are_not_roof_works(self):
+        decision = self.engine.classify("Garage avec toit en tuiles")
+        self.assertEqual((decision.types, decision.confidence), (['garage'], CONFIDENCE_SINGLE_TYPE))
+        # « porte de garage » : travaux de menuiserie, pas de garage
+        self.assertEqual(self.engine.classify("Remplacement de la porte de garage").types, ['toiture'])
+
+    def test_several_types_are_deferred(self):
+        decision = self.engine.classify("Piscine et pergola")
+        self.assertEqual(decision.confidence, CONFIDENCE_SEVERAL_TYPES)
+        self.assertIsNone(self.engine.decide('suggest_documents', "Piscine et pergola"))
+
+    def test_ambiguous_works_are_deferred(self):
+        for description in ("Démolition du garage", "Pose d'une pompe à chaleur en façade",
+                            "Climatiseur sur le toit"):
+            decision = self.engine.classify(description)
+            self.assertLessEqual(decision.confidence, CONFIDENCE_AMBIGUOUS, description)
+            self.assertIsNone(self.engine.decide('suggest_documents', description))
+
+    def test_unrecognized_description(self):
+        decision = self.engine.classify("Travaux divers")
+        self.assertEqual((decision.types, decision.confidence), ([], 0.0))
+
+    def test_stats(self):
+        self.engine.decide('suggest_documents', "Construction d'un carport")
+        self.engine.decide('suggest_documents', "Travaux divers")
+        self.engine.decide('configure_custom_project', "Travaux divers")
+        stats = self.engine.stats()
+        self.assertEqual(stats['min_confidence'], 0.8)
+        self.assertEqual(stats['methods']['suggest_documents'],
+                         {'decided': 1, 'deferred': 1, 'decided_ratio': 0.5})
+        self.assertEqual(stats['methods']['configure_custom_project']['decided_ratio'], 0.0)
+
+
+class SimilarityTests(SimpleTestCase):
+
+    def test_reworded_descriptions_are_similar(self):
+        self.assertGreater(similarity("Construction d'un abri de jardin 3x3",
+                                      "construction abris de jardin 3 x 3"), 0.8)
+
+    def test_numbers_colours_and_materials_must_match(self):
+        self.assertEqual(similarity("Clôture de 1,50 m", "Clôture de 1,80 m"), 0.0)
+        self.assertEqual(similarity("Ravalement de façade blanc", "Ravalement de façade gris"), 0.0)
+        self.assertEqual(similarity("Abri de jardin en bois", "Abri de jardin en métal"), 0.0)
+
+    def test_index_query(self):
+        index = SimilarityIndex()
+        index.add(1, 'analyze_project', "Ravalement de façade en blanc")
+        index.add(2, 'analyze_project', "Ravalement de façade en gris")
+        index.add(3, 'suggest_documents', "Ravalement de façade en blanc")
+        found = index.query('analyze_project', "ravalement facade blanc", 0.8)
+        self.assertEqual([doc_id for doc_id, _ in found], [1])
+        index.remove(1)
+        self.assertEqual(index.query('analyze_project', "ravalement facade blanc", 0.8), [])
+        self.assertEqual(len(index), 2)
+
+
+class AIResultValidationTests(SimpleTestCase):
+
+    def test_analysis_result(self):
+        self.assertEqual(AIService.analysis_result({'couleurFacade': 'Blanc', 'autre': 1}), {
+            'couleurFacade': 'Blanc', 'couleurToiture': None, 'materiauFacade': None,
+            'materiauToiture': None, 'hauteurConstruction': None,
+        })
+        self.assertIsNone(AIService.analysis_result({'autre': 1}))
+        self.assertIsNone(AIService.analysis_result(['couleurFacade']))
+
+    def test_documents_result_always_requires_dp1_and_dp7(self):
+        self.assertEqual(AIService.documents_result({'dp2': 1, 'dp7': False}), {'dp2': True, 'dp7': True, 'dp1': True})
+        self.assertIsNone(AIService.documents_result({}))
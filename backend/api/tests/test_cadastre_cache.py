@@ -0,0 +1,304 @@
+"""
+Tests des caches disque du cadastre (fichiers communaux, fichiers dérivés)
+et du stockage local préchargé.
+"""
+
+import gzip
+import json
+import os
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from api.services.cadastre_cache import CommuneFileCache, DerivedFileCache, cache_path, is_valid_code_insee
+from api.services.cadastre_service import CadastreService
+from api.services.cadastre_store import CadastreStore
+
+from .fixtures import ORIGIN, SIZE, collection, parcel, parcel_grid, temp_dir, tile_of
+
+
+def json_chunks(data):
+    payload = json.dumps(data).encode()
+    return [payload[:10], payload[10:]]
+
+
+class FakeResponse:
+    """Réponse `requests` minimale (utilisée en gestionnaire de contexte, en flux)."""
+
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=None):
+        yield self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+
+class CodeInseeTests(SimpleTestCase):
+
+    def test_valid_codes(self):
+        for code in ('75056', '01053', '2A004', '2B033'):
+            self.assertTrue(is_valid_code_insee(code), code)
+
+    def test_invalid_codes(self):
+        for code in ('1053', '750560', '2C004', '../75', '75 56', '', None, 75056):
+            self.assertFalse(is_valid_code_insee(code), code)
+
+
+class CachePathTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = temp_dir(self)
+
+    def test_builds_path_under_directory(self):
+        self.assertEqual(cache_path(self.directory, 'parcelles', '75056.json.gz'),
+                         os.path.join(self.directory, 'parcelles', '75056.json.gz'))
+
+    def test_rejects_traversal_and_separators(self):
+        for part in ('..', '.hidden', 'a/b', '../etc', '', 'a\\b'):
+            with self.assertRaises(ValueError, msg=part):
+                cache_path(self.directory, 'parcelles', part)
+
+    def test_rejects_symlink_escaping_directory(self):
+        outside = temp_dir(self)
+        os.symlink(outside, os.path.join(self.directory, 'link'))
+        with self.assertRaises(ValueError):
+            cache_path(self.directory, 'link', 'file.json.gz')
+
+    def test_commune_cache_rejects_invalid_code(self):
+        cache = CommuneFileCache(self.directory, max_bytes=10 ** 6, ttl=60)
+        with self.assertRaises(ValueError):
+            cache.path_for('parcelles', '../../etc/passwd')
+        with self.assertRaises(ValueError):
+            cache.path_for('../parcelles', '75056')
+
+
+class CommuneFileCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = temp_dir(self)
+        self.cache = CommuneFileCache(self.directory, max_bytes=10 ** 6, ttl=60)
+
+    def test_store_and_read_back(self):
+        data = collection(parcel_grid())
+        entry = self.cache.store('parcelles', '75056', json_chunks(data), etag='"v1"', last_modified='lun.')
+        self.assertEqual(self.cache.load_json(entry), data)
+        self.assertEqual(json.loads(b''.join(self.cache.iter_bytes(entry, compressed=False))), data)
+        self.assertEqual(json.loads(gzip.decompress(b''.join(self.cache.iter_bytes(entry)))), data)
+
+        stored = self.cache.get_entry('parcelles', '75056')
+        self.assertEqual(stored['etag'], '"v1"')
+        self.assertEqual(stored['last_modified'], 'lun.')
+        self.assertEqual(stored['stored_at'], entry['stored_at'])
+        self.assertTrue(self.cache.is_fresh(stored))
+        self.assertIsNone(self.cache.get_entry('batiments', '75056'))
+
+    def test_annotations_survive_revalidation_but_not_replacement(self):
+        entry = self.cache.store('parcelles', '75056', json_chunks(collection([])))
+        self.cache.annotate('parcelles', '75056', entry, sections=[{'section': 'AB'}])
+        entry = self.cache.mark_revalidated('parcelles', '75056', self.cache.get_entry('parcelles', '75056'))
+        self.assertEqual(self.cache.get_entry('parcelles', '75056')['sections'], [{'section': 'AB'}])
+
+        self.cache.store('parcelles', '75056', json_chunks(collection([])))
+        self.assertNotIn('sections', self.cache.get_entry('parcelles', '75056'))
+
+    def test_evicts_least_recently_used_entries(self):
+        payload = json_chunks(collection(parcel_grid()))
+        first = self.cache.store('parcelles', '75056', payload)
+        second = self.cache.store('parcelles', '75101', payload)
+        os.utime(first['path'], (1000, 1000))
+        os.utime(second['path'], (2000, 2000))
+        # La plus ancienne redevient la plus récente
+        self.cache.touch(first)
+
+        self.cache.max_bytes = first['size'] + second['size']
+        self.cache.store('parcelles', '75102', payload)
+
+        self.assertIsNotNone(self.cache.get_entry('parcelles', '75056'))
+        self.assertIsNone(self.cache.get_entry('parcelles', '75101'))
+        self.assertIsNotNone(self.cache.get_entry('parcelles', '75102'))
+        stats = self.cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['entries'], 2)
+
+    def test_newest_entry_is_kept_even_above_limit(self):
+        self.cache.max_bytes = 1
+        entry = self.cache.store('parcelles', '75056', json_chunks(collection(parcel_grid())))
+        self.assertTrue(os.path.exists(entry['path']))
+
+
+@override_settings(CADASTRE_CACHE_STALE_TTL=0)
+class CommuneLayerRevalidationTests(SimpleTestCase):
+    """Revalidation conditionnelle (ETag) des fichiers communaux par CadastreService."""
+
+    def setUp(self):
+        directory = temp_dir(self)
+        with self.settings(CADASTRE_TILE_DIR=os.path.join(directory, 'tiles'),
+                           CADASTRE_VARIANT_DIR=os.path.join(directory, 'variants'),
+                           CADASTRE_STORE_PATH=os.path.join(directory, 'store.sqlite3')):
+            # TTL nul : chaque accès revalide auprès de l'amont
+            self.service = CadastreService(cache=CommuneFileCache(os.path.join(directory, 'cache'), 10 ** 8, ttl=0))
+        self.service.session.get = mock.Mock()
+        self.body = json.dumps(collection(parcel_grid())).encode()
+
+    def test_revalidates_with_etag(self):
+        get = self.service.session.get
+        get.return_value = FakeResponse(200, self.body, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2026'})
+        entry = self.service.fetch_commune_layer('parcelles', '75056')
+        self.assertEqual(entry['etag'], '"v1"')
+        self.assertNotIn('If-None-Match', get.call_args.kwargs['headers'])
+
+        get.return_value = FakeResponse(304)
+        revalidated = self.service.fetch_commune_layer('parcelles', '75056')
+        headers = get.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertEqual(headers['If-Modified-Since'], 'Mon, 01 Jan 2026')
+        # Contenu inchangé : même version, date de récupération rafraîchie
+        self.assertEqual(revalidated['stored_at'], entry['stored_at'])
+        self.assertGreaterEqual(revalidated['fetched_at'], entry['fetched_at'])
+        self.assertEqual(self.service.cache.stats()['revalidations'], 1)
+
+    def test_new_content_replaces_entry(self):
+        get = self.service.session.get
+        get.return_value = FakeResponse(200, self.body, {'ETag': '"v1"'})
+        entry = self.service.fetch_commune_layer('parcelles', '75056')
+
+        body = json.dumps(collection(parcel_grid(columns=1, rows=1))).encode()
+        get.return_value = FakeResponse(200, body, {'ETag': '"v2"'})
+        replaced = self.service.fetch_commune_layer('parcelles', '75056')
+        self.assertEqual(replaced['etag'], '"v2"')
+        self.assertNotEqual(replaced['stored_at'], entry['stored_at'])
+        self.assertEqual(len(self.service.cache.load_json(replaced)['features']), 1)
+
+    def test_serves_stale_entry_on_upstream_error(self):
+        get = self.service.session.get
+        get.return_value = FakeResponse(200, self.body, {'ETag': '"v1"'})
+        entry = self.service.fetch_commune_layer('parcelles', '75056')
+
+        get.side_effect = requests.exceptions.ConnectionError("amont injoignable")
+        stale = self.service.fetch_commune_layer('parcelles', '75056')
+        self.assertEqual(stale['stored_at'], entry['stored_at'])
+
+    def test_unknown_commune(self):
+        self.service.session.get.return_value = FakeResponse(404)
+        self.assertIsNone(self.service.fetch_commune_layer('parcelles', '75056'))
+
+    def test_upstream_error_without_cache_is_raised(self):
+        self.service.session.get.side_effect = requests.exceptions.ConnectionError("amont injoignable")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.service.fetch_commune_layer('parcelles', '75056')
+
+    def test_tile_version_follows_commune_file(self):
+        x, y = ORIGIN
+        self.service.session.get.return_value = FakeResponse(200, self.body, {'ETag': '"v1"'})
+        tx, ty = tile_of(x + SIZE, y + SIZE, 16)
+        path, version = self.service.get_tile('parcelles', '75056', 16, tx, ty)
+        entry = self.service.cache.get_entry('parcelles', '75056')
+        self.assertEqual(version, int(entry['stored_at']))
+        with gzip.open(path) as f:
+            self.assertTrue(json.load(f)['features'])
+        # Tuile hors de l'emprise de la commune
+        self.assertIsNone(self.service.get_tile('parcelles', '75056', 16, 0, 0))
+
+
+class DerivedFileCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = temp_dir(self)
+
+    def test_store_and_get(self):
+        cache = DerivedFileCache(self.directory)
+        path = cache.store('parcelles', '75056', 1, '16/33213/22556', {'features': []})
+        self.assertEqual(cache.get('parcelles', '75056', 1, '16/33213/22556'), path)
+        with gzip.open(path) as f:
+            self.assertEqual(json.load(f), {'features': []})
+        self.assertIsNone(cache.get('parcelles', '75056', 2, '16/33213/22556'))
+
+    def test_new_version_purges_previous(self):
+        cache = DerivedFileCache(self.directory)
+        old = cache.store('parcelles', '75056', 1, 'a', {})
+        cache.store('parcelles', '75056', 2, 'a', {})
+        self.assertFalse(os.path.exists(old))
+        self.assertIsNone(cache.get('parcelles', '75056', 1, 'a'))
+
+    def test_rejects_names_outside_cache(self):
+        cache = DerivedFileCache(self.directory)
+        for name in ('../../x', '16/../../x', '/etc/passwd'):
+            with self.assertRaises(ValueError, msg=name):
+                cache.path_for('parcelles', '75056', 1, name)
+        with self.assertRaises(ValueError):
+            cache.path_for('parcelles', '..', 1, 'a')
+
+    def test_lru_eviction_keeps_recently_read_files(self):
+        payload = b'x' * 1000
+        cache = DerivedFileCache(self.directory, max_bytes=3500)
+        paths = [cache.store_bytes('parcelles', '75056', 1, name, payload) for name in 'abc']
+        for i, path in enumerate(paths):
+            os.utime(path, (1000 + i, 1000 + i))
+        # Lecture de 'a' : devient le plus récent
+        cache.get('parcelles', '75056', 1, 'a')
+
+        cache.store_bytes('parcelles', '75056', 1, 'd', payload)
+        remaining = {name for name in 'abcd' if cache.get('parcelles', '75056', 1, name)}
+        # 'b', le moins récemment utilisé, est évincé (et non 'a', le plus ancien écrit)
+        self.assertEqual(remaining, {'a', 'c', 'd'})
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['size_bytes'], 3500 * DerivedFileCache.EVICT_TARGET)
+
+
+class CadastreStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = CadastreStore(os.path.join(temp_dir(self), 'store.sqlite3'))
+        x, y = ORIGIN
+        self.features = parcel_grid() + [parcel('B', '12', x, y + 10 * SIZE)]
+        self.store.load_features('parcelles', '75056', '75', self.features)
+
+    def test_commune_version_and_stats(self):
+        self.assertIsNotNone(self.store.commune_version('parcelles', '75056'))
+        self.assertIsNone(self.store.commune_version('parcelles', '75101'))
+        self.assertEqual(self.store.stats(), {'communes': 1, 'features': 7, 'departements': ['75']})
+
+    def test_missing_store(self):
+        store = CadastreStore(os.path.join(temp_dir(self), 'absent.sqlite3'))
+        self.assertIsNone(store.commune_version('parcelles', '75056'))
+        self.assertIsNone(store.find_parcelle_at(*ORIGIN))
+        self.assertEqual(store.stats()['communes'], 0)
+
+    def test_iter_commune_json(self):
+        data = json.loads(b''.join(self.store.iter_commune_json('parcelles', '75056')))
+        self.assertEqual(data, collection(self.features))
+
+    def test_get_parcelle_normalizes_key(self):
+        self.assertEqual(self.store.get_parcelle('75056', 'b', '12'), self.features[-1])
+        self.assertEqual(self.store.get_parcelle('75056', 'AB', '0002'), self.features[1])
+        self.assertIsNone(self.store.get_parcelle('75056', 'AB', '99'))
+
+    def test_find_parcelle_at(self):
+        x, y = ORIGIN
+        self.assertEqual(self.store.find_parcelle_at(x + SIZE * 1.5, y + SIZE * 0.5), self.features[1])
+        self.assertIsNone(self.store.find_parcelle_at(x - SIZE, y - SIZE))
+
+    def test_section_summary(self):
+        summary = self.store.section_summary('75056')
+        self.assertEqual([(s['section'], s['count']) for s in summary], [('AB', 6), ('B', 1)])
+        x, y = ORIGIN
+        for value, expected in zip(summary[0]['bbox'], [x, y, x + 3 * SIZE, y + 2 * SIZE]):
+            self.assertAlmostEqual(value, expected)
+
+    def test_reload_replaces_commune(self):
+        self.store.load_features('parcelles', '75056', '75', self.features[:2])
+        self.assertEqual(self.store.stats()['features'], 2)
+        self.assertIsNone(self.store.get_parcelle('75056', 'B', '12'))
@@ -0,0 +1,191 @@
+"""
+Tests des files de jobs en base : génération des PDF de dossiers et appels à l'IA.
+"""
+
+import json
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.services import ai_jobs, pdf_jobs
+from api.services.ai_jobs import AIJobQueue, AIJobQueueFull, LiveJob
+from api.services.pdf_jobs import PdfJobQueue, dossier_pdf_path
+from core.models import AdminNotification, AIJob, Dossier, PdfJob
+
+from .fixtures import temp_dir
+
+
+class PdfJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.directory = temp_dir(self)
+        settings_override = override_settings(DOSSIER_PDF_DIR=self.directory, BACKEND_PUBLIC_URL='https://api.test')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('marie', 'marie@example.com', 'secret')
+        self.dossier = Dossier.objects.create(user=self.user, data={'nom': 'Dupont'})
+        self.queue = PdfJobQueue(workers=0, poll_interval=1, max_attempts=2, retry_delay=30,
+                                 stale_after=600, housekeeping_interval=60)
+
+    def test_claim_is_exclusive(self):
+        job = self.queue.enqueue(self.dossier)
+        claimed = self.queue.claim()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts), ('running', 1))
+        self.assertIsNone(self.queue.claim())
+
+    def test_claim_respects_run_after(self):
+        PdfJob.objects.create(dossier=self.dossier, run_after=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(self.queue.claim())
+
+    @mock.patch.object(pdf_jobs, 'build_dossier_pdf', return_value=b'%PDF-1.4 test')
+    def test_process_writes_pdf_and_notifies(self, build):
+        self.queue.enqueue(self.dossier)
+        self.assertEqual(self.queue.drain(), 1)
+
+        build.assert_called_once_with({'nom': 'Dupont'}, include_plan=True)
+        with open(dossier_pdf_path(self.dossier.pk), 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 test')
+        self.dossier.refresh_from_db()
+        self.assertEqual(self.dossier.pdf_url, f"https://api.test/api/dossiers/{self.dossier.pk}/pdf/")
+        self.assertEqual(PdfJob.objects.get().status, 'done')
+        self.assertEqual(AdminNotification.objects.get().notification_type, 'pdf_generated')
+        self.assertEqual(self.queue.stats()['jobs']['done'], 1)
+
+    @mock.patch.object(pdf_jobs, 'build_dossier_pdf', side_effect=RuntimeError("plan indisponible"))
+    def test_failure_is_retried_then_failed(self, build):
+        job = self.queue.enqueue(self.dossier)
+        self.queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('pending', "plan indisponible"))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+
+        # Dernier essai, sans plan de situation
+        PdfJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(build.call_args.kwargs, {'include_plan': False})
+        self.assertFalse(os.path.exists(dossier_pdf_path(self.dossier.pk)))
+
+    def test_stale_jobs_are_requeued_at_most_once_per_interval(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        stale = PdfJob.objects.create(dossier=self.dossier, status='running', attempts=1, started_at=long_ago)
+        exhausted = PdfJob.objects.create(dossier=self.dossier, status='running', attempts=2, started_at=long_ago)
+
+        claimed = self.queue.claim()
+        self.assertEqual(claimed.pk, stale.pk)
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+
+        # Abandonné après la passe de nettoyage : repris à la passe suivante seulement
+        PdfJob.objects.filter(pk=stale.pk).update(started_at=long_ago, attempts=1)
+        self.assertIsNone(self.queue.claim())
+        self.queue._housekept_at -= 61
+        self.assertEqual(self.queue.claim().pk, stale.pk)
+
+
+class AIJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('marie', 'marie@example.com', 'secret')
+        self.queue = AIJobQueue(workers=0, poll_interval=2, max_pending=2, progress_interval=0,
+                                stream_interval=0, stream_timeout=5, stale_after=120, ttl=3600,
+                                housekeeping_interval=60)
+
+    def test_enqueue_rejects_when_full(self):
+        self.queue.enqueue(self.user, 'analyze_project', "Pose d'une véranda")
+        self.queue.enqueue(self.user, 'analyze_project', "Pose d'une pergola")
+        with self.assertRaises(AIJobQueueFull) as ctx:
+            self.queue.enqueue(self.user, 'analyze_project', "Pose d'un carport")
+        self.assertEqual(ctx.exception.retry_after, 2)
+        self.assertEqual(self.queue.stats()['rejected'], 1)
+
+    def test_claim_is_exclusive(self):
+        job = self.queue.enqueue(self.user, 'suggest_documents', "Construction d'un garage", ['garage'])
+        claimed = self.queue.claim()
+        self.assertEqual((claimed.pk, claimed.status), (job.pk, 'running'))
+        self.assertIsNotNone(claimed.heartbeat_at)
+        self.assertIsNone(self.queue.claim())
+
+    def test_process_streams_partial_text_and_stores_result(self):
+        result = {'couleurFacade': 'Blanc'}
+
+        def analyze(description, on_token=None):
+            on_token('{"couleur')
+            # Texte enregistré au fil de l'eau (progress_interval nul)
+            self.assertEqual(AIJob.objects.get().partial, '{"couleur')
+            on_token('Facade": "Blanc"}')
+            return result
+
+        self.queue.enqueue(self.user, 'analyze_project', "Ravalement en blanc")
+        with mock.patch.object(ai_jobs.AIService, 'analyze_project', side_effect=analyze):
+            self.assertTrue(self.queue.run_next())
+
+        job = AIJob.objects.get()
+        self.assertEqual((job.status, job.result, job.error), ('done', result, ''))
+        self.assertEqual(job.partial, '{"couleurFacade": "Blanc"}')
+        self.assertEqual(self.queue.snapshot(job.pk)['status'], 'done')
+        self.assertEqual(self.queue.stats()['live'], 0)
+
+    def test_process_records_failures(self):
+        self.queue.enqueue(self.user, 'analyze_project', "Ravalement")
+        with mock.patch.object(ai_jobs.AIService, 'analyze_project', side_effect=RuntimeError("Mistral")):
+            self.queue.run_next()
+        job = AIJob.objects.get()
+        self.assertEqual((job.status, job.error), ('failed', "Erreur lors de l'appel à l'IA"))
+
+        self.queue.enqueue(self.user, 'suggest_documents', "Travaux divers")
+        with mock.patch.object(ai_jobs.AIService, 'suggest_documents', return_value=None):
+            self.queue.run_next()
+        self.assertEqual(AIJob.objects.get(method='suggest_documents').error,
+                         "L'IA n'a pas pu suggérer de documents")
+
+    def test_stream_of_finished_job(self):
+        job = AIJob.objects.create(user=self.user, method='analyze_project', description="x", status='done',
+                                   partial='{"a": 1}', result={'a': 1})
+        events = b''.join(self.queue.stream(job.pk)).decode()
+        self.assertIn('event: status\ndata: {"status": "done"}', events)
+        self.assertIn('id: 8\nevent: token\ndata: {"text": "{\\"a\\": 1}"}', events)
+        self.assertIn('event: result\ndata: {"a": 1}', events)
+
+        # Reprise (Last-Event-ID) : le texte déjà reçu n'est pas renvoyé
+        events = b''.join(self.queue.stream(job.pk, offset=8)).decode()
+        self.assertNotIn('event: token', events)
+
+    def test_stream_of_unknown_job(self):
+        events = b''.join(self.queue.stream('00000000-0000-0000-0000-000000000000')).decode()
+        data = json.loads(events.split('data: ')[1])
+        self.assertEqual(data, {'error': "Job non trouvé"})
+
+    def test_abandoned_jobs_fail_after_missing_heartbeats(self):
+        long_ago = timezone.now() - timedelta(minutes=10)
+        alive = AIJob.objects.create(user=self.user, method='analyze_all', description="x", status='running',
+                                     started_at=long_ago, heartbeat_at=timezone.now())
+        dead = AIJob.objects.create(user=self.user, method='analyze_all', description="x", status='running',
+                                    started_at=long_ago, heartbeat_at=long_ago)
+        old = AIJob.objects.create(user=self.user, method='analyze_all', description="x", status='done',
+                                   finished_at=timezone.now() - timedelta(hours=2))
+
+        self.queue.claim()
+        self.assertEqual(AIJob.objects.get(pk=alive.pk).status, 'running')
+        self.assertEqual(AIJob.objects.get(pk=dead.pk).status, 'failed')
+        self.assertFalse(AIJob.objects.filter(pk=old.pk).exists())
+
+        # Nettoyage limité à une passe par intervalle
+        AIJob.objects.filter(pk=alive.pk).update(heartbeat_at=long_ago)
+        self.queue.claim()
+        self.assertEqual(AIJob.objects.get(pk=alive.pk).status, 'running')
+
+    def test_heartbeat_refreshes_live_jobs(self):
+        long_ago = timezone.now() - timedelta(minutes=10)
+        job = AIJob.objects.create(user=self.user, method='analyze_all', description="x", status='running',
+                                   started_at=long_ago, heartbeat_at=long_ago)
+        self.queue._live[str(job.pk)] = LiveJob()
+        self.queue.heartbeat()
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, long_ago)
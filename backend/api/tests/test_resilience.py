@@ -0,0 +1,216 @@
+"""
+Tests de la protection des appels amont : coalescence (single-flight),
+disjoncteur et caches de géocodage.
+"""
+
+import threading
+import time
+
+import requests
+from django.test import SimpleTestCase
+
+from api.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from api.services.geocode_cache import MISSING, GeocodeCache, ReverseGeocodeCache, normalize_query
+from api.services.single_flight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def run_concurrently(self, flight, fn, followers=3):
+        """Un appel meneur bloqué dans `fn`, puis des appels concurrents sur la même clé."""
+        started, release = threading.Event(), threading.Event()
+        results, errors = [], []
+
+        def leader_fn():
+            started.set()
+            release.wait(5)
+            return fn()
+
+        def call(target):
+            try:
+                results.append(flight.do('key', target))
+            except Exception as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, args=(leader_fn,))
+        leader.start()
+        started.wait(5)
+        threads = [threading.Thread(target=call, args=(self.fail,)) for _ in range(followers)]
+        for thread in threads:
+            thread.start()
+        # Laisse les suiveurs atteindre l'attente de l'appel en vol
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_result(self):
+        results, errors = self.run_concurrently(SingleFlight(), lambda: 42)
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(results), [(42, False), (42, True), (42, True), (42, True)])
+
+    def test_error_is_shared(self):
+        def fail():
+            raise ValueError("amont")
+
+        results, errors = self.run_concurrently(SingleFlight(), fail)
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["amont"] * 4)
+
+    def test_key_is_released_after_call(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), (1, False))
+        self.assertEqual(flight.do('key', lambda: 2), (2, False))
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def breaker(self, **kwargs):
+        options = dict(window=60, min_calls=4, error_rate=0.5, slow_call=5, slow_rate=0.5,
+                       open_seconds=60, min_timeout=1, max_timeout=10)
+        options.update(kwargs)
+        return CircuitBreaker('etalab', **options)
+
+    def test_opens_on_error_rate(self):
+        breaker = self.breaker()
+        for status_code in (200, 500, 200):
+            self.assertEqual(breaker.call(Response, status_code).status_code, status_code)
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.call(Response, 503)
+        self.assertEqual(breaker.state, OPEN)
+
+        calls = []
+        with self.assertRaises(CircuitOpenError) as ctx:
+            breaker.call(lambda: calls.append(1))
+        self.assertEqual(calls, [])
+        self.assertEqual(ctx.exception.upstream, 'etalab')
+        self.assertGreater(ctx.exception.retry_after, 59)
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_request_exceptions_count_as_failures(self):
+        breaker = self.breaker(min_calls=2)
+
+        def fail():
+            raise requests.exceptions.ConnectTimeout("timeout")
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                breaker.call(fail)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_other_exceptions_are_not_recorded(self):
+        breaker = self.breaker(min_calls=1)
+        with self.assertRaises(KeyError):
+            breaker.call(lambda: {}['x'])
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()['calls'], 0)
+
+    def test_opens_on_slow_calls(self):
+        breaker = self.breaker(slow_call=0)
+        for _ in range(4):
+            breaker.call(Response, 200)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_probe(self):
+        breaker = self.breaker(min_calls=1, open_seconds=0)
+        breaker.call(Response, 500)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Essai en échec : nouvelle ouverture
+        breaker.call(Response, 500)
+        self.assertEqual(breaker.stats()['opened'], 2)
+        # Essai réussi : fermeture
+        breaker.call(Response, 200)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()['window_calls'], 0)
+
+    def test_single_probe_in_flight(self):
+        breaker = self.breaker(min_calls=1, open_seconds=0)
+        breaker.call(Response, 500)
+        errors = []
+
+        def probe():
+            try:
+                breaker.call(Response, 200)
+            except CircuitOpenError as e:
+                errors.append(e)
+            return Response(200)
+
+        breaker.call(probe)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_adaptive_timeout(self):
+        breaker = self.breaker(min_timeout=1, max_timeout=10)
+        self.assertEqual(breaker.timeout(), 10)
+        breaker.call(Response, 200)
+        # Appels rapides : timeout ramené au minimum
+        self.assertEqual(breaker.timeout(), 1)
+
+    def test_from_settings(self):
+        with self.settings(UPSTREAM_BREAKER_MIN_CALLS=7, UPSTREAM_TIMEOUT_MAX=12):
+            breaker = CircuitBreaker.from_settings('adresse')
+        self.assertEqual((breaker.name, breaker.min_calls, breaker.max_timeout), ('adresse', 7, 12))
+
+
+def address(label):
+    return {'label': label, 'lat': 48.85, 'lon': 2.35}
+
+
+class GeocodeCacheTests(SimpleTestCase):
+
+    def test_normalized_exact_hit(self):
+        cache = GeocodeCache()
+        cache.set("12 Rue de l'Église", 5, [address("12 Rue de l'Église 75001 Paris")])
+        self.assertEqual(normalize_query("  12 RUE  de l'église "), "12 rue de l eglise")
+        self.assertEqual(len(cache.get("12 rue de l eglise", 5)), 1)
+        self.assertIsNone(cache.get("12 rue de l eglise", 10))
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_prefix_reuse_of_exhaustive_results(self):
+        cache = GeocodeCache()
+        cache.set("rue de la", 5, [address("Rue de la Paix 75002 Paris"), address("Rue de la Gare 69001 Lyon")])
+        self.assertEqual(cache.get("rue de la pai", 5), [address("Rue de la Paix 75002 Paris")])
+        self.assertEqual(cache.stats()['prefix_hits'], 1)
+
+    def test_prefix_not_reused_when_truncated(self):
+        cache = GeocodeCache()
+        # Liste pleine (limit atteinte) : d'autres résultats existent peut-être côté amont
+        cache.set("rue de la", 2, [address("Rue de la Paix 75002 Paris"), address("Rue de la Gare 69001 Lyon")])
+        self.assertIsNone(cache.get("rue de la pai", 2))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_expiry_and_size_bound(self):
+        expired = GeocodeCache(ttl=-1)
+        expired.set("paris", 5, [address("Paris")])
+        self.assertIsNone(expired.get("paris", 5))
+
+        cache = GeocodeCache(max_entries=2)
+        for query in ("lyon", "nice", "lille"):
+            cache.set(query, 5, [address(query)])
+        self.assertIsNone(cache.get("lyon", 5))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+
+class ReverseGeocodeCacheTests(SimpleTestCase):
+
+    def test_nearby_points_share_a_cell(self):
+        cache = ReverseGeocodeCache(grid_meters=10)
+        lon, lat = 2.35, 48.85
+        cache.set(lon, lat, address("Paris"))
+        # ~1 m plus loin : même cellule
+        self.assertEqual(cache.get(lon + 0.00001, lat + 0.000005), address("Paris"))
+        # ~50 m plus loin : autre cellule
+        self.assertIs(cache.get(lon + 0.0007, lat), MISSING)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_empty_results_are_cached(self):
+        cache = ReverseGeocodeCache()
+        cache.set(-30.0, 40.0, None)
+        self.assertIsNone(cache.get(-30.0, 40.0))
@@ -0,0 +1,198 @@
+"""
+Tests de l'index spatial communal, des opérations géométriques et des tuiles.
+"""
+
+import math
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.services.geometry import clip_geometry, clip_ring, quantize_ring, simplify_geometry, simplify_line
+from api.services.spatial_index import CommuneIndex, GridIndex, geometry_bbox, parcel_key, ring_contains
+from api.services.tiles import build_tile, tile_bbox, tile_in_extent
+
+from .fixtures import ORIGIN, SIZE, parcel, parcel_grid, square, tile_of
+
+
+class GridIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.bboxes = np.array([
+            [0.0, 0.0, 1.0, 1.0],
+            [2.0, 2.0, 3.0, 3.0],
+            [np.nan, np.nan, np.nan, np.nan],
+            [0.5, 0.5, 2.5, 2.5],
+        ])
+        self.grid = GridIndex(self.bboxes, target_per_cell=1)
+
+    def test_query_returns_intersecting_boxes(self):
+        self.assertEqual(self.grid.query((0.1, 0.1, 0.2, 0.2)), [0])
+        self.assertEqual(self.grid.query((0.9, 0.9, 2.1, 2.1)), [0, 1, 3])
+        self.assertEqual(self.grid.query((2.8, 0.0, 3.0, 0.2)), [])
+        self.assertEqual(self.grid.query((10.0, 10.0, 11.0, 11.0)), [])
+
+    def test_extent_ignores_missing_geometries(self):
+        self.assertEqual(self.grid.extent, (0.0, 0.0, 3.0, 3.0))
+
+    def test_matches_brute_force(self):
+        rng = np.random.RandomState(1)
+        mins = rng.uniform(0, 100, size=(500, 2))
+        bboxes = np.hstack([mins, mins + rng.uniform(0, 3, size=(500, 2))])
+        grid = GridIndex(bboxes)
+        for _ in range(50):
+            x, y = rng.uniform(0, 100, size=2)
+            window = (x, y, x + 5, y + 5)
+            expected = [i for i, b in enumerate(bboxes)
+                        if b[0] <= window[2] and b[2] >= window[0] and b[1] <= window[3] and b[3] >= window[1]]
+            self.assertEqual(grid.query(window), expected)
+
+    def test_empty_index(self):
+        grid = GridIndex(np.zeros((0, 4)))
+        self.assertIsNone(grid.extent)
+        self.assertEqual(grid.query((0, 0, 1, 1)), [])
+
+
+class CommuneIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.features = parcel_grid()
+        x, y = ORIGIN
+        # Parcelle trouée (cour intérieure), au-dessus de la grille
+        self.courtyard = parcel('C', '1', x, y + 4 * SIZE, size=3 * SIZE)
+        self.courtyard['geometry']['coordinates'].append(square(x + SIZE, y + 5 * SIZE))
+        self.index = CommuneIndex(self.features + [self.courtyard])
+
+    def test_features_round_trip(self):
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.index.features[0], self.features[0])
+        self.assertEqual(self.index.features[6], self.courtyard)
+
+    def test_query_bbox(self):
+        x, y = ORIGIN
+        found = self.index.query_bbox((x + 0.1 * SIZE, y + 0.1 * SIZE, x + 1.5 * SIZE, y + 0.2 * SIZE))
+        self.assertEqual([f['properties']['numero'] for f in found], ['0001', '0002'])
+        self.assertEqual(self.index.query_bbox((0, 0, 1, 1)), [])
+
+    def test_find_containing(self):
+        x, y = ORIGIN
+        found = self.index.find_containing(x + 2.5 * SIZE, y + 1.5 * SIZE)
+        self.assertEqual(found['properties']['numero'], '0006')
+        self.assertEqual(self.index.find_containing(x + 0.5 * SIZE, y + 4.5 * SIZE), self.courtyard)
+        # Point dans la cour (trou du polygone)
+        self.assertIsNone(self.index.find_containing(x + 1.5 * SIZE, y + 5.5 * SIZE))
+        self.assertIsNone(self.index.find_containing(x - SIZE, y - SIZE))
+
+    def test_get_by_id_normalizes_key(self):
+        self.assertEqual(self.index.get_by_id('ab', '3'), self.features[2])
+        self.assertEqual(self.index.get_by_id('C', '0001'), self.courtyard)
+        self.assertIsNone(self.index.get_by_id('AB', '0099'))
+        self.assertEqual(parcel_key('c', '1'), ('0C', '0001'))
+
+    def test_section_summary(self):
+        summary = self.index.section_summary()
+        self.assertEqual([(s['section'], s['count']) for s in summary], [('AB', 6), ('C', 1)])
+        x, y = ORIGIN
+        for value, expected in zip(summary[0]['bbox'], [x, y, x + 3 * SIZE, y + 2 * SIZE]):
+            self.assertAlmostEqual(value, expected)
+
+    def test_within_distance(self):
+        parts = [[np.asarray(square(*ORIGIN))]]
+        found = dict(self.index.within_distance(parts, 1.0))
+        # Parcelle elle-même et ses voisines contiguës (côté ou coin)
+        self.assertEqual(sorted(found), [0, 1, 3, 4])
+        self.assertAlmostEqual(found[1], 0.0, places=3)
+        # Trois côtés (~167 m en latitude) jusqu'à la parcelle trouée
+        self.assertNotIn(6, found)
+        self.assertAlmostEqual(dict(self.index.within_distance(parts, 200.0))[6], 3 * SIZE * 111_320, delta=1)
+
+    def test_ring_contains_and_bbox(self):
+        ring = np.asarray(square(0, 0, 1))
+        self.assertTrue(ring_contains(ring, 0.5, 0.5))
+        self.assertFalse(ring_contains(ring, 1.5, 0.5))
+        self.assertEqual(list(geometry_bbox(self.courtyard['geometry'])[:2]),
+                         self.courtyard['geometry']['coordinates'][0][0])
+        self.assertIsNone(geometry_bbox(None))
+        self.assertIsNone(geometry_bbox({'type': 'Polygon', 'coordinates': []}))
+
+
+class GeometryTests(SimpleTestCase):
+
+    def test_simplify_line_drops_collinear_vertices(self):
+        ring = np.array([[0, 0], [0.5, 0], [1, 0], [1, 0.5], [1, 1], [0.5, 1.0001], [0, 1], [0, 0]], dtype=float)
+        self.assertEqual(simplify_line(ring, 0.01).tolist(), [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+        # Tolérance plus fine que l'écart : le sommet est conservé
+        self.assertEqual(len(simplify_line(ring, 1e-5)), 6)
+
+    def test_simplify_geometry_keeps_degenerate_rings(self):
+        geometry = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [0, 0]]]}
+        self.assertEqual(simplify_geometry(geometry, 0.5), geometry)
+        point = {'type': 'Point', 'coordinates': [1, 2]}
+        self.assertEqual(simplify_geometry(point, 0.5), point)
+        self.assertIsNone(simplify_geometry(None, 0.5))
+
+    def test_simplify_geometry_never_collapses_small_polygons(self):
+        geometry = {'type': 'MultiPolygon', 'coordinates': [[square(0, 0, 1e-6)], [square(1, 1, 1)]]}
+        simplified = simplify_geometry(geometry, 0.1)
+        self.assertEqual(simplified['type'], 'MultiPolygon')
+        self.assertEqual(simplified['coordinates'][0][0], square(0, 0, 1e-6))
+
+    def test_quantize_ring(self):
+        ring = np.array([[0.123456, 0.0], [0.123457, 0.0], [1.0, 0.0], [1.0, 1.0], [0.123456, 0.0]])
+        self.assertEqual(quantize_ring(ring, 3).tolist(), [[0.123, 0.0], [1.0, 0.0], [1.0, 1.0], [0.123, 0.0]])
+        geometry = simplify_geometry({'type': 'Polygon', 'coordinates': [square(0.123456, 0.654321, 1)]}, 0, 2)
+        self.assertEqual(geometry['coordinates'][0][0], [0.12, 0.65])
+
+    def test_clip_ring(self):
+        clipped = clip_ring(square(0, 0, 2), (1, 1, 3, 3))
+        self.assertEqual(sorted(map(tuple, clipped[:-1])), [(1, 1), (1, 2), (2, 1), (2, 2)])
+        self.assertEqual(clipped[0], clipped[-1])
+        self.assertEqual(clip_ring(square(0, 0, 1), (5, 5, 6, 6)), [])
+
+    def test_clip_geometry(self):
+        geometry = {'type': 'MultiPolygon', 'coordinates': [[square(0, 0, 1)], [square(5, 5, 1)]]}
+        clipped = clip_geometry(geometry, (-1, -1, 2, 2))
+        self.assertEqual(clipped, {'type': 'Polygon', 'coordinates': [square(0, 0, 1)]})
+        self.assertIsNone(clip_geometry(geometry, (10, 10, 11, 11)))
+
+
+class TileTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = CommuneIndex(parcel_grid())
+        self.z = 17
+        x, y = ORIGIN
+        self.x, self.y = tile_of(x + SIZE, y + SIZE, self.z)
+
+    def test_tile_bbox(self):
+        minx, miny, maxx, maxy = tile_bbox(0, 0, 0)
+        self.assertEqual((minx, maxx), (-180.0, 180.0))
+        self.assertAlmostEqual(maxy, 85.0511, places=4)
+        self.assertAlmostEqual(miny, -85.0511, places=4)
+        minx, miny, maxx, maxy = tile_bbox(self.z, self.x, self.y)
+        self.assertTrue(minx <= ORIGIN[0] + SIZE <= maxx and miny <= ORIGIN[1] + SIZE <= maxy)
+
+    def test_tile_in_extent(self):
+        self.assertTrue(tile_in_extent(self.index, self.z, self.x, self.y))
+        self.assertFalse(tile_in_extent(self.index, self.z, self.x + 10, self.y))
+        self.assertFalse(tile_in_extent(CommuneIndex([]), self.z, self.x, self.y))
+
+    def test_build_tile_clips_to_buffered_tile(self):
+        minx, miny, maxx, maxy = tile_bbox(self.z, self.x, self.y)
+        margin = (maxx - minx) / 256 * 4 + 1e-12
+        tile = build_tile(self.index, self.z, self.x, self.y)
+        self.assertTrue(tile['features'])
+        for feature in tile['features']:
+            ring = feature['geometry']['coordinates'][0]
+            for lon, lat in ring:
+                self.assertTrue(minx - margin <= lon <= maxx + margin)
+                self.assertTrue(miny - margin * 2 <= lat <= maxy + margin * 2)
+            self.assertIn(feature['id'], {f['id'] for f in parcel_grid()})
+
+    def test_low_zoom_tile_contains_whole_commune(self):
+        x, y = tile_of(*ORIGIN, 10)
+        tile = build_tile(self.index, 10, x, y)
+        self.assertEqual(len(tile['features']), 6)
+        # Un demi-pixel à z10 (~76 m) dépasse une parcelle : les anneaux restent valides
+        for feature in tile['features']:
+            self.assertGreaterEqual(len(feature['geometry']['coordinates'][0]), 4)
+            self.assertFalse(any(math.isnan(v) for p in feature['geometry']['coordinates'][0] for v in p))
@@ -0,0 +1,194 @@
+"""
+Tests des chemins d'erreur des vues (400, 404, 502, 503), le service
+cadastral et la file des jobs IA étant remplacés par des doubles.
+"""
+
+import gzip
+import os
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api import views
+from api.services.ai_jobs import AIJobQueueFull
+from api.services.circuit_breaker import CircuitOpenError
+
+from .fixtures import parcel, temp_dir
+
+CODE_INSEE = '75056'
+
+
+class CadastreViewErrorTests(APITestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, 'cadastre_service')
+        self.service = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_code_insee(self):
+        for url in (reverse('cadastre_parcelle_detail', args=['7505X', 'AB', '1']),
+                    reverse('cadastre_sections', args=['..%2F..']),
+                    reverse('cadastre_parcelles_bbox', args=['123456'])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json(), {"error": "Code INSEE invalide"})
+        self.service.get_parcelle_by_id.assert_not_called()
+
+    def test_bbox_params(self):
+        url = reverse('cadastre_parcelles_bbox', args=[CODE_INSEE])
+        self.assertEqual(self.client.get(url, {'minx': 2.3, 'miny': 48.8}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'minx': 'a', 'miny': 1, 'maxx': 2, 'maxy': 3}).status_code, 400)
+        response = self.client.get(url, {'minx': 2.4, 'miny': 48.8, 'maxx': 2.3, 'maxy': 48.9})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Emprise invalide", response.json()['error'])
+        self.service.get_parcelles_bbox.assert_not_called()
+
+    def test_coordinates_params(self):
+        for url in (reverse('cadastre_reverse'), reverse('cadastre_parcelle_coords')):
+            for params in ({}, {'lat': 'nan', 'lon': 2.35}, {'lat': 48.85, 'lon': 'inf'},
+                           {'lat': 91, 'lon': 2.35}, {'lat': 48.85, 'lon': 'abc'}):
+                self.assertEqual(self.client.get(url, params).status_code, 400, (url, params))
+        self.service.reverse_geocode.assert_not_called()
+        self.service.get_parcelle_by_coordinates.assert_not_called()
+
+    def test_search_requires_code_insee(self):
+        self.assertEqual(self.client.get(reverse('cadastre_search')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('cadastre_search'), {'code_insee': 'abc'}).status_code, 400)
+
+    def test_neighbourhood_radius(self):
+        url = reverse('cadastre_parcelle_neighbourhood', args=[CODE_INSEE, 'AB', '1'])
+        for radius in ('-1', 'loin', '100000'):
+            self.assertEqual(self.client.get(url, {'radius': radius}).status_code, 400, radius)
+        self.service.get_parcelle_neighbourhood.assert_not_called()
+
+    def test_not_found(self):
+        self.service.get_parcelle_by_id.return_value = None
+        self.service.reverse_geocode.return_value = None
+        self.service.get_parcelle_by_coordinates.return_value = None
+        self.service.get_parcelle_neighbourhood.return_value = None
+
+        response = self.client.get(reverse('cadastre_parcelle_detail', args=[CODE_INSEE, 'AB', '1']))
+        self.assertEqual((response.status_code, response.json()), (404, {"error": "Parcelle non trouvée"}))
+        coords = {'lat': 48.85, 'lon': 2.35}
+        self.assertEqual(self.client.get(reverse('cadastre_reverse'), coords).status_code, 404)
+        self.assertEqual(self.client.get(reverse('cadastre_parcelle_coords'), coords).status_code, 404)
+        url = reverse('cadastre_parcelle_neighbourhood', args=[CODE_INSEE, 'AB', '1'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.service.reverse_geocode.assert_called_once_with(2.35, 48.85)
+
+    def test_found(self):
+        feature = parcel('AB', '0001', 2.35, 48.85)
+        self.service.get_parcelle_by_id.return_value = feature
+        response = self.client.get(reverse('cadastre_parcelle_detail', args=['75056', 'AB', '1']))
+        self.assertEqual((response.status_code, response.json()), (200, feature))
+
+    def test_open_circuit_is_503_with_retry_after(self):
+        self.service.get_parcelle_by_id.side_effect = CircuitOpenError('etalab', 12.3)
+        self.service.search_parcelles.side_effect = CircuitOpenError('etalab', 0.2)
+
+        response = self.client.get(reverse('cadastre_parcelle_detail', args=[CODE_INSEE, 'AB', '1']))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '13')
+        self.assertIn("etalab", response.json()['error'])
+        response = self.client.get(reverse('cadastre_search'), {'code_insee': CODE_INSEE})
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+    def test_upstream_error_is_502(self):
+        self.service.get_parcelles_bbox.side_effect = requests.exceptions.ConnectionError("etalab")
+        url = reverse('cadastre_parcelles_bbox', args=[CODE_INSEE])
+        response = self.client.get(url, {'minx': 2.3, 'miny': 48.8, 'maxx': 2.4, 'maxy': 48.9})
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(response.has_header('Retry-After'))
+
+
+class CadastreTileViewTests(APITestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, 'cadastre_service')
+        self.service = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(temp_dir(self), 'tile.json.gz')
+        with gzip.open(self.path, 'wt') as f:
+            f.write('{"type": "FeatureCollection", "features": []}')
+
+    def url(self, layer='parcelles', z=17, x=66607, y=45110):
+        return reverse('cadastre_tile', args=[layer, z, x, y])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url(layer='routes'), {'code_insee': CODE_INSEE}).status_code, 404)
+        self.assertEqual(self.client.get(self.url()).status_code, 400)
+        with self.settings(CADASTRE_TILE_MIN_ZOOM=13, CADASTRE_TILE_MAX_ZOOM=20):
+            self.assertEqual(self.client.get(self.url(z=5, x=1, y=1), {'code_insee': CODE_INSEE}).status_code, 400)
+            self.assertEqual(self.client.get(self.url(z=21), {'code_insee': CODE_INSEE}).status_code, 400)
+        self.assertEqual(self.client.get(self.url(z=13, x=2 ** 13), {'code_insee': CODE_INSEE}).status_code, 400)
+        self.service.get_tile.assert_not_called()
+
+    def test_tile_outside_commune(self):
+        self.service.get_tile.return_value = None
+        self.assertEqual(self.client.get(self.url(), {'code_insee': CODE_INSEE}).status_code, 404)
+
+    def test_open_circuit(self):
+        self.service.get_tile.side_effect = CircuitOpenError('etalab', 30)
+        response = self.client.get(self.url(), {'code_insee': CODE_INSEE})
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '30'))
+
+    def test_etag_revalidation(self):
+        self.service.get_tile.return_value = (self.path, 'v1')
+        response = self.client.get(self.url(), {'code_insee': CODE_INSEE})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'{"type": "FeatureCollection", "features": []}')
+        etag = response['ETag']
+
+        response = self.client.get(self.url(), {'code_insee': CODE_INSEE}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Nouvelle version du fichier communal : tuile renvoyée
+        self.service.get_tile.return_value = (self.path, 'v2')
+        response = self.client.get(self.url(), {'code_insee': CODE_INSEE}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class AIJobViewTests(APITestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, 'ai_job_queue')
+        self.queue = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('marie', 'marie@example.com', 'secret')
+        self.client.force_authenticate(self.user)
+
+    def test_authentication_required(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('ai_jobs'), {'method': 'analyze_all', 'description': "Véranda"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_requests(self):
+        response = self.client.post(reverse('ai_jobs'), {'method': 'rm -rf', 'description': "Véranda"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('ai_jobs'), {'method': 'analyze_all'})
+        self.assertEqual((response.status_code, response.json()), (400, {"error": "Description requise"}))
+        self.queue.enqueue.assert_not_called()
+
+    def test_full_queue_is_503_with_retry_after(self):
+        self.queue.enqueue.side_effect = AIJobQueueFull(1.5)
+        response = self.client.post(reverse('ai_jobs'), {'method': 'analyze_all', 'description': "Véranda"})
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '2'))
+
+    def test_accepted(self):
+        self.queue.enqueue.return_value = mock.Mock(pk='6f0c1f9e-8a4b-4a55-9d0a-3f1b2c3d4e5f', status='pending')
+        response = self.client.post(reverse('ai_jobs'), {'method': 'analyze_all', 'description': "Véranda"},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['stream_url'],
+                         '/api/ai/jobs/6f0c1f9e-8a4b-4a55-9d0a-3f1b2c3d4e5f/stream/')
+
+    def test_unknown_job(self):
+        job_id = '6f0c1f9e-8a4b-4a55-9d0a-3f1b2c3d4e5f'
+        self.assertEqual(self.client.get(reverse('ai_job_detail', args=[job_id])).status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('ai_job_stream', args=[job_id])).status_code, 401)
+        self.assertEqual(self.client.get(reverse('ai_job_stream', args=[job_id]), {'token': 'invalide'}).status_code,
+                         401)
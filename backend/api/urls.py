@@ -1,11 +1,17 @@
 from django.urls import path
+from . import async_views
 from .views import (
     RegisterView, LoginView, CerfaSessionView, CerfaSessionListView,
     DossierListCreateView, DossierDetailView, AdminStatsView, ActivityLogView,
-    CadastreParcellesView, CadastreBatimentsView, CadastreParcelleDetailView,
-    CadastreGeocodeView, CadastreSectionsView, CadastreSearchView,
+    CadastreParcellesView, CadastreParcellesBBoxView, CadastreBatimentsView, CadastreParcelleDetailView,
+    CadastreParcelleNeighbourhoodView, CadastreParcellePlanView, DossierPlanView, DossierPdfView,
+    CadastreGeocodeView, CadastreSectionsView, CadastreSearchView, CadastreParcelleByCoordinatesView,
+    CadastreTileView, CadastreCommuneBundleView, CadastreReverseGeocodeView,
+    CadastreGeocodeBatchView,
     AdminNotificationListView, AdminNotificationMarkReadView, AdminUserListView,
-    AIAnalyzeProjectView, AISuggestDocumentsView, AIConfigureProjectView
+    AdminCadastreStatsView, AdminAIStatsView,
+    AIAnalyzeProjectView, AIAnalyzeAllView, AISuggestDocumentsView, AIConfigureProjectView,
+    AIJobCreateView, AIJobDetailView, ai_job_stream
 )
 
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -19,26 +25,49 @@ urlpatterns = [
     path('admin/sessions/', CerfaSessionListView.as_view(), name='admin_sessions'),
     path('dossiers/', DossierListCreateView.as_view(), name='dossiers'),
     path('dossiers/<int:pk>/', DossierDetailView.as_view(), name='dossier_detail'),
+    path('dossiers/<int:pk>/plan/', DossierPlanView.as_view(), name='dossier_plan'),
+    path('dossiers/<int:pk>/pdf/', DossierPdfView.as_view(), name='dossier_pdf'),
     
     path('stats/', AdminStatsView.as_view(), name='stats'),
     path('activity/', ActivityLogView.as_view(), name='activity'),
     
     # Cadastre API - API officielle cadastre.gouv.fr
     path('cadastre/parcelles/<str:code_insee>/', CadastreParcellesView.as_view(), name='cadastre_parcelles'),
+    path('cadastre/parcelles/<str:code_insee>/bbox/', CadastreParcellesBBoxView.as_view(), name='cadastre_parcelles_bbox'),
     path('cadastre/batiments/<str:code_insee>/', CadastreBatimentsView.as_view(), name='cadastre_batiments'),
+    path('cadastre/parcelle/coords/', CadastreParcelleByCoordinatesView.as_view(), name='cadastre_parcelle_coords'),
     path('cadastre/parcelle/<str:code_insee>/<str:section>/<str:numero>/', CadastreParcelleDetailView.as_view(), name='cadastre_parcelle_detail'),
+    path('cadastre/parcelle/<str:code_insee>/<str:section>/<str:numero>/neighbourhood/', CadastreParcelleNeighbourhoodView.as_view(), name='cadastre_parcelle_neighbourhood'),
+    path('cadastre/parcelle/<str:code_insee>/<str:section>/<str:numero>/plan/', CadastreParcellePlanView.as_view(), name='cadastre_parcelle_plan'),
+    path('cadastre/commune/<str:code_insee>/bundle/', CadastreCommuneBundleView.as_view(), name='cadastre_commune_bundle'),
+    path('cadastre/tiles/<str:layer>/<int:z>/<int:x>/<int:y>/', CadastreTileView.as_view(), name='cadastre_tile'),
     path('cadastre/geocode/', CadastreGeocodeView.as_view(), name='cadastre_geocode'),
+    path('cadastre/geocode/batch/', CadastreGeocodeBatchView.as_view(), name='cadastre_geocode_batch'),
+    path('cadastre/reverse/', CadastreReverseGeocodeView.as_view(), name='cadastre_reverse'),
     path('cadastre/sections/<str:code_insee>/', CadastreSectionsView.as_view(), name='cadastre_sections'),
     path('cadastre/search/', CadastreSearchView.as_view(), name='cadastre_search'),
     
+    # Cadastre API - variantes asynchrones (déploiement ASGI)
+    path('async/cadastre/geocode/', async_views.geocode, name='async_cadastre_geocode'),
+    path('async/cadastre/reverse/', async_views.reverse_geocode, name='async_cadastre_reverse'),
+    path('async/cadastre/search/', async_views.search, name='async_cadastre_search'),
+    path('async/cadastre/parcelle/coords/', async_views.parcelle_by_coordinates, name='async_cadastre_parcelle_coords'),
+    path('async/cadastre/parcelle/<str:code_insee>/<str:section>/<str:numero>/', async_views.parcelle_detail, name='async_cadastre_parcelle_detail'),
+    
     path('admin/notifications/', AdminNotificationListView.as_view(), name='admin_notifications'),
     path('admin/notifications/mark-read/', AdminNotificationMarkReadView.as_view(), name='admin_notifications_mark_read'),
     path('admin/users/', AdminUserListView.as_view(), name='admin_users'),
+    path('admin/cadastre/stats/', AdminCadastreStatsView.as_view(), name='admin_cadastre_stats'),
+    path('admin/ai/stats/', AdminAIStatsView.as_view(), name='admin_ai_stats'),
     
     # AI API
     path('ai/analyze-project/', AIAnalyzeProjectView.as_view(), name='ai_analyze'),
+    path('ai/analyze-all/', AIAnalyzeAllView.as_view(), name='ai_analyze_all'),
     path('ai/suggest-documents/', AISuggestDocumentsView.as_view(), name='ai_suggest_docs'),
     path('ai/configure-project/', AIConfigureProjectView.as_view(), name='ai_configure_project'),
+    path('ai/jobs/', AIJobCreateView.as_view(), name='ai_jobs'),
+    path('ai/jobs/<uuid:job_id>/', AIJobDetailView.as_view(), name='ai_job_detail'),
+    path('ai/jobs/<uuid:job_id>/stream/', ai_job_stream, name='ai_job_stream'),
 ]
 
 
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from core.models import CerfaSession, Dossier, ActivityLog, AdminNotification, Profile
+from core.models import CerfaSession, Dossier, ActivityLog, AdminNotification, Profile, AIJob
 from .serializers import (
     UserSerializer, RegisterSerializer, 
     CerfaSessionSerializer, CerfaSessionAdminSerializer,
@@ -14,6 +14,12 @@ from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .services.ai_service import AIService
+from .services.ai_cache import ai_response_cache
+from .services.dp_rules import dp_rules
+from .services.pdf_jobs import pdf_job_queue, dossier_pdf_path
+from .services.ai_jobs import (
+    ai_job_queue, AIJobQueueFull, METHODS as AI_JOB_METHODS, token_user_id, stream_token, last_event_offset,
+)
 
 
 class IsAdminRole(permissions.BasePermission):
@@ -128,12 +134,67 @@ class DossierListCreateView(generics.ListCreateAPIView):
             ip_address=self.request.META.get('REMOTE_ADDR')
         )
 
+        # PDF assemblé en tâche de fond : la réponse n'attend pas la génération
+        pdf_job_queue.enqueue(dossier)
+
 class DossierDetailView(generics.RetrieveAPIView):
     serializer_class = DossierSerializer
     
     def get_queryset(self):
         return Dossier.objects.filter(user=self.request.user)
 
+class DossierPlanView(APIView):
+    """
+    Plan de situation (DP1) d'un dossier, régénéré depuis ses données.
+    GET /api/dossiers/{pk}/plan/?type=svg|png&scale=
+
+    Accessible au propriétaire du dossier et aux administrateurs.
+    """
+
+    def get(self, request, pk):
+        dossiers = Dossier.objects.all()
+        if not IsAdminRole().has_permission(request, self):
+            dossiers = dossiers.filter(user=request.user)
+        dossier = dossiers.filter(pk=pk).first()
+        if dossier is None:
+            return Response({"error": "Dossier non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = dossier.data or {}
+        reference = dossier_parcel_reference(data)
+        if reference is None:
+            return Response(
+                {"error": "Référence cadastrale du dossier incomplète"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return plan_response(request, *reference, data)
+
+class DossierPdfView(APIView):
+    """
+    PDF du dossier (CERFA et pièces jointes), généré en tâche de fond.
+    GET /api/dossiers/{pk}/pdf/
+
+    Accessible au propriétaire du dossier et aux administrateurs ; répond
+    202 avec l'état du job tant que le PDF n'est pas prêt.
+    """
+
+    def get(self, request, pk):
+        dossiers = Dossier.objects.all()
+        if not IsAdminRole().has_permission(request, self):
+            dossiers = dossiers.filter(user=request.user)
+        dossier = dossiers.filter(pk=pk).first()
+        if dossier is None:
+            return Response({"error": "Dossier non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        path = dossier_pdf_path(dossier.pk)
+        if os.path.exists(path):
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"dossier_{dossier.pk}.pdf",
+                                content_type='application/pdf')
+
+        job = dossier.pdf_jobs.order_by('-created_at').first()
+        if job is not None and job.status in ('pending', 'running'):
+            return Response({"status": job.status}, status=status.HTTP_202_ACCEPTED)
+        return Response({"error": "PDF non disponible"}, status=status.HTTP_404_NOT_FOUND)
+
 class AdminStatsView(APIView):
     permission_classes = [IsAdminRole]
 
@@ -235,7 +296,8 @@ class AdminStatsView(APIView):
             "byType": dict(by_type),
             "byNature": dict(by_nature),
             "weekly": weekly,
-            "monthly": monthly
+            "monthly": monthly,
+            "pdfJobs": pdf_job_queue.stats()
         })
 
 class ActivityLogView(generics.ListAPIView):
@@ -250,49 +312,328 @@ class ActivityLogView(generics.ListAPIView):
 # CADASTRE API VIEWS - API officielle .gouv.fr
 # ============================================
 
-from .services.cadastre_service import cadastre_service
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.urls import reverse
+from django.conf import settings
+from .services.cadastre_service import cadastre_service, parse_coordinates
+from .services.plan_renderer import plan_renderer, dossier_parcel_reference, FORMATS as PLAN_FORMATS
+from .services.cadastre_cache import iter_file, is_valid_code_insee
+from .services.circuit_breaker import CircuitOpenError
+import csv
+import io
+import itertools
+import json
 import logging
+import math
+import os
+import zlib
 
 logger = logging.getLogger(__name__)
 
 
+def upstream_error_response(error, message):
+    """
+    Réponse d'erreur d'un appel amont.
+
+    503 avec en-tête Retry-After si le disjoncteur du service est ouvert
+    (échec immédiat), 502 sinon.
+    """
+    if isinstance(error, CircuitOpenError):
+        response = Response(
+            {"error": f"{message} : service {error.upstream} temporairement indisponible"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+        return response
+    return Response({"error": message}, status=status.HTTP_502_BAD_GATEWAY)
+
+
+def invalid_code_insee_response(code_insee):
+    """Réponse 400 si le code INSEE (complété à 5 caractères) est invalide, sinon None."""
+    if is_valid_code_insee(code_insee.zfill(5)):
+        return None
+    return Response({"error": "Code INSEE invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+
+
+def gzip_file_response(request, path, size=None):
+    """
+    Diffuse un fichier gzip par blocs, sans parsing JSON.
+
+    Les octets gzip sont transmis tels quels (Content-Encoding: gzip) si le
+    client les accepte, sinon décompressés à la volée.
+    """
+    compressed = accepts_gzip(request)
+    response = StreamingHttpResponse(
+        iter_file(path, compressed=compressed),
+        content_type='application/json'
+    )
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+        if size is not None:
+            response['Content-Length'] = str(size)
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def gzip_stream(chunks, level=6):
+    """Compresse à la volée un flux d'octets au format gzip."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def parse_simplify_params(request):
+    """
+    Lit les options `simplify` (tolérance en degrés) et `precision` (décimales).
+
+    Returns:
+        Tuple (tolerance, precision) ; (0.0, None) si aucune option n'est demandée
+
+    Raises:
+        ValueError: Si une option est invalide
+    """
+    tolerance = float(request.query_params.get('simplify') or 0)
+    precision = request.query_params.get('precision')
+    precision = int(precision) if precision not in (None, '') else None
+    if not math.isfinite(tolerance) or tolerance < 0 or (precision is not None and not 0 <= precision <= 15):
+        raise ValueError("simplify/precision out of range")
+    return tolerance, precision
+
+
+def stream_commune_layer(request, layer, code_insee):
+    """
+    Diffuse une couche communale (voir gzip_file_response).
+
+    Sans option, le fichier en cache est transmis tel quel ; avec `simplify`
+    ou `precision`, la variante correspondante (calculée une seule fois) l'est.
+    """
+    invalid = invalid_code_insee_response(code_insee)
+    if invalid:
+        return invalid
+    try:
+        tolerance, precision = parse_simplify_params(request)
+    except ValueError:
+        return Response(
+            {"error": "Paramètres 'simplify' (>= 0) et 'precision' (0 à 15) invalides"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if tolerance > 0 or precision is not None:
+        path = cadastre_service.get_simplified_layer(layer, code_insee, tolerance, precision)
+        if path is None:
+            return Response({"type": "FeatureCollection", "features": []})
+        return gzip_file_response(request, path, os.path.getsize(path))
+
+    entry = cadastre_service.fetch_commune_layer(layer, code_insee)
+    if entry is None:
+        return Response({"type": "FeatureCollection", "features": []})
+    return gzip_file_response(request, entry['path'], entry['size'])
+
+
 class CadastreParcellesView(APIView):
     """
     Récupère les parcelles cadastrales d'une commune.
-    GET /api/cadastre/parcelles/{code_insee}/
+    GET /api/cadastre/parcelles/{code_insee}/?simplify={tolerance}&precision={digits}
+
+    Le fichier communal est diffusé tel quel depuis le cache disque ; les
+    options `simplify` et `precision` servent une variante allégée.
     """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, code_insee):
         try:
-            data = cadastre_service.get_parcelles_commune(code_insee)
-            return Response(data)
+            return stream_commune_layer(request, 'parcelles', code_insee)
         except Exception as e:
             logger.error(f"Error fetching parcelles: {e}")
+            return upstream_error_response(e, "Impossible de récupérer les parcelles cadastrales")
+
+
+class CadastreParcellesBBoxView(APIView):
+    """
+    Récupère les parcelles d'une commune visibles dans une emprise (viewport).
+    GET /api/cadastre/parcelles/{code_insee}/bbox/?minx=&miny=&maxx=&maxy=
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, code_insee):
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
+        try:
+            bbox = tuple(
+                float(request.query_params[key])
+                for key in ('minx', 'miny', 'maxx', 'maxy')
+            )
+        except (KeyError, ValueError):
             return Response(
-                {"error": "Impossible de récupérer les parcelles cadastrales"},
-                status=status.HTTP_502_BAD_GATEWAY
+                {"error": "Paramètres 'minx', 'miny', 'maxx' et 'maxy' requis (nombres)"},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return Response(
+                {"error": "Emprise invalide (minx > maxx ou miny > maxy)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            data = cadastre_service.get_parcelles_bbox(code_insee, bbox)
+            return Response(data)
+        except Exception as e:
+            logger.error(f"Error fetching parcelles bbox: {e}")
+            return upstream_error_response(e, "Impossible de récupérer les parcelles cadastrales")
 
 
 class CadastreBatimentsView(APIView):
     """
     Récupère les bâtiments cadastraux d'une commune.
-    GET /api/cadastre/batiments/{code_insee}/
+    GET /api/cadastre/batiments/{code_insee}/?simplify={tolerance}&precision={digits}
+
+    Le fichier communal est diffusé tel quel depuis le cache disque ; les
+    options `simplify` et `precision` servent une variante allégée.
     """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, code_insee):
         try:
-            data = cadastre_service.get_batiments_commune(code_insee)
-            return Response(data)
+            return stream_commune_layer(request, 'batiments', code_insee)
         except Exception as e:
             logger.error(f"Error fetching batiments: {e}")
+            return upstream_error_response(e, "Impossible de récupérer les bâtiments")
+
+
+class CadastreTileView(APIView):
+    """
+    Récupère une tuile GeoJSON (XYZ web-mercator) d'une couche cadastrale.
+    GET /api/cadastre/tiles/{layer}/{z}/{x}/{y}/?code_insee={code}
+
+    `layer` vaut 'parcelles' ou 'batiments'. Les géométries sont simplifiées
+    selon le zoom et découpées sur l'emprise de la tuile.
+
+    Tuiles par commune : une tuile ne contient que les entités de la commune
+    `code_insee`, et est vide là où elle déborde sur une commune voisine.
+    Une carte couvrant plusieurs communes superpose une couche de tuiles
+    par commune. Les tuiles hors de l'emprise de la commune valent 404.
+
+    L'ETag porte la version du fichier communal : après un rafraîchissement
+    de la commune, la revalidation (If-None-Match) renvoie la nouvelle tuile.
+    """
+    permission_classes = [permissions.AllowAny]
+    LAYERS = ('parcelles', 'batiments')
+    CACHE_MAX_AGE = 3600
+
+    def get(self, request, layer, z, x, y):
+        if layer not in self.LAYERS:
+            return Response({"error": "Couche inconnue"}, status=status.HTTP_404_NOT_FOUND)
+
+        code_insee = request.query_params.get('code_insee', '')
+        if not code_insee:
+            return Response(
+                {"error": "Paramètre 'code_insee' requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
+        if not settings.CADASTRE_TILE_MIN_ZOOM <= z <= settings.CADASTRE_TILE_MAX_ZOOM:
+            return Response(
+                {"error": f"Zoom hors limites ({settings.CADASTRE_TILE_MIN_ZOOM}-{settings.CADASTRE_TILE_MAX_ZOOM})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return Response({"error": "Tuile invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            tile = cadastre_service.get_tile(layer, code_insee, z, x, y)
+        except Exception as e:
+            logger.error(f"Error building tile {layer}/{z}/{x}/{y}: {e}")
+            return upstream_error_response(e, "Impossible de générer la tuile cadastrale")
+        if tile is None:
+            return Response(
+                {"error": "Tuile hors de l'emprise de la commune ou commune introuvable"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        path, version = tile
+        etag = f'W/"{code_insee.zfill(5)}-{version}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = gzip_file_response(request, path, os.path.getsize(path))
+        response['ETag'] = etag
+        response['Cache-Control'] = f"public, max-age={self.CACHE_MAX_AGE}"
+        return response
+
+
+class CadastreCommuneBundleView(APIView):
+    """
+    Récupère en une seule réponse plusieurs couches d'une commune.
+    GET /api/cadastre/commune/{code_insee}/bundle/?layers=parcelles,batiments,sections
+
+    Les couches sont récupérées en parallèle ; les fichiers GeoJSON en cache
+    sont insérés dans la réponse sans être re-parsés. Une couche en échec
+    vaut null et son erreur figure dans la clé 'errors'.
+    """
+    permission_classes = [permissions.AllowAny]
+    LAYERS = ('parcelles', 'batiments', 'sections')
+    EMPTY_COLLECTION = b'{"type":"FeatureCollection","features":[]}'
+
+    def get(self, request, code_insee):
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
+        layers = [l for l in request.query_params.get('layers', ','.join(self.LAYERS)).split(',') if l]
+        unknown = [l for l in layers if l not in self.LAYERS]
+        if not layers or unknown:
+            return Response(
+                {"error": f"Paramètre 'layers' invalide (valeurs possibles : {', '.join(self.LAYERS)})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        layers = list(dict.fromkeys(layers))
+
+        try:
+            results, errors = cadastre_service.get_commune_bundle(code_insee, layers)
+        except CircuitOpenError as e:
+            return upstream_error_response(e, "Impossible de récupérer les données cadastrales")
+        if len(errors) == len(layers):
             return Response(
-                {"error": "Impossible de récupérer les bâtiments"},
+                {"error": "Impossible de récupérer les données cadastrales", "errors": errors},
                 status=status.HTTP_502_BAD_GATEWAY
             )
 
+        # Ouvrir les fichiers avant de commencer la diffusion
+        parts = []
+        for layer in layers:
+            if layer in errors:
+                parts.append([b'null'])
+            elif layer == 'sections':
+                parts.append([json.dumps(results[layer]).encode()])
+            elif results[layer] is None:
+                parts.append([self.EMPTY_COLLECTION])
+            else:
+                parts.append(iter_file(results[layer]['path'], compressed=False))
+
+        def chunks():
+            yield b'{'
+            for i, (layer, part) in enumerate(zip(layers, parts)):
+                yield (b',' if i else b'') + json.dumps(layer).encode() + b':'
+                yield from part
+            yield b',"errors":' + json.dumps(errors).encode() + b'}'
+
+        if accepts_gzip(request):
+            response = StreamingHttpResponse(gzip_stream(chunks()), content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(chunks(), content_type='application/json')
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
 
 class CadastreParcelleDetailView(APIView):
     """
@@ -302,6 +643,9 @@ class CadastreParcelleDetailView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, code_insee, section, numero):
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
         try:
             parcelle = cadastre_service.get_parcelle_by_id(code_insee, section, numero)
             if parcelle:
@@ -312,11 +656,98 @@ class CadastreParcelleDetailView(APIView):
             )
         except Exception as e:
             logger.error(f"Error fetching parcelle: {e}")
+            return upstream_error_response(e, "Erreur lors de la recherche de parcelle")
+
+
+class CadastreParcelleNeighbourhoodView(APIView):
+    """
+    Récupère une parcelle, ses parcelles contiguës et voisines et les
+    bâtiments proches, pour le plan cadastral (DP1).
+    GET /api/cadastre/parcelle/{code_insee}/{section}/{numero}/neighbourhood/?radius={mètres}
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, code_insee, section, numero):
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
+        try:
+            radius = float(request.query_params.get('radius') or settings.CADASTRE_NEIGHBOURHOOD_RADIUS)
+        except ValueError:
+            radius = -1
+        if not 0 <= radius <= settings.CADASTRE_NEIGHBOURHOOD_MAX_RADIUS:
             return Response(
-                {"error": "Erreur lors de la recherche de parcelle"},
-                status=status.HTTP_502_BAD_GATEWAY
+                {"error": f"Paramètre 'radius' invalide (entre 0 et {settings.CADASTRE_NEIGHBOURHOOD_MAX_RADIUS:g} mètres)"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            data = cadastre_service.get_parcelle_neighbourhood(code_insee, section, numero, radius)
+            if data:
+                return Response(data)
+            return Response(
+                {"error": "Parcelle non trouvée"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            logger.error(f"Error fetching parcelle neighbourhood: {e}")
+            return upstream_error_response(e, "Erreur lors de la recherche du voisinage de la parcelle")
+
+
+def plan_response(request, code_insee, section, numero, data):
+    """
+    Plan de situation rendu (SVG ou PNG selon `type`, résolution `scale`
+    pour le PNG), à partir du fond de plan en cache.
+
+    (`format` est réservé par DRF à la négociation de contenu.)
+    """
+    invalid = invalid_code_insee_response(code_insee)
+    if invalid:
+        return invalid
+    fmt = request.query_params.get('type', 'svg').lower()
+    if fmt not in PLAN_FORMATS:
+        return Response(
+            {"error": f"Type inconnu (types : {', '.join(PLAN_FORMATS)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        scale = float(request.query_params.get('scale') or 1)
+    except ValueError:
+        scale = 0
+    if not 0.5 <= scale <= 4:
+        return Response(
+            {"error": "Paramètre 'scale' invalide (entre 0.5 et 4)"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        payload = plan_renderer.render(code_insee, section, numero, data, fmt=fmt, scale=scale)
+    except Exception as e:
+        logger.error(f"Error rendering plan {code_insee} {section} {numero}: {e}")
+        return upstream_error_response(e, "Impossible de générer le plan de situation")
+    if not payload:
+        return Response({"error": "Parcelle non trouvée"}, status=status.HTTP_404_NOT_FOUND)
+    response = HttpResponse(payload, content_type=PLAN_FORMATS[fmt][1])
+    response['Content-Disposition'] = (
+        f'inline; filename="plan_cadastral_{code_insee}_{section}_{numero}{PLAN_FORMATS[fmt][0]}"'
+    )
+    return response
+
+
+class CadastreParcellePlanView(APIView):
+    """
+    Plan de situation (DP1) d'une parcelle, rendu côté serveur.
+    GET /api/cadastre/parcelle/{code_insee}/{section}/{numero}/plan/?type=svg|png&scale=
+        &commune=&adresse=&voie=&surface_plancher=&surface_terrain=&echelle=&date=
+
+    Les paramètres optionnels décrivent le projet (cartouche, emprise du
+    projet, nom de la voie, échelle '1:500').
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, code_insee, section, numero):
+        return plan_response(request, code_insee, section, numero, request.query_params.dict())
+
 
 class CadastreGeocodeView(APIView):
     """
@@ -338,29 +769,138 @@ class CadastreGeocodeView(APIView):
             return Response({"results": results})
         except Exception as e:
             logger.error(f"Error geocoding: {e}")
+            return upstream_error_response(e, "Erreur lors du géocodage")
+
+
+class CadastreGeocodeBatchView(APIView):
+    """
+    Géocode un lot d'adresses (imports en masse du back-office).
+    POST /api/cadastre/geocode/batch/?parcelle=1
+
+    Corps accepté :
+    - CSV (text/csv ou fichier 'file') avec une colonne 'address' / 'adresse'
+      (à défaut, la première colonne) et une colonne 'id' optionnelle ;
+    - JSON : liste de chaînes ou d'objets {'id', 'address'}, éventuellement
+      sous la clé 'addresses'.
+
+    Les résultats sont renvoyés en NDJSON (une ligne JSON par adresse, dans
+    l'ordre d'entrée) au fur et à mesure du traitement.
+    """
+    ADDRESS_COLUMNS = ('address', 'adresse', 'q')
+
+    def _rows_from_csv(self, text):
+        reader = csv.reader(io.StringIO(text))
+        header = next(reader, None) or []
+        columns = [h.strip().lower() for h in header]
+        address_col = next((columns.index(c) for c in self.ADDRESS_COLUMNS if c in columns), None)
+        id_col = columns.index('id') if 'id' in columns else None
+        if address_col is None:
+            # Pas d'en-tête reconnu : la première ligne est une donnée
+            address_col = 0
+            reader = itertools.chain([header], reader)
+        for record in reader:
+            if not record:
+                continue
+            yield {
+                'id': record[id_col] if id_col is not None and id_col < len(record) else None,
+                'address': record[address_col] if address_col < len(record) else '',
+            }
+
+    def _rows_from_json(self, data):
+        if isinstance(data, dict):
+            data = data.get('addresses')
+        if not isinstance(data, list):
+            raise ValueError("Liste d'adresses attendue")
+        for item in data:
+            if isinstance(item, str):
+                yield {'id': None, 'address': item}
+            elif isinstance(item, dict):
+                address = next((item[c] for c in self.ADDRESS_COLUMNS if item.get(c)), '')
+                yield {'id': item.get('id'), 'address': str(address)}
+            else:
+                raise ValueError("Élément de liste invalide")
+
+    def post(self, request):
+        try:
+            if request.content_type.startswith('text/csv'):
+                rows = list(self._rows_from_csv(request.body.decode('utf-8-sig')))
+            elif 'file' in request.FILES:
+                rows = list(self._rows_from_csv(request.FILES['file'].read().decode('utf-8-sig')))
+            else:
+                rows = list(self._rows_from_json(request.data))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
             return Response(
-                {"error": "Erreur lors du géocodage"},
-                status=status.HTTP_502_BAD_GATEWAY
+                {"error": f"Corps de requête invalide : {e}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not rows:
+            return Response({"error": "Aucune adresse fournie"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.GEOCODE_BATCH_MAX_ROWS:
+            return Response(
+                {"error": f"Trop d'adresses (maximum {settings.GEOCODE_BATCH_MAX_ROWS})"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        with_parcelle = request.query_params.get('parcelle') in ('1', 'true')
+        lines = (
+            json.dumps(item, ensure_ascii=False).encode() + b'\n'
+            for item in cadastre_service.geocode_batch(rows, with_parcelle=with_parcelle)
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+class CadastreReverseGeocodeView(APIView):
+    """
+    Géocodage inverse : adresse et code INSEE à partir de coordonnées GPS.
+    GET /api/cadastre/reverse/?lat={lat}&lon={lon}
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            lat, lon = parse_coordinates(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Paramètres 'lat' (-90 à 90) et 'lon' (-180 à 180) requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = cadastre_service.reverse_geocode(lon, lat)
+            if result:
+                return Response(result)
+            return Response(
+                {"error": "Aucune adresse trouvée à ces coordonnées"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            logger.error(f"Error reverse geocoding: {e}")
+            return upstream_error_response(e, "Erreur lors du géocodage inverse")
+
 
 class CadastreSectionsView(APIView):
     """
     Récupère les sections cadastrales d'une commune.
     GET /api/cadastre/sections/{code_insee}/
+
+    'details' fournit pour chaque section le nombre de parcelles et l'emprise.
     """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, code_insee):
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
         try:
-            sections = cadastre_service.get_sections_commune(code_insee)
-            return Response({"sections": sections})
+            details = cadastre_service.get_sections_summary(code_insee)
+            return Response({
+                "sections": [s['section'] for s in details],
+                "details": details,
+            })
         except Exception as e:
             logger.error(f"Error fetching sections: {e}")
-            return Response(
-                {"error": "Impossible de récupérer les sections"},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
+            return upstream_error_response(e, "Impossible de récupérer les sections")
 
 
 class CadastreSearchView(APIView):
@@ -379,16 +919,16 @@ class CadastreSearchView(APIView):
                 {"error": "Paramètre 'code_insee' requis"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        invalid = invalid_code_insee_response(code_insee)
+        if invalid:
+            return invalid
         
         try:
             data = cadastre_service.search_parcelles(code_insee, section)
             return Response(data)
         except Exception as e:
             logger.error(f"Error searching parcelles: {e}")
-            return Response(
-                {"error": "Erreur lors de la recherche"},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
+            return upstream_error_response(e, "Erreur lors de la recherche")
 
 class CadastreParcelleByCoordinatesView(APIView):
     """
@@ -398,17 +938,16 @@ class CadastreParcelleByCoordinatesView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        lat = request.query_params.get('lat')
-        lon = request.query_params.get('lon')
-        
-        if not lat or not lon:
+        try:
+            lat, lon = parse_coordinates(request.query_params)
+        except ValueError:
             return Response(
-                {"error": "Paramètres 'lat' et 'lon' requis"},
+                {"error": "Paramètres 'lat' (-90 à 90) et 'lon' (-180 à 180) requis"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         try:
-            parcelle = cadastre_service.get_parcelle_by_coordinates(float(lat), float(lon))
+            parcelle = cadastre_service.get_parcelle_by_coordinates(lat, lon)
             if parcelle:
                 return Response(parcelle)
             return Response(
@@ -417,10 +956,44 @@ class CadastreParcelleByCoordinatesView(APIView):
             )
         except Exception as e:
             logger.error(f"Error fetching parcelle by coordinates: {e}")
-            return Response(
-                {"error": "Erreur lors de la recherche de parcelle"},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
+            return upstream_error_response(e, "Erreur lors de la recherche de parcelle")
+
+class AdminCadastreStatsView(APIView):
+    """
+    Statistiques des caches cadastre, géocodage et plans rendus, du stockage
+    local et des disjoncteurs amont (administration).
+    GET /api/admin/cadastre/stats/
+    """
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        return Response({
+            "commune_cache": cadastre_service.cache.stats(),
+            "commune_indexes": cadastre_service.index_stats(),
+            "geocode_cache": cadastre_service.geocode_cache.stats(),
+            "reverse_geocode_cache": cadastre_service.reverse_cache.stats(),
+            "commune_store": cadastre_service.store.stats(),
+            "upstreams": cadastre_service.upstream_stats(),
+            "tile_cache": cadastre_service.tiles.stats(),
+            "variant_cache": cadastre_service.variants.stats(),
+            "plan_renders": plan_renderer.stats(),
+        })
+
+class AdminAIStatsView(APIView):
+    """
+    Statistiques du cache des réponses de l'IA : taux de succès par méthode,
+    entrées et succès cumulés ; décisions du moteur de règles des pièces DP ;
+    jobs IA en tâche de fond (administration).
+    GET /api/admin/ai/stats/
+    """
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        return Response({
+            "response_cache": ai_response_cache.stats(),
+            "dp_rules": dp_rules.stats(),
+            "jobs": ai_job_queue.stats(),
+        })
 
 class AdminNotificationListView(generics.ListAPIView):
     queryset = AdminNotification.objects.all()
@@ -470,10 +1043,35 @@ class AIAnalyzeProjectView(APIView):
             return Response(suggestions)
         return Response({"error": "L'IA n'a pas pu analyser le projet"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class AIAnalyzeAllView(APIView):
+    """
+    Analyse complète du projet en un seul appel à l'IA : matériaux et
+    couleurs, pièces DP requises et configuration d'un projet personnalisé.
+    POST /api/ai/analyze-all/
+
+    Les parties obtenues sont ensuite servies depuis le cache par
+    /ai/analyze-project/, /ai/suggest-documents/ et /ai/configure-project/.
+    `natureTravaux` (optionnel) : types de travaux du formulaire.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        description = request.data.get('description', '')
+        if not description:
+            return Response({"error": "Description requise"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = AIService.analyze_all(description, request.data.get('natureTravaux'))
+        if result["documents"] is None:
+            return Response({"error": "L'IA n'a pas pu analyser le projet"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result)
+
 class AISuggestDocumentsView(APIView):
     """
     Suggère les documents DP requis selon le projet.
     POST /api/ai/suggest-documents/
+
+    `natureTravaux` (optionnel) : types de travaux du formulaire ; les cas
+    sans ambiguïté sont décidés par les règles, sans appel à l'IA.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -482,7 +1080,7 @@ class AISuggestDocumentsView(APIView):
         if not description:
             return Response({"error": "Description requise"}, status=status.HTTP_400_BAD_REQUEST)
         
-        suggestions = AIService.suggest_documents(description)
+        suggestions = AIService.suggest_documents(description, request.data.get('natureTravaux'))
         if suggestions:
             return Response(suggestions)
         return Response({"error": "L'IA n'a pas pu suggérer de documents"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -494,6 +1092,7 @@ class AIConfigureProjectView(APIView):
     POST /api/ai/configure-project/
     
     Retourne les champs requis, documents obligatoires et questions spécifiques.
+    `natureTravaux` (optionnel) : types de travaux du formulaire.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -502,5 +1101,77 @@ class AIConfigureProjectView(APIView):
         if not description:
             return Response({"error": "Description requise"}, status=status.HTTP_400_BAD_REQUEST)
         
-        config = AIService.configure_custom_project(description)
+        config = AIService.configure_custom_project(description, request.data.get('natureTravaux'))
         return Response(config)
+
+class AIJobCreateView(APIView):
+    """
+    Lance un appel à l'IA en tâche de fond et rend la main immédiatement.
+    POST /api/ai/jobs/  {"method": "analyze_all", "description": "...", "natureTravaux": [...]}
+
+    `method` : analyze_project, suggest_documents, configure_custom_project ou
+    analyze_all (réponses identiques à leurs vues synchrones). Répond 202 avec
+    l'identifiant du job ; le résultat s'obtient par GET /api/ai/jobs/{id}/
+    ou en flux SSE par GET /api/ai/jobs/{id}/stream/. 503 si la file est pleine.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        method = request.data.get('method', '')
+        description = request.data.get('description', '')
+        if method not in AI_JOB_METHODS:
+            return Response({"error": f"Méthode inconnue : {method}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not description:
+            return Response({"error": "Description requise"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = ai_job_queue.enqueue(request.user, method, description, request.data.get('natureTravaux'))
+        except AIJobQueueFull as e:
+            response = Response({"error": "Trop de demandes en attente, réessayez dans quelques instants"},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+            return response
+        return Response({
+            "id": str(job.pk),
+            "status": job.status,
+            "stream_url": reverse('ai_job_stream', args=[job.pk]),
+        }, status=status.HTTP_202_ACCEPTED)
+
+class AIJobDetailView(APIView):
+    """
+    État d'un job IA : statut, texte reçu de Mistral jusqu'ici, résultat ou erreur.
+    GET /api/ai/jobs/{id}/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        if not AIJob.objects.filter(pk=job_id, user=request.user).exists():
+            return Response({"error": "Job non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(dict(ai_job_queue.snapshot(job_id), id=str(job_id)))
+
+def ai_job_stream(request, job_id):
+    """
+    Flux SSE d'un job IA : événements `status`, `token` (texte reçu de
+    Mistral, au fil de la génération), puis `result` ou `error`.
+    GET /api/ai/jobs/{id}/stream/?token={jeton d'accès}
+
+    Le jeton d'accès est lu dans l'en-tête Authorization ou, pour
+    EventSource, dans le paramètre `token`. Sous WSGI, le flux occupe un
+    worker jusqu'à la fin du job ; sous ASGI, il est servi sans thread par
+    async_views.AIJobStreamRouter.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"detail": f'Méthode "{request.method}" non autorisée.'}, status=405)
+    user_id = token_user_id(stream_token(request.headers.get('Authorization', ''), request.GET.get('token', '')))
+    if user_id is None:
+        return JsonResponse({"error": "Authentification requise"}, status=401)
+    if not AIJob.objects.filter(pk=job_id, user_id=user_id).exists():
+        return JsonResponse({"error": "Job non trouvé"}, status=404)
+
+    response = StreamingHttpResponse(
+        ai_job_queue.stream(job_id, last_event_offset(request.headers.get('Last-Event-ID'))),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
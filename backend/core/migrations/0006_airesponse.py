@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_pdfjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('method', models.CharField(db_index=True, max_length=50)),
+                ('prompt_version', models.PositiveIntegerField()),
+                ('description', models.TextField()),
+                ('response', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
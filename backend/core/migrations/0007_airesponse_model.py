@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_airesponse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airesponse',
+            name='model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
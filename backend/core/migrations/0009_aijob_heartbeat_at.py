@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_aijob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
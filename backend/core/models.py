@@ -1,7 +1,10 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 class Profile(models.Model):
     ROLE_CHOICES = [
@@ -46,6 +49,31 @@ class Dossier(models.Model):
     def __str__(self):
         return f"Dossier {self.id} - {self.user.username}"
 
+class PdfJob(models.Model):
+    """Génération en tâche de fond du PDF d'un dossier (file d'attente en base)."""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+
+    dossier = models.ForeignKey(Dossier, on_delete=models.CASCADE, related_name='pdf_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"PdfJob {self.id} - Dossier {self.dossier_id} ({self.status})"
+
 class ActivityLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_logs', null=True, blank=True)
     activity_type = models.CharField(max_length=50, default='info')
@@ -76,3 +104,56 @@ class AdminNotification(models.Model):
 
     def __str__(self):
         return f"{self.title} - {self.created_at}"
+
+class AIResponse(models.Model):
+    """Réponse mise en cache d'une méthode d'AIService, par empreinte de la description normalisée."""
+    key = models.CharField(max_length=64, unique=True)
+    method = models.CharField(max_length=50, db_index=True)
+    prompt_version = models.PositiveIntegerField()
+    model = models.CharField(max_length=100, blank=True, default='')
+    description = models.TextField()
+    response = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} v{self.prompt_version} - {self.description[:50]}"
+
+class AIJob(models.Model):
+    """Appel à l'IA exécuté en tâche de fond, suivi par interrogation ou flux SSE."""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    METHOD_CHOICES = [
+        ('analyze_project', 'Analyse du projet'),
+        ('suggest_documents', 'Pièces DP'),
+        ('configure_custom_project', 'Configuration du projet'),
+        ('analyze_all', 'Analyse complète'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_jobs')
+    method = models.CharField(max_length=50, choices=METHOD_CHOICES)
+    description = models.TextField()
+    nature_travaux = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    # Texte reçu de Mistral jusqu'ici (réponse en cours de génération)
+    partial = models.TextField(blank=True, default='')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Dernier signe de vie du worker qui exécute le job (statut « en cours »)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"AIJob {self.id} - {self.method} ({self.status})"
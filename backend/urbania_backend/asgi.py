@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'urbania_backend.settings')
 
 application = get_asgi_application()
+
+# Reprendre les PDF de dossiers en attente (pool de workers du processus)
+from api.services.pdf_jobs import pdf_job_queue  # noqa: E402
+pdf_job_queue.wake()
+
+# Reprendre les appels à l'IA en attente
+from api.services.ai_jobs import ai_job_queue  # noqa: E402
+ai_job_queue.wake()
+
+# Flux SSE des jobs IA servis hors de Django (sans bloquer la boucle d'événements)
+from api.async_views import AIJobStreamRouter  # noqa: E402
+application = AIJobStreamRouter(application)
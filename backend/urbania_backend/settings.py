@@ -48,7 +48,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -167,3 +167,112 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 }
+
+# Cache disque des fichiers cadastraux Etalab (GeoJSON communaux compressés)
+CADASTRE_CACHE_DIR = os.environ.get('CADASTRE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'cadastre'))
+CADASTRE_CACHE_MAX_BYTES = int(os.environ.get('CADASTRE_CACHE_MAX_MB', '1024')) * 1024 * 1024
+CADASTRE_CACHE_TTL = int(os.environ.get('CADASTRE_CACHE_TTL', str(24 * 3600)))
+
+# Tuiles GeoJSON cadastrales générées (pyramide XYZ web-mercator)
+CADASTRE_TILE_DIR = os.environ.get('CADASTRE_TILE_DIR', os.path.join(BASE_DIR, 'cache', 'tiles'))
+CADASTRE_TILE_MIN_ZOOM = int(os.environ.get('CADASTRE_TILE_MIN_ZOOM', '13'))
+CADASTRE_TILE_MAX_ZOOM = int(os.environ.get('CADASTRE_TILE_MAX_ZOOM', '20'))
+CADASTRE_TILE_MAX_BYTES = int(os.environ.get('CADASTRE_TILE_MAX_MB', '512')) * 1024 * 1024
+
+# Variantes simplifiées / quantifiées des couches communales (?simplify=&precision=)
+CADASTRE_VARIANT_DIR = os.environ.get('CADASTRE_VARIANT_DIR', os.path.join(BASE_DIR, 'cache', 'variants'))
+CADASTRE_VARIANT_MAX_BYTES = int(os.environ.get('CADASTRE_VARIANT_MAX_MB', '512')) * 1024 * 1024
+
+# Fonds des plans de situation (DP1) rendus côté serveur (cache disque borné, LRU)
+CADASTRE_PLAN_DIR = os.environ.get('CADASTRE_PLAN_DIR', os.path.join(BASE_DIR, 'cache', 'plans'))
+CADASTRE_PLAN_MAX_BYTES = int(os.environ.get('CADASTRE_PLAN_MAX_MB', '256')) * 1024 * 1024
+
+# Budget mémoire (par worker) des index communaux en mémoire, géométries compactes
+CADASTRE_INDEX_MAX_BYTES = int(os.environ.get('CADASTRE_INDEX_MAX_MB', '256')) * 1024 * 1024
+
+# Voisinage d'une parcelle pour le plan cadastral (rayons en mètres)
+CADASTRE_NEIGHBOURHOOD_RADIUS = float(os.environ.get('CADASTRE_NEIGHBOURHOOD_RADIUS', '50'))
+CADASTRE_NEIGHBOURHOOD_MAX_RADIUS = float(os.environ.get('CADASTRE_NEIGHBOURHOOD_MAX_RADIUS', '500'))
+
+# Nombre maximal de récupérations amont cadastrales en parallèle par worker
+CADASTRE_FETCH_WORKERS = int(os.environ.get('CADASTRE_FETCH_WORKERS', '4'))
+
+# Cache mémoire du géocodage (api-adresse.data.gouv.fr), par worker
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', '5000'))
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', str(24 * 3600)))
+# Taille (en mètres) des cellules de grille du cache de géocodage inverse
+REVERSE_GEOCODE_GRID_METERS = float(os.environ.get('REVERSE_GEOCODE_GRID_METERS', '10'))
+
+# Géocodage par lot (POST /api/cadastre/geocode/batch/)
+GEOCODE_BATCH_WORKERS = int(os.environ.get('GEOCODE_BATCH_WORKERS', '8'))
+GEOCODE_BATCH_MAX_ROWS = int(os.environ.get('GEOCODE_BATCH_MAX_ROWS', '5000'))
+GEOCODE_RATE_LIMIT = float(os.environ.get('GEOCODE_RATE_LIMIT', '40'))
+
+# Stockage local indexé (SQLite R*Tree) des départements préchargés (manage.py load_cadastre)
+CADASTRE_STORE_PATH = os.environ.get('CADASTRE_STORE_PATH', os.path.join(BASE_DIR, 'cache', 'cadastre_store.sqlite3'))
+
+# Disjoncteurs des services amont (Etalab, APICarto, api-adresse), par worker
+UPSTREAM_BREAKER_WINDOW = float(os.environ.get('UPSTREAM_BREAKER_WINDOW', '60'))
+UPSTREAM_BREAKER_MIN_CALLS = int(os.environ.get('UPSTREAM_BREAKER_MIN_CALLS', '10'))
+UPSTREAM_BREAKER_ERROR_RATE = float(os.environ.get('UPSTREAM_BREAKER_ERROR_RATE', '0.5'))
+UPSTREAM_BREAKER_SLOW_CALL = float(os.environ.get('UPSTREAM_BREAKER_SLOW_CALL', '5'))
+UPSTREAM_BREAKER_SLOW_RATE = float(os.environ.get('UPSTREAM_BREAKER_SLOW_RATE', '0.5'))
+UPSTREAM_BREAKER_OPEN_SECONDS = float(os.environ.get('UPSTREAM_BREAKER_OPEN_SECONDS', '30'))
+# Timeouts amont (secondes) : connexion fixe, lecture adaptative entre MIN et MAX
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+UPSTREAM_TIMEOUT_MIN = float(os.environ.get('UPSTREAM_TIMEOUT_MIN', '2'))
+UPSTREAM_TIMEOUT_MAX = float(os.environ.get('UPSTREAM_TIMEOUT_MAX', '15'))
+
+# Âge maximal (secondes) d'une couche communale servie périmée pendant son rafraîchissement
+CADASTRE_CACHE_STALE_TTL = int(os.environ.get('CADASTRE_CACHE_STALE_TTL', str(7 * 24 * 3600)))
+
+# Client HTTP asynchrone des vues ASGI (/api/async/) : pool de connexions par processus
+ASYNC_UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('ASYNC_UPSTREAM_MAX_CONNECTIONS', '200'))
+
+# URL publique du backend, pour les liens absolus (Dossier.pdf_url)
+BACKEND_PUBLIC_URL = os.environ.get(
+    'BACKEND_PUBLIC_URL', os.environ.get('RENDER_EXTERNAL_URL', 'http://localhost:8000')
+).rstrip('/')
+
+# PDF des dossiers générés en tâche de fond (file d'attente en base, pool de threads par processus)
+DOSSIER_PDF_DIR = os.environ.get('DOSSIER_PDF_DIR', os.path.join(BASE_DIR, 'media', 'dossiers'))
+# 0 : pas de pool dans les processus web (manage.py process_pdf_jobs --watch à lancer à part)
+PDF_JOB_WORKERS = int(os.environ.get('PDF_JOB_WORKERS', '2'))
+PDF_JOB_POLL_INTERVAL = float(os.environ.get('PDF_JOB_POLL_INTERVAL', '5'))
+PDF_JOB_MAX_ATTEMPTS = int(os.environ.get('PDF_JOB_MAX_ATTEMPTS', '3'))
+PDF_JOB_RETRY_DELAY = float(os.environ.get('PDF_JOB_RETRY_DELAY', '30'))
+# Délai après lequel un job « en cours » est considéré abandonné (processus arrêté) et repris
+PDF_JOB_STALE_AFTER = float(os.environ.get('PDF_JOB_STALE_AFTER', '600'))
+# Intervalle minimal entre deux recherches de jobs abandonnés
+PDF_JOB_HOUSEKEEPING_INTERVAL = float(os.environ.get('PDF_JOB_HOUSEKEEPING_INTERVAL', '60'))
+
+# Cache en base des réponses de l'IA (Mistral), par description normalisée
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', str(30 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', '10000'))
+# Réutilisation des réponses de l'IA pour une description quasi identique (similarité de Jaccard
+# des trigrammes, 0 pour désactiver ; calibrage : manage.py eval_ai_similarity)
+AI_SIMILARITY_THRESHOLD = float(os.environ.get('AI_SIMILARITY_THRESHOLD', '0.8'))
+# Intervalle (secondes) d'indexation des réponses enregistrées par les autres processus
+AI_SIMILARITY_SYNC_INTERVAL = float(os.environ.get('AI_SIMILARITY_SYNC_INTERVAL', '30'))
+# Confiance minimale du moteur de règles pour décider des pièces DP sans appel à l'IA
+# (au-delà de 1 pour toujours interroger l'IA ; calibrage : manage.py eval_dp_rules)
+AI_RULES_MIN_CONFIDENCE = float(os.environ.get('AI_RULES_MIN_CONFIDENCE', '0.75'))
+
+# Appels à l'IA en tâche de fond (POST /api/ai/jobs/) : pool de threads par processus
+# (0 : les jobs attendent qu'un autre processus les exécute)
+AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', '4'))
+AI_JOB_POLL_INTERVAL = float(os.environ.get('AI_JOB_POLL_INTERVAL', '2'))
+# Jobs en attente au-delà desquels les nouvelles demandes sont refusées (503)
+AI_JOB_MAX_PENDING = int(os.environ.get('AI_JOB_MAX_PENDING', '100'))
+# Intervalle d'enregistrement en base du texte reçu de Mistral (interrogation, autres processus)
+AI_JOB_PROGRESS_INTERVAL = float(os.environ.get('AI_JOB_PROGRESS_INTERVAL', '0.5'))
+# Flux SSE : intervalle de consultation de l'état du job et durée maximale
+AI_JOB_STREAM_INTERVAL = float(os.environ.get('AI_JOB_STREAM_INTERVAL', '0.2'))
+AI_JOB_STREAM_TIMEOUT = float(os.environ.get('AI_JOB_STREAM_TIMEOUT', '120'))
+# Job « en cours » considéré abandonné (processus arrêté) sans signe de vie de son worker
+# depuis ce délai (signe de vie toutes les AI_JOB_STALE_AFTER / 4 secondes), et
+# conservation des jobs terminés
+AI_JOB_STALE_AFTER = float(os.environ.get('AI_JOB_STALE_AFTER', '120'))
+AI_JOB_TTL = float(os.environ.get('AI_JOB_TTL', '3600'))
+# Intervalle minimal entre deux passes de nettoyage (jobs abandonnés, jobs terminés anciens)
+AI_JOB_HOUSEKEEPING_INTERVAL = float(os.environ.get('AI_JOB_HOUSEKEEPING_INTERVAL', '60'))
@@ -18,3 +18,11 @@ application = get_wsgi_application()
 
 # Démarrer la boucle de maintien en éveil pour Render
 start_keep_alive()
+
+# Reprendre les PDF de dossiers en attente (pool de workers du processus)
+from api.services.pdf_jobs import pdf_job_queue  # noqa: E402
+pdf_job_queue.wake()
+
+# Reprendre les appels à l'IA en attente
+from api.services.ai_jobs import ai_job_queue  # noqa: E402
+ai_job_queue.wake()
@@ -48,19 +48,18 @@ function Step11CadastralPlan() {
         setError(null);
 
         try {
-            // Fetch parcelles
-            const parcellesRes = await fetch(`${API_BASE}/cadastre/parcelles/${codeInsee}/`);
-            if (!parcellesRes.ok) {
+            // Fetch parcelles + batiments in a single round-trip (fetched in parallel server-side)
+            const bundleRes = await fetch(`${API_BASE}/cadastre/commune/${codeInsee}/bundle/?layers=parcelles,batiments`);
+            if (!bundleRes.ok) {
                 throw new Error('Impossible de charger les parcelles');
             }
-            const parcellesData = await parcellesRes.json();
-            setParcelles(parcellesData);
-
-            // Fetch batiments
-            const batimentsRes = await fetch(`${API_BASE}/cadastre/batiments/${codeInsee}/`);
-            if (batimentsRes.ok) {
-                const batimentsData = await batimentsRes.json();
-                setBatiments(batimentsData);
+            const bundle = await bundleRes.json();
+            if (!bundle.parcelles) {
+                throw new Error('Impossible de charger les parcelles');
+            }
+            setParcelles(bundle.parcelles);
+            if (bundle.batiments) {
+                setBatiments(bundle.batiments);
             }
         } catch (err) {
             console.error('Error fetching cadastre data:', err);
@@ -403,7 +403,7 @@ export function FormProvider({ children }) {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
-                body: JSON.stringify({ description }),
+                body: JSON.stringify({ description, natureTravaux: state.data.natureTravaux }),
             });
             if (response.ok) {
                 const suggestions = await response.json();
@@ -413,7 +413,7 @@ export function FormProvider({ children }) {
             console.error('Failed to suggest documents with AI:', error);
         }
         return null;
-    }, []);
+    }, [state.data.natureTravaux]);
 
     // Configure custom project using AI (for "autre" type)
     const configureCustomProjectWithAI = useCallback(async (description) => {
@@ -427,7 +427,7 @@ export function FormProvider({ children }) {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
-                body: JSON.stringify({ description }),
+                body: JSON.stringify({ description, natureTravaux: state.data.natureTravaux }),
             });
             if (response.ok) {
                 const config = await response.json();
@@ -437,7 +437,7 @@ export function FormProvider({ children }) {
             console.error('Failed to configure custom project with AI:', error);
         }
         return null;
-    }, []);
+    }, [state.data.natureTravaux]);
 
     // Compute project configuration based on selected natureTravaux
     const projectConfig = useMemo(() => {